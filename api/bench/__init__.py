@@ -0,0 +1 @@
+"""Offline load-test harness for /api/chat; see api/README.md"""
@@ -0,0 +1,70 @@
+"""Deterministic PDF and CSV attachments for benchmark runs"""
+
+import random
+from typing import List
+
+_WORDS = (
+    "plaintiff defendant employer notice termination retaliation complaint wage overtime "
+    "statute limitations filed hearing evidence witness email supervisor policy claim damages "
+    "jurisdiction county court agency deadline discovery deposition settlement counsel"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(rng: random.Random, page: int, words_per_page: int) -> List[str]:
+    words = [rng.choice(_WORDS) for _ in range(words_per_page)]
+    lines = [f"Page {page + 1} - Intake narrative"]
+    for i in range(0, len(words), 12):
+        lines.append(" ".join(words[i:i + 12]))
+    return lines
+
+
+def make_pdf(pages: int = 20, words_per_page: int = 300, seed: int = 7) -> bytes:
+    """Text PDF with one Helvetica content stream per page"""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page, pid in enumerate(page_ids):
+        body = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        body += [f"({_escape(line)}) Tj T*" for line in _page_lines(rng, page, words_per_page)]
+        body.append("ET")
+        stream = "\n".join(body).encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_csv(rows: int = 20000, seed: int = 7) -> bytes:
+    """Claims ledger with numeric, date, categorical and free-text columns"""
+    rng = random.Random(seed)
+    states = ["CA", "NY", "TX", "WA", "IL", "FL"]
+    statuses = ["open", "closed", "pending", "settled"]
+    lines = ["case_id,filed_on,state,amount,status,notes"]
+    for i in range(rows):
+        lines.append(
+            f"C{i:06d},2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},{rng.choice(states)},"
+            f"{rng.uniform(100, 250000):.2f},{rng.choice(statuses)},{' '.join(rng.sample(_WORDS, 4))}"
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8")
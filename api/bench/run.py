@@ -0,0 +1,239 @@
+"""
+Load test /api/chat against the stub backend and save the results as JSON.
+
+Run from api/:
+    python -m bench.run --clients 50 --requests 500 --attach pdf
+    python -m bench.run --clients 50 --requests 500 --baseline bench/results/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .server import add_stub_arguments
+from .stub import attachment_ref
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, "bench", "results")
+# Handed to the bench server so it trusts the per-worker x-client-id like the frontend proxy's
+PROXY_SECRET = secrets.token_hex(16)
+
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles in milliseconds, plus max"""
+    if not values:
+        return {**{f"p{p}": None for p in points}, "max": None}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        result[f"p{p}"] = round(ordered[index] * 1000, 3)
+    result["max"] = round(ordered[-1] * 1000, 3)
+    return result
+
+
+def _message(index: int, attach: List[str]) -> Dict[str, Any]:
+    # The index keeps prompts unique so the response cache does not short-circuit the run
+    text = f"Request {index}: assess this intake and list the deadlines."
+    refs = "\n".join(attachment_ref(kind) for kind in attach)
+    return {"role": "user", "content": f"{text}\n{refs}" if refs else text}
+
+
+async def _one_request(client: httpx.AsyncClient, url: str, index: int, attach: List[str], client_id: str) -> Dict[str, Any]:
+    body = {"messages": [_message(index, attach)], "selectedChatModel": "chat-model"}
+    start = time.perf_counter()
+    ttfb: Optional[float] = None
+    gaps: List[float] = []
+    last: Optional[float] = None
+    errors = 0
+    # Each simulated user has its own id, as behind the frontend proxy; otherwise
+    # every bench client shares one address and its per-client limits
+    headers = {"x-client-id": client_id, "x-proxy-secret": PROXY_SECRET}
+    async with client.stream("POST", url, json=body, headers=headers) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            now = time.perf_counter()
+            if ttfb is None:
+                ttfb = now - start
+            if last is not None:
+                gaps.append(now - last)
+            last = now
+            if '"type":"error' in line.replace(" ", ""):
+                errors += 1
+        status = response.status_code
+    return {
+        "status": status,
+        "ttfb": ttfb,
+        "duration": time.perf_counter() - start,
+        "gaps": gaps,
+        "errors": errors,
+    }
+
+
+async def drive(base_url: str, clients: int, requests: int, attach: List[str]) -> Dict[str, Any]:
+    counter = iter(range(requests))
+    results: List[Dict[str, Any]] = []
+    failures: List[str] = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+
+        async def worker(client_id: str) -> None:
+            for index in counter:
+                try:
+                    results.append(await _one_request(client, "/api/chat", index, attach, client_id))
+                except httpx.HTTPError as e:
+                    failures.append(f"{type(e).__name__}: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(f"bench-{n}") for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        stats = (await client.get("/bench/stats")).json()
+
+    ok = [r for r in results if r["status"] == 200 and not r["errors"]]
+    return {
+        "requests": requests,
+        "completed": len(ok),
+        "failed": requests - len(ok),
+        "failures": failures[:20],
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(ok) / elapsed, 3) if elapsed else None,
+        "ttfb_ms": percentiles([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+        "duration_ms": percentiles([r["duration"] for r in ok]),
+        "inter_chunk_ms": percentiles([gap for r in ok for gap in r["gaps"]]),
+        "loop_lag_ms": percentiles(stats["loop_lag_s"]),
+        "server_cpu_s": round(stats["cpu_s"], 3),
+        # Main process alone, the extraction pool workers, and both together at the end of the run
+        "server_rss_bytes": stats["rss_bytes"],
+        "server_workers_rss_bytes": stats["workers_rss_bytes"],
+        "server_total_rss_bytes": stats["total_rss_bytes"],
+        "server_peak_rss_bytes": stats["peak_rss_bytes"],
+    }
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"bench server exited with code {server.returncode}")
+            try:
+                if (await client.get("/healthz")).status_code == 200:
+                    await client.post("/bench/reset")
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("bench server did not become ready")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _compare(summary: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    for metric in ("requests_per_s",):
+        lines.append(f"{metric}: {baseline.get(metric)} -> {summary.get(metric)}")
+    for metric in ("ttfb_ms", "inter_chunk_ms", "loop_lag_ms", "duration_ms"):
+        old, new = baseline.get(metric) or {}, summary.get(metric) or {}
+        lines.append(f"{metric} p50/p99: {old.get('p50')}/{old.get('p99')} -> {new.get('p50')}/{new.get('p99')}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test /api/chat against the stub model backend")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent SSE clients")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--attach", default="", help="comma-separated fixtures per message: pdf,csv")
+    parser.add_argument("--cold-attachments", action="store_true", help="disable the extraction cache")
+    parser.add_argument("--port", type=int, default=0, help="bench server port (default: any free port)")
+    parser.add_argument("--out", default=None, help="result file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    parser.add_argument("--label", default="", help="free-form note stored with the results")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    attach = [kind for kind in args.attach.split(",") if kind]
+
+    port = args.port or _free_port()
+    server_args = [
+        "--port", str(port),
+        "--tokens", str(args.tokens),
+        "--token-rate", str(args.token_rate),
+        "--first-token-delay", str(args.first_token_delay),
+        "--tool-delay", str(args.tool_delay),
+        "--fetch-delay", str(args.fetch_delay),
+        "--pdf-pages", str(args.pdf_pages),
+        "--csv-rows", str(args.csv_rows),
+    ]
+    env = dict(os.environ, RESPONSE_CACHE_MAX_ENTRIES="0", PROXY_SHARED_SECRET=PROXY_SECRET)
+    if args.cold_attachments:
+        env["EXTRACT_CACHE_MAX_BYTES"] = "0"
+        env.pop("EXTRACT_CACHE_DIR", None)
+
+    base_url = f"http://127.0.0.1:{port}"
+    server_log = tempfile.NamedTemporaryFile(prefix="bench-server-", suffix=".log", delete=False)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "bench.server", *server_args],
+        cwd=API_DIR,
+        env=env,
+        stdout=server_log,
+        stderr=subprocess.STDOUT,
+    )
+    try:
+        asyncio.run(_wait_ready(base_url, server))
+        summary = asyncio.run(drive(base_url, args.clients, args.requests, attach))
+    except Exception:
+        print(f"bench server log: {server_log.name}", file=sys.stderr)
+        raise
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        server_log.close()
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        "summary": summary,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(json.dumps(summary, indent=2))
+    print(f"saved {out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            for line in _compare(summary, json.load(f)["summary"]):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
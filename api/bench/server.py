@@ -0,0 +1,150 @@
+"""
+Benchmark server: the real FastAPI app with the stub backend installed.
+
+Run from api/:  python -m bench.server --port 8000 --token-rate 200
+Adds GET /bench/stats (event-loop lag, RSS of the server and its pool workers) and POST /bench/reset.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import time
+from typing import Any, Dict, List
+
+# No outbound calls during warm-up
+os.environ.setdefault("WARMUP_OPENAI_CONNECT", "0")
+
+import uvicorn
+
+from .stub import StubConfig, install
+
+LAG_INTERVAL_S = 0.01
+
+
+class LoopLagMonitor:
+    """Samples how late a fixed-interval sleep wakes up; lag means the loop was blocked"""
+
+    def __init__(self, interval_s: float = LAG_INTERVAL_S):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+
+def _process_rss(pid: str) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _descendants(pid: int) -> List[str]:
+    """Live descendant pids from /proc; the extraction pool workers are children of the server"""
+    parents: Dict[str, str] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The ppid follows the parenthesised command name, which may contain spaces
+                parents[entry] = f.read().rsplit(")", 1)[1].split()[1]
+        except (OSError, IndexError):
+            continue
+    found: List[str] = []
+    frontier = [str(pid)]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def _rss_bytes() -> Dict[str, int]:
+    # Peak covers the server process only; live workers are summed separately
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    current = _process_rss("self")
+    workers = sum(_process_rss(pid) for pid in _descendants(os.getpid()))
+    return {
+        "rss_bytes": current,
+        "workers_rss_bytes": workers,
+        "total_rss_bytes": current + workers,
+        "peak_rss_bytes": peak,
+    }
+
+
+def build_app(config: StubConfig, monitor: LoopLagMonitor) -> Any:
+    install(config)
+    from chat import app
+
+    cpu_start = [time.process_time()]
+
+    @app.get("/bench/stats")
+    def bench_stats() -> Dict[str, Any]:
+        return {
+            "loop_lag_s": monitor.samples,
+            "cpu_s": time.process_time() - cpu_start[0],
+            **_rss_bytes(),
+        }
+
+    @app.post("/bench/reset")
+    def bench_reset() -> Dict[str, bool]:
+        monitor.samples.clear()
+        cpu_start[0] = time.process_time()
+        return {"ok": True}
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = StubConfig()
+    parser.add_argument("--tokens", type=int, default=defaults.tokens)
+    parser.add_argument("--token-rate", type=float, default=defaults.token_rate, help="tokens/s, 0 = unthrottled")
+    parser.add_argument("--first-token-delay", type=float, default=defaults.first_token_delay_s)
+    parser.add_argument("--tool-delay", type=float, default=defaults.tool_delay_s)
+    parser.add_argument("--fetch-delay", type=float, default=defaults.fetch_delay_s)
+    parser.add_argument("--pdf-pages", type=int, default=defaults.pdf_pages)
+    parser.add_argument("--csv-rows", type=int, default=defaults.csv_rows)
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        tokens=args.tokens,
+        token_rate=args.token_rate,
+        first_token_delay_s=args.first_token_delay,
+        tool_delay_s=args.tool_delay,
+        fetch_delay_s=args.fetch_delay,
+        pdf_pages=args.pdf_pages,
+        csv_rows=args.csv_rows,
+    )
+
+
+async def serve(host: str, port: int, config: StubConfig) -> None:
+    monitor = LoopLagMonitor()
+    app = build_app(config, monitor)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    lag_task = asyncio.create_task(monitor.run())
+    try:
+        await server.serve()
+    finally:
+        lag_task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, stub_config_from_args(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Stub model backend for benchmarks.
+
+install() replaces Runner.run_streamed / Runner.run with a scripted stream
+(configurable first-token latency, token rate and tool-call delay) and
+points attachment downloads at in-memory fixtures, so /api/chat can be
+load-tested without network access or OpenAI credits.
+"""
+
+import asyncio
+import itertools
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict
+
+import httpx
+from agents import Runner
+
+from chat_agents import fetch
+
+from .fixtures import make_csv, make_pdf
+
+FIXTURE_HOST = "bench.fixtures"
+
+_TOKENS = (
+    "Based on the intake, the strongest claim is retaliation under the state labor code. "
+    "The deadline to file with the agency is likely within one year of the adverse action. "
+    "Key evidence includes the supervisor emails and the timing of the termination. "
+).split(" ")
+
+
+@dataclass
+class StubConfig:
+    tokens: int = 300
+    token_rate: float = 200.0  # tokens per second; 0 streams as fast as possible
+    first_token_delay_s: float = 0.3
+    tool_delay_s: float = 0.0  # > 0 inserts one function tool call before the answer
+    fetch_delay_s: float = 0.0
+    pdf_pages: int = 20
+    csv_rows: int = 20000
+
+
+class ResponseTextDeltaEvent:
+    """Matches the class name run_context.text_delta_from_event looks for"""
+
+    def __init__(self, delta: str):
+        self.delta = delta
+
+
+class StubStreamedRun:
+    _call_ids = itertools.count(1)
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.is_complete = False
+        self.final_output = None
+        self._cancelled = False
+
+    def cancel(self, mode: str = "immediate") -> None:
+        self._cancelled = True
+
+    async def stream_events(self) -> AsyncIterator[Any]:
+        config = self.config
+        await asyncio.sleep(config.first_token_delay_s)
+        if config.tool_delay_s > 0:
+            raw = {"name": "lawyerAgent", "call_id": f"call_{next(self._call_ids)}"}
+            item = SimpleNamespace(raw_item=raw)
+            yield SimpleNamespace(type="run_item_stream_event", name="tool_called", item=item)
+            await asyncio.sleep(config.tool_delay_s)
+            yield SimpleNamespace(type="run_item_stream_event", name="tool_output", item=item)
+
+        interval = 1.0 / config.token_rate if config.token_rate > 0 else 0.0
+        text = []
+        for i in range(config.tokens):
+            if self._cancelled:
+                return
+            token = _TOKENS[i % len(_TOKENS)] + " "
+            text.append(token)
+            yield SimpleNamespace(type="raw_response_event", data=ResponseTextDeltaEvent(token))
+            if interval:
+                await asyncio.sleep(interval)
+            elif i % 32 == 31:
+                await asyncio.sleep(0)
+        self.final_output = "".join(text)
+        self.is_complete = True
+
+
+def _fixture_transport(config: StubConfig) -> httpx.MockTransport:
+    fixtures: Dict[str, bytes] = {
+        "/intake.pdf": make_pdf(config.pdf_pages),
+        "/ledger.csv": make_csv(config.csv_rows),
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if config.fetch_delay_s:
+            await asyncio.sleep(config.fetch_delay_s)
+        body = fixtures.get(request.url.path)
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(200, content=body, headers={"content-length": str(len(body))})
+
+    return httpx.MockTransport(handler)
+
+
+def install(config: StubConfig) -> None:
+    def run_streamed(agent: Any, input: Any, context: Any = None, **kwargs: Any) -> StubStreamedRun:
+        return StubStreamedRun(config)
+
+    async def run(agent: Any, input: Any, context: Any = None, **kwargs: Any) -> Any:
+        await asyncio.sleep(config.first_token_delay_s)
+        return SimpleNamespace(final_output="Stub summary.", final_output_as=lambda cls: None)
+
+    Runner.run_streamed = staticmethod(run_streamed)
+    Runner.run = staticmethod(run)
+
+    client = httpx.AsyncClient(transport=_fixture_transport(config))
+    fetch.get_http_client = lambda: client
+
+
+def attachment_ref(kind: str) -> str:
+    """Message text referencing a fixture, in the format the frontend sends"""
+    if kind == "pdf":
+        return f"[File: intake.pdf (application/pdf) - URL: http://{FIXTURE_HOST}/intake.pdf]"
+    if kind == "csv":
+        return f"[File: ledger.csv (text/csv) - URL: http://{FIXTURE_HOST}/ledger.csv]"
+    raise ValueError(f"unknown fixture kind {kind!r}")
@@ -1,22 +1,65 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Any, Dict, Optional, AsyncIterator
-import json
+import hmac
+import secrets
 import time
 import logging
 
 # Import that works both locally (api.chat) and on Railway (chat)
 try:
     from .chat_agents.orchestrator import stream_chat_py
+    from .chat_agents.sse import encode_event
+    from .chat_agents.run_context import data_event
+    from .chat_agents.admission import (
+        ADDRESS_CLIENT_PREFIX, PROXY_SHARED_SECRET, Overloaded, cancel_on_disconnect, current_client,
+        extraction_governor, stream_governor, subagent_governor, wait_in_queue,
+    )
+    from .chat_agents.extract_cache import extract_cache
+    from .chat_agents.ingest import ingest_jobs
+    from .chat_agents.replay import (
+        CLIENT_STREAM_ID_PATTERN, STREAM_ID_PATTERN, replay_store, replay_stream, start_detached_run,
+    )
+    from .chat_agents.response_cache import response_cache
+    from .chat_agents.web_search import search_cache
+    from .chat_agents.telemetry import SSE_METRICS_DETAIL, render_metrics, start_request
+    from .chat_agents.fetch import aclose_http_client
+    from .chat_agents.pdf_engine import shutdown_pdf_pool
+    from .chat_agents.warmup import warm_up
 except ImportError:
     from chat_agents.orchestrator import stream_chat_py
+    from chat_agents.sse import encode_event
+    from chat_agents.run_context import data_event
+    from chat_agents.admission import (
+        ADDRESS_CLIENT_PREFIX, PROXY_SHARED_SECRET, Overloaded, cancel_on_disconnect, current_client,
+        extraction_governor, stream_governor, subagent_governor, wait_in_queue,
+    )
+    from chat_agents.extract_cache import extract_cache
+    from chat_agents.ingest import ingest_jobs
+    from chat_agents.replay import (
+        CLIENT_STREAM_ID_PATTERN, STREAM_ID_PATTERN, replay_store, replay_stream, start_detached_run,
+    )
+    from chat_agents.response_cache import response_cache
+    from chat_agents.web_search import search_cache
+    from chat_agents.telemetry import SSE_METRICS_DETAIL, render_metrics, start_request
+    from chat_agents.fetch import aclose_http_client
+    from chat_agents.pdf_engine import shutdown_pdf_pool
+    from chat_agents.warmup import warm_up
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up()
+    yield
+    await aclose_http_client()
+    shutdown_pdf_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow Vercel frontend to call Railway backend (tighten later)
 app.add_middleware(
@@ -31,44 +74,129 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     messages: List[Dict[str, Any]] = Field(default_factory=list)
     selectedChatModel: Optional[str] = None
+    # "batch-intake" scores every attached intake in parallel and ranks them;
+    # "structured" replies with one CaseReport JSON object and per-field events
+    mode: Optional[str] = None
+    # Sub-agent used in batch-intake mode: "lawyer" (default) or "plaintiff"
+    intakeAgent: Optional[str] = None
+    # Server-side state: with conversationId, clients may send only the new `message`
+    conversationId: Optional[str] = None
+    message: Optional[Dict[str, Any]] = None
+    # Resumable runs keep going after a disconnect; reconnect via GET /api/chat/stream/{streamId}
+    resumable: bool = False
+    streamId: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    url: str
+    mediaType: str
+
+def _proxy_client(request: Request) -> Optional[str]:
+    """The signed-in user forwarded by the frontend proxy, or None for any other caller"""
+    secret = request.headers.get("x-proxy-secret", "")
+    if not PROXY_SHARED_SECRET or not hmac.compare_digest(secret.encode(), PROXY_SHARED_SECRET.encode()):
+        return None
+    client_id = request.headers.get("x-client-id")
+    if client_id and not client_id.startswith(ADDRESS_CLIENT_PREFIX):
+        return client_id
+    return None
+
+def _client_id(request: Request) -> str:
+    # Anyone can send x-client-id, so it only counts next to the proxy's secret; other
+    # callers fall back to their address, which gets ADMISSION_ADDRESS_FACTOR times the limits
+    return _proxy_client(request) or ADDRESS_CLIENT_PREFIX + (request.client.host if request.client else "anonymous")
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition: per-stage latency histograms, cache, admission and prefetch counters
+    body = render_metrics(
+        {"extract": extract_cache.stats(), "response": response_cache.stats(), "web_search": search_cache.stats()},
+        {g.name: g.stats() for g in (stream_governor, extraction_governor, subagent_governor)},
+        ingest_jobs.stats(),
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+OVERLOADED = {"type": "error", "code": "overloaded", "message": "The assistant is busy right now. Please try again in a moment."}
+
 @app.post("/api/chat")
 async def chat_endpoint(chat_request: ChatRequest, request: Request):
     # TEMP: log headers + parsed body to confirm path/payload
     logger.info("x-from header: %s", request.headers.get("x-from"))
     logger.info("backendURL header: %s", request.headers.get("backendurl"))
-    logger.info("payload keys: %s", list(chat_request.model_dump().keys()))
+    logger.info("payload keys: %s", sorted(chat_request.model_fields_set))
 
-    logger.info(f"Received {len(chat_request.messages)} messages, last content preview: '{chat_request.messages[-1]['content'][:50] if chat_request.messages else 'EMPTY'}'")
+    last = chat_request.message or (chat_request.messages[-1] if chat_request.messages else None)
+    logger.info(f"Received {len(chat_request.messages)} messages, last content preview: '{str(last.get('content', ''))[:50] if last else 'EMPTY'}'")
 
     # Friendly guard instead of hard 422 if model name missing
     if not chat_request.selectedChatModel:
         err = {"type": "error", "message": "selectedChatModel is required"}
         return StreamingResponse(
-            iter([f"data: {json.dumps(err)}\n\n"]),
+            iter([encode_event(err)]),
             media_type="text/event-stream",
             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
-    async def event_stream() -> AsyncIterator[bytes]:
-        start = time.time()
+    client_id = _client_id(request)
+    # Stored conversations belong to the authenticated user only, never to a bare address
+    owner = _proxy_client(request)
+
+    # Shed load before opening a stream when the wait queue is already full
+    if stream_governor.full():
+        logger.warning("chat request shed | client=%s streams=%s", client_id, stream_governor.stats())
+        return StreamingResponse(
+            iter([encode_event(OVERLOADED)]),
+            status_code=503,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "Retry-After": "2"},
+        )
+
+    async def frames() -> AsyncIterator[bytes]:
+        ticket = None
         try:
+            ticket = stream_governor.enqueue(client_id)
+            async for position in wait_in_queue(ticket):
+                yield encode_event(data_event("queued", {"position": position}))
+
             async for chunk in stream_chat_py(
                 chat_request.messages,
                 chat_request.selectedChatModel,
+                mode=chat_request.mode,
+                intake_agent=chat_request.intakeAgent,
+                conversation_id=chat_request.conversationId,
+                new_message=chat_request.message,
+                owner=owner,
             ):
-                # Ensure each chunk is bytes; chunk should already be "data: {...}\n\n"
-                yield chunk.encode("utf-8")
+                # Chunks are already encoded "data: {...}\n\n" frames
+                yield chunk
+        except Overloaded as e:
+            logger.warning("chat request shed | client=%s reason=%s", client_id, e)
+            yield encode_event(OVERLOADED)
         except Exception as e:
             logger.exception("stream_chat_py failed")
-            yield f"data: {json.dumps({'type':'error','message':str(e)})}\n\n".encode("utf-8")
+            yield encode_event({"type": "error", "message": str(e)})
         finally:
-            duration_ms = int((time.time() - start) * 1000)
-            yield f"data: {json.dumps({'type':'metrics','duration_ms':duration_ms})}\n\n".encode("utf-8")
+            if ticket is not None:
+                ticket.release()
+
+    async def event_stream(source: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        start = time.time()
+        timings = start_request()
+        current_client.set(client_id)
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            timings.record("total", time.time() - start)
+
+        duration_ms = int((time.time() - start) * 1000)
+        event = {"type": "metrics", "duration_ms": duration_ms}
+        if SSE_METRICS_DETAIL:
+            event["stages_ms"] = timings.summary_ms()
+        yield encode_event(event)
 
     headers = {
         "Cache-Control": "no-cache",
@@ -76,5 +204,55 @@ async def chat_endpoint(chat_request: ChatRequest, request: Request):
         "X-Accel-Buffering": "no",
     }
 
+    if chat_request.resumable or chat_request.streamId:
+        stream_id = chat_request.streamId or secrets.token_urlsafe(16)
+        if not CLIENT_STREAM_ID_PATTERN.match(stream_id) or not await replay_store.create(stream_id, client_id):
+            err = {"type": "error", "code": "stream_id_invalid", "message": "streamId is invalid or already in use"}
+            return StreamingResponse(iter([encode_event(err)]), status_code=409, media_type="text/event-stream")
+        # The run is detached from this connection and logged with sequence numbers;
+        # this response is just the first reader of that log
+        start_detached_run(stream_id, event_stream(frames()))
+        return StreamingResponse(
+            replay_stream(stream_id, 0, request.is_disconnected),
+            media_type="text/event-stream",
+            headers={**headers, "X-Stream-Id": stream_id},
+        )
+
+    # Runs frames() in its own task so a disconnect cancels the model run,
+    # sub-agents and attachment jobs even while nothing is being sent
+    source = cancel_on_disconnect(frames(), request.is_disconnected)
     # IMPORTANT: no trailing comma here
-    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(event_stream(source), media_type="text/event-stream", headers=headers)
+
+@app.post("/api/ingest", status_code=202)
+async def ingest(ingest_request: IngestRequest, request: Request):
+    """Start extracting an uploaded attachment so the chat turn that uses it finds it ready"""
+    current_client.set(_client_id(request))
+    job = ingest_jobs.start(ingest_request.url, ingest_request.mediaType)
+    return job.to_dict()
+
+@app.get("/api/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job"}, status_code=404)
+    return job.to_dict()
+
+@app.get("/api/chat/stream/{stream_id}")
+async def resume_stream(stream_id: str, request: Request, lastEventId: Optional[int] = None):
+    """Replay a resumable run after the client's Last-Event-ID, then follow it live"""
+    after = lastEventId
+    if after is None:
+        try:
+            after = int(request.headers.get("last-event-id") or 0)
+        except ValueError:
+            after = 0
+    # 204 tells the client there is nothing to resume (unknown, expired or malformed id);
+    # another client's run looks the same as an unknown one
+    if not STREAM_ID_PATTERN.match(stream_id) or await replay_store.owner(stream_id) != _client_id(request):
+        return Response(status_code=204)
+    return StreamingResponse(
+        replay_stream(stream_id, after, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+    )
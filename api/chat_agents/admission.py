@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+from .telemetry import cancelled_runs
+
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_STREAMS = int(os.getenv("ADMISSION_MAX_STREAMS", "64"))
+ADMISSION_MAX_STREAMS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_STREAMS_PER_CLIENT", "4"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "128"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30"))
+ADMISSION_MAX_EXTRACTIONS = int(os.getenv("ADMISSION_MAX_EXTRACTIONS", "16"))
+ADMISSION_MAX_EXTRACTIONS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_EXTRACTIONS_PER_CLIENT", "4"))
+ADMISSION_MAX_SUBAGENTS = int(os.getenv("ADMISSION_MAX_SUBAGENTS", "16"))
+ADMISSION_MAX_SUBAGENTS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_SUBAGENTS_PER_CLIENT", "2"))
+# Callers without x-client-id are identified by address, which everyone behind one
+# proxy or NAT shares; their per-client caps are multiplied by this factor
+ADMISSION_ADDRESS_FACTOR = int(os.getenv("ADMISSION_ADDRESS_FACTOR", "4"))
+# Prefix of client ids derived from the caller's address rather than x-client-id
+ADDRESS_CLIENT_PREFIX = "addr:"
+# Secret the frontend proxy sends in x-proxy-secret; x-client-id is only trusted on
+# requests that carry it, so unset means every caller is identified by address
+PROXY_SHARED_SECRET = os.getenv("PROXY_SHARED_SECRET", "")
+# Run events buffered for a client that is not reading before the run is cancelled
+ADMISSION_MAX_BUFFERED_EVENTS = int(os.getenv("ADMISSION_MAX_BUFFERED_EVENTS", "2000"))
+# How often a stream with nothing to send checks whether its client is still connected
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "0.5"))
+# Frames produced ahead of the socket; beyond this the producer waits for the client
+_FRAME_BUFFER = 64
+_END = object()
+
+# Client the current request belongs to; set by chat_endpoint, inherited by spawned tasks
+current_client: ContextVar[str] = ContextVar("current_client", default="anonymous")
+
+
+class Overloaded(Exception):
+    """The wait queue is full; the caller should fail fast and retry later"""
+
+
+class SlowConsumer(Exception):
+    """The client stopped reading the stream, so the upstream run was cancelled"""
+
+
+class Ticket:
+    """A place in a Governor: granted immediately or waiting in its FIFO queue"""
+
+    def __init__(self, governor: "Governor", client: str):
+        self.governor = governor
+        self.client = client
+        self.granted = False
+        self.released = False
+        self._event = asyncio.Event()
+
+    @property
+    def position(self) -> int:
+        """1-based position in the wait queue, 0 once granted"""
+        if self.granted:
+            return 0
+        try:
+            return self.governor._waiting.index(self) + 1
+        except ValueError:
+            return 0
+
+    def _grant(self) -> None:
+        self.granted = True
+        self._event.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until granted or timeout; returns whether the ticket is granted"""
+        if not self.granted:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except TimeoutError:
+                pass
+        return self.granted
+
+    def release(self) -> None:
+        """Give the slot back, or leave the queue if still waiting; idempotent"""
+        if self.released:
+            return
+        self.released = True
+        self.governor._release(self)
+
+
+class Governor:
+    """
+    Concurrency limit with a global cap, a per-client cap and a bounded FIFO
+    wait queue. A waiter is granted as soon as both caps allow it; waiters
+    whose client is at its cap do not block other clients behind them.
+    """
+
+    def __init__(self, name: str, limit: int, per_client: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.per_client = per_client
+        self.max_queue = max_queue
+        self.active = 0
+        self.rejected = 0
+        self._by_client: Dict[str, int] = {}
+        self._waiting: Deque[Ticket] = deque()
+
+    def client_limit(self, client: str) -> int:
+        if client.startswith(ADDRESS_CLIENT_PREFIX):
+            return self.per_client * max(1, ADMISSION_ADDRESS_FACTOR)
+        return self.per_client
+
+    def _has_room(self, client: str) -> bool:
+        return self.active < self.limit and self._by_client.get(client, 0) < self.client_limit(client)
+
+    def _take(self, ticket: Ticket) -> None:
+        self.active += 1
+        self._by_client[ticket.client] = self._by_client.get(ticket.client, 0) + 1
+        ticket._grant()
+
+    def enqueue(self, client: str) -> Ticket:
+        """Take a slot now or join the queue; raises Overloaded when the queue is full"""
+        ticket = Ticket(self, client)
+        # Waiters are granted on every release, so any still queued while there is
+        # global room are blocked by their own per-client cap and do not go first
+        if self._has_room(client):
+            self._take(ticket)
+        elif len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.name}: {self.active} active, {len(self._waiting)} queued")
+        else:
+            self._waiting.append(ticket)
+        return ticket
+
+    def _release(self, ticket: Ticket) -> None:
+        if not ticket.granted:
+            try:
+                self._waiting.remove(ticket)
+            except ValueError:
+                pass
+            return
+        self.active -= 1
+        remaining = self._by_client.get(ticket.client, 1) - 1
+        if remaining:
+            self._by_client[ticket.client] = remaining
+        else:
+            self._by_client.pop(ticket.client, None)
+        self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        for waiter in list(self._waiting):
+            if self.active >= self.limit:
+                return
+            if self._by_client.get(waiter.client, 0) < self.client_limit(waiter.client):
+                self._waiting.remove(waiter)
+                self._take(waiter)
+
+    @asynccontextmanager
+    async def slot(self, client: Optional[str] = None, timeout_s: float = ADMISSION_QUEUE_TIMEOUT_S) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block, waiting in the queue if needed"""
+        ticket = self.enqueue(client or current_client.get())
+        try:
+            if not await ticket.wait(timeout_s):
+                raise Overloaded(f"{self.name}: timed out waiting for a slot")
+            yield
+        finally:
+            ticket.release()
+
+    def full(self) -> bool:
+        return self.active >= self.limit and len(self._waiting) >= self.max_queue
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "queued": len(self._waiting),
+            "limit": self.limit,
+            "rejected": self.rejected,
+        }
+
+
+stream_governor = Governor("streams", ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CLIENT, ADMISSION_QUEUE_SIZE)
+extraction_governor = Governor(
+    "extractions", ADMISSION_MAX_EXTRACTIONS, ADMISSION_MAX_EXTRACTIONS_PER_CLIENT, ADMISSION_QUEUE_SIZE,
+)
+subagent_governor = Governor(
+    "subagents", ADMISSION_MAX_SUBAGENTS, ADMISSION_MAX_SUBAGENTS_PER_CLIENT, ADMISSION_QUEUE_SIZE,
+)
+
+
+async def wait_in_queue(ticket: Ticket, timeout_s: float = ADMISSION_QUEUE_TIMEOUT_S) -> AsyncIterator[int]:
+    """Yield the ticket's queue position whenever it changes until it is granted"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s
+    last = -1
+    while not ticket.granted:
+        position = ticket.position
+        if position != last:
+            last = position
+            yield position
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            ticket.governor.rejected += 1
+            raise Overloaded(f"{ticket.governor.name}: timed out after {timeout_s:g}s in the queue")
+        await ticket.wait(min(1.0, remaining))
+
+
+async def cancel_on_disconnect(
+    frames: AsyncIterator[bytes],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_s: float = DISCONNECT_POLL_S,
+) -> AsyncIterator[bytes]:
+    """
+    Relay frames from a producer task that is cancelled as soon as the client leaves.
+
+    A failed write only reveals a disconnect when there is something to send;
+    during tool calls, sub-agent runs and attachment parsing nothing is, so the
+    connection is polled whenever no frame has arrived for poll_s. Cancelling
+    the producer raises CancelledError inside stream_chat_py, whose cleanup
+    cancels the Runner stream and with it any in-flight tool calls.
+    """
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=_FRAME_BUFFER)
+
+    async def produce() -> None:
+        try:
+            async for frame in frames:
+                await queue.put(frame)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+    finished = False
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), poll_s)
+            except TimeoutError:
+                if await is_disconnected():
+                    logger.info("client disconnected, cancelling run")
+                    return
+                continue
+            if item is _END:
+                finished = True
+                return
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+    finally:
+        # Also reached when the server closes this generator after a failed write
+        if not finished:
+            producer.cancel()
+            cancelled_runs.inc(reason="disconnect")
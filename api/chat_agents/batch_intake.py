@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from agents import Agent, Runner
+from pydantic import BaseModel, Field
+
+from .admission import subagent_governor
+from .lawyer_and_plantiff_agents import SUBAGENT_TIMEOUT_S, _LAWYER_AGENT, _PLAINTIFF_AGENT
+from .run_context import data_event
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_INTAKE_MODE = "batch-intake"
+BATCH_INTAKE_CONCURRENCY = int(os.getenv("BATCH_INTAKE_CONCURRENCY", "4"))
+
+
+class IntakeAssessment(BaseModel):
+    theory: str = Field(description="Primary legal theory, e.g. 'FEHA retaliation'")
+    jurisdiction: str = Field(description="State/federal jurisdiction the claim arises in")
+    sol_risk: str = Field(description="Statute of limitations risk: low, medium or high, with the deadline if known")
+    strength: int = Field(ge=0, le=100, description="Case strength score 0-100 per the scoring rubric")
+    top_risks: List[str] = Field(description="Up to three most important risks")
+    evidence_highlights: List[str] = Field(description="Up to three strongest pieces of evidence")
+    rationale: str = Field(description="One-paragraph rationale for the score")
+    sources: List[str] = Field(default_factory=list, description="Citations (URLs or statute cites) relied on")
+
+
+_BATCH_ADDENDUM = """
+
+---
+Batch Intake Mode
+You are scoring ONE intake out of several that will be ranked against each other.
+Fill every field of the structured output for this intake only. Keep the rationale to one paragraph.
+Research deadlines and statutes with the web tool as usual and list the citations in `sources`.
+""".rstrip()
+
+# Structured-output variants of the sub-agents, built once like the orchestrator
+_INTAKE_AGENTS: Dict[str, Agent] = {
+    "lawyer": _LAWYER_AGENT.clone(
+        name="lawyer-intake-agent",
+        instructions=_LAWYER_AGENT.instructions + _BATCH_ADDENDUM,
+        output_type=IntakeAssessment,
+    ),
+    "plaintiff": _PLAINTIFF_AGENT.clone(
+        name="plaintiff-intake-agent",
+        instructions=_PLAINTIFF_AGENT.instructions + _BATCH_ADDENDUM,
+        output_type=IntakeAssessment,
+    ),
+}
+
+
+def _case_query(case_id: str, intake_text: str, user_request: str) -> str:
+    request = user_request.strip() or "Score this intake."
+    return f"{case_id}\nUser request: {request}\n\nIntake:\n{intake_text}"
+
+
+def _case_markdown(case_id: str, label: str, result: Optional[IntakeAssessment], error: Optional[str]) -> str:
+    if result is None:
+        return f"\n\n### {case_id}: {label}\nCould not be scored: {error}\n"
+    return (
+        f"\n\n### {case_id}: {label} (strength {result.strength}/100)\n"
+        f"- Theory: {result.theory} ({result.jurisdiction})\n"
+        f"- SOL risk: {result.sol_risk}\n"
+        f"- Top risks: {'; '.join(result.top_risks) or 'n/a'}\n"
+        f"- Evidence: {'; '.join(result.evidence_highlights) or 'n/a'}\n\n"
+        f"{result.rationale}\n"
+    )
+
+
+def _ranking_table(cases: List[Tuple[str, str, Optional[IntakeAssessment]]]) -> str:
+    scored = sorted(
+        (case for case in cases if case[2] is not None),
+        key=lambda case: case[2].strength,
+        reverse=True,
+    )
+    lines = [
+        "\n\n## Ranking\n",
+        "| Rank | CaseID | Intake | Theory | Jurisdiction | SOL risk | Strength | Top 3 Risks | Evidence Highlights |",
+        "| --- | --- | --- | --- | --- | --- | --- | --- | --- |",
+    ]
+    for rank, (case_id, label, result) in enumerate(scored, start=1):
+        lines.append(
+            f"| {rank} | {case_id} | {label} | {result.theory} | {result.jurisdiction} | {result.sol_risk} "
+            f"| {result.strength} | {'; '.join(result.top_risks[:3])} | {'; '.join(result.evidence_highlights[:3])} |"
+        )
+    unscored = [case_id for case_id, _, result in cases if result is None]
+    if unscored:
+        lines.append(f"\nNot ranked (scoring failed): {', '.join(unscored)}")
+    if scored:
+        top = ", ".join(case_id for case_id, _, _ in scored[:2])
+        lines.append(f"\nAsk for a draft outbound intake letter for the top cases ({top}) if you want one.")
+    return "\n".join(lines) + "\n"
+
+
+async def stream_batch_intake(
+    intakes: List[Tuple[str, str]],
+    user_request: str,
+    agent_kind: str = "lawyer",
+    concurrency: int = BATCH_INTAKE_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Score each (label, text) intake concurrently and yield SSE payloads.
+
+    Each case's structured result is streamed as soon as it finishes (in
+    completion order), followed by one deterministic aggregation pass that
+    builds the ranking table, so wall-clock time tracks the slowest case.
+    """
+    agent = _INTAKE_AGENTS.get(agent_kind, _INTAKE_AGENTS["lawyer"])
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.time()
+
+    async def _score(index: int, label: str, text: str):
+        case_id = f"Case {index + 1}"
+        # The semaphore only caps this batch; the governor applies the global and
+        # per-client sub-agent limits shared with the orchestrator's tool calls.
+        # Cases queue behind the client's own runs, each bounded by the sub-agent
+        # timeout, so they may wait that long for a slot.
+        async with semaphore:
+            try:
+                async with subagent_governor.slot(timeout_s=SUBAGENT_TIMEOUT_S):
+                    run = await asyncio.wait_for(
+                        Runner.run(agent, _case_query(case_id, text, user_request)),
+                        timeout=SUBAGENT_TIMEOUT_S,
+                    )
+                return index, case_id, label, run.final_output_as(IntakeAssessment), None
+            except Exception as e:
+                logger.warning("batch intake case failed | case=%s error=%s", case_id, e)
+                return index, case_id, label, None, str(e) or type(e).__name__
+
+    yield {"type": "text-delta", "delta": f"Scoring {len(intakes)} intakes in parallel...\n"}
+
+    tasks = [asyncio.create_task(_score(i, label, text)) for i, (label, text) in enumerate(intakes)]
+    # (index, (case_id, label, result)) so the ranking lists cases in intake order
+    cases: List[Tuple[int, Tuple[str, str, Optional[IntakeAssessment]]]] = []
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, case_id, label, result, error = await finished
+            cases.append((index, (case_id, label, result)))
+            yield data_event("intake-result", {
+                "caseId": case_id,
+                "intake": label,
+                "result": result.model_dump() if result is not None else None,
+                "error": error,
+            })
+            yield {"type": "text-delta", "delta": _case_markdown(case_id, label, result, error)}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    cases.sort(key=lambda case: case[0])
+    yield {"type": "text-delta", "delta": _ranking_table([case for _, case in cases])}
+    logger.info(
+        "batch intake finished | cases=%d duration_ms=%d",
+        len(cases),
+        int((time.time() - start) * 1000),
+    )
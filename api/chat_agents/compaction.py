@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from agents import Agent, Runner
+
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "60000"))
+HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "6"))
+HISTORY_SUMMARY_BLOCK = int(os.getenv("HISTORY_SUMMARY_BLOCK", "8"))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4.1-mini")
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1024"))
+
+# Attachment bodies inlined by process_file_content
+_ATTACHMENT_BODY = re.compile(
+    r"\[(PDF File|Tabular File|Document File): ([^\]]+)\]\n(.*?)\n\[End of (?:PDF|Tabular File|Document)\]",
+    re.DOTALL,
+)
+
+_SUMMARIZER = Agent(
+    name="history-summarizer",
+    model=HISTORY_SUMMARY_MODEL,
+    instructions=(
+        "Summarize this excerpt of a legal intake conversation for the assistant's own memory. "
+        "Keep parties, jurisdiction, dates, deadlines, claims discussed, scores given, decisions, "
+        "open questions and any citations. Use terse bullets. Do not add facts."
+    ),
+)
+
+# English legal prose averages ~4 characters per token for OpenAI's o200k/cl100k
+# encodings. A character count is O(1) on str, unlike a real tokenizer over
+# fully inlined attachments, and needs no encoding download at runtime.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_tokens(str(m.get("content", ""))) + 4 for m in messages)
+
+
+def stub_attachments(text: str) -> str:
+    """Replace inlined attachment bodies with stable reference stubs"""
+    def _stub(match: "re.Match[str]") -> str:
+        # Nothing derived from the body: it may be rendered differently on later turns
+        kind, name = match.group(1), match.group(2)
+        return f"[{kind}: {name} - content omitted from an earlier turn]"
+    return _ATTACHMENT_BODY.sub(_stub, text)
+
+
+class SummaryCache:
+    """LRU of block summaries keyed by the hash of the conversation prefix they end"""
+
+    def __init__(self, max_entries: int = HISTORY_SUMMARY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, "asyncio.Task[None]"] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        summary = self._entries.get(key)
+        if summary is not None:
+            self._entries.move_to_end(key)
+        return summary
+
+    def put(self, key: str, summary: str) -> None:
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def schedule(self, key: str, block: List[Dict[str, Any]]) -> None:
+        """Summarize a block in the background, once per prefix"""
+        if key in self._pending or key in self._entries:
+            return
+        task = asyncio.create_task(self._summarize(key, block))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def _summarize(self, key: str, block: List[Dict[str, Any]]) -> None:
+        transcript = "\n\n".join(f"{m.get('role', 'user')}: {m.get('content', '')}" for m in block)
+        try:
+            result = await Runner.run(_SUMMARIZER, transcript)
+            self.put(key, str(result.final_output).strip())
+        except Exception as e:
+            logger.warning(f"history summary failed: {e}")
+
+
+summary_cache = SummaryCache()
+
+
+def _prefix_key(previous: str, block: List[Dict[str, Any]]) -> str:
+    digest = hashlib.sha256(previous.encode("utf-8"))
+    digest.update(json.dumps(block, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _extractive_summary(block: List[Dict[str, Any]], limit: int = 280) -> str:
+    lines = []
+    for m in block:
+        text = " ".join(str(m.get("content", "")).split())
+        lines.append(f"- {m.get('role', 'user')}: {text[:limit]}{'…' if len(text) > limit else ''}")
+    return "\n".join(lines)
+
+
+def compact_history(
+    messages: List[Dict[str, Any]],
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    keep_messages: int = HISTORY_KEEP_MESSAGES,
+    block_size: int = HISTORY_SUMMARY_BLOCK,
+) -> List[Dict[str, Any]]:
+    """
+    Shrink agent input to the token budget while keeping recent turns verbatim.
+
+    Older messages first lose their inlined attachment bodies. If that is not
+    enough, they are replaced block by block with summaries. Blocks are
+    aligned to the start of the conversation and keyed by a chained prefix
+    hash, so each block is summarized once and reused on every later turn.
+    A block whose summary is not ready yet is summarized in the background
+    and represented by a short extract for this turn.
+    """
+    if _messages_tokens(messages) <= token_budget or len(messages) <= keep_messages:
+        return messages
+
+    split = len(messages) - keep_messages
+    head = [{**m, "content": stub_attachments(str(m.get("content", "")))} for m in messages[:split]]
+    tail = messages[split:]
+    if _messages_tokens(head) + _messages_tokens(tail) <= token_budget:
+        return head + tail
+
+    compacted: List[Dict[str, Any]] = []
+    prefix = ""
+    full_blocks = len(head) // block_size
+    for index in range(full_blocks):
+        block = head[index * block_size:(index + 1) * block_size]
+        prefix = _prefix_key(prefix, block)
+        summary = summary_cache.get(prefix)
+        if summary is None:
+            summary_cache.schedule(prefix, block)
+            summary = _extractive_summary(block)
+        first = index * block_size + 1
+        compacted.append({
+            "content": f"[Summary of earlier conversation, messages {first}-{first + len(block) - 1}]\n{summary}",
+            "role": "developer",
+            "type": "message",
+        })
+    compacted.extend(head[full_blocks * block_size:])
+
+    result = compacted + tail
+    if _messages_tokens(result) > token_budget:
+        # Recent turns alone are over budget; keep only the newest attachment bodies
+        result = compacted + [
+            {**m, "content": stub_attachments(str(m.get("content", "")))} for m in tail[:-1]
+        ] + tail[-1:]
+    logger.info(
+        "history compacted | messages=%d->%d tokens~%d",
+        len(messages),
+        len(result),
+        _messages_tokens(result),
+    )
+    return result
@@ -0,0 +1,241 @@
+import html
+import logging
+import os
+import re
+import time
+import zipfile
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesFeedParser
+from io import BytesIO
+from typing import BinaryIO, List, Union
+from xml.etree.ElementTree import iterparse
+
+from .pdf_engine import PDF_MAX_CHARS, _open_reader, iter_pdf_pages
+from .tabular import _OLE_MAGIC, _ZIP_MAGIC, summarize_table
+
+try:
+    import extract_msg
+except ImportError:  # Outlook .msg files are reported as unsupported without it
+    extract_msg = None
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_MAX_CHARS = int(os.getenv("DOCUMENT_MAX_CHARS", str(PDF_MAX_CHARS)))
+# Wall-clock budget for one document including everything nested in it
+DOCUMENT_PARSE_TIMEOUT_S = float(os.getenv("DOCUMENT_PARSE_TIMEOUT_S", "30"))
+# How deep forwarded emails and attachments inside attachments are followed
+DOCUMENT_MAX_DEPTH = int(os.getenv("DOCUMENT_MAX_DEPTH", "3"))
+# Uncompressed size limit for a DOCX body, against zip bombs
+DOCX_MAX_XML_BYTES = int(os.getenv("DOCX_MAX_XML_BYTES", str(64 * 1024 * 1024)))
+
+EMAIL_MEDIA_TYPES = ("message/rfc822", "application/vnd.ms-outlook")
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+DocumentSource = Union[bytes, str]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_FEED_CHUNK = 64 * 1024
+_HTML_BREAK = re.compile(r"(?i)<\s*(br|/p|/div|/tr|/li|/h[1-6])\b[^>]*>")
+_HTML_DROP = re.compile(r"(?is)<(script|style|head)\b.*?</\1\s*>")
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+
+class _Budget:
+    """Characters and time left for one top-level document"""
+
+    def __init__(self, max_chars: int, timeout_s: float):
+        self.chars = max_chars
+        self.deadline = time.monotonic() + timeout_s
+
+    def take(self, text: str) -> str:
+        text = text[: max(0, self.chars)]
+        self.chars -= len(text)
+        return text
+
+    @property
+    def exhausted(self) -> bool:
+        return self.chars <= 0 or time.monotonic() > self.deadline
+
+
+def _docx_text(stream: BinaryIO, budget: _Budget) -> str:
+    with zipfile.ZipFile(stream) as archive:
+        try:
+            info = archive.getinfo("word/document.xml")
+        except KeyError:
+            return "[Not a Word document: word/document.xml is missing]"
+        if info.file_size > DOCX_MAX_XML_BYTES:
+            return f"[Word document body is {info.file_size:,} bytes uncompressed; over the {DOCX_MAX_XML_BYTES:,} byte limit]"
+        parts: List[str] = []
+        in_cell = 0
+        with archive.open(info) as xml:
+            # iterparse keeps memory flat; finished elements are cleared as we go
+            for event, elem in iterparse(xml, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == _W + "tab":
+                        parts.append("\t")
+                    elif tag in (_W + "br", _W + "cr"):
+                        parts.append(" " if in_cell else "\n")
+                    elif tag == _W + "tc":
+                        in_cell += 1
+                    continue
+                if tag == _W + "t" and elem.text:
+                    parts.append(budget.take(elem.text))
+                elif tag == _W + "p":
+                    parts.append(" " if in_cell else "\n")
+                elif tag == _W + "tc":
+                    # Table rows become "cell | cell | cell" lines
+                    in_cell -= 1
+                    if parts and parts[-1] == " ":
+                        parts.pop()
+                    parts.append(" | ")
+                elif tag == _W + "tr":
+                    if parts and parts[-1] == " | ":
+                        parts.pop()
+                    parts.append("\n")
+                elif tag == _W + "tbl":
+                    parts.append("\n")
+                if tag in (_W + "p", _W + "tbl"):
+                    elem.clear()
+                    if budget.exhausted:
+                        parts.append("\n[Document truncated: character or time budget reached]")
+                        break
+    text = "".join(parts)
+    return re.sub(r"\n{3,}", "\n\n", text).strip() or "[Word document contains no text]"
+
+
+def _html_to_text(markup: str) -> str:
+    markup = _HTML_DROP.sub(" ", markup)
+    markup = _HTML_BREAK.sub("\n", markup)
+    text = html.unescape(_HTML_TAG.sub(" ", markup))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _pdf_text(data: bytes, budget: _Budget) -> str:
+    parts = []
+    with _open_reader(data) as reader:
+        for text in iter_pdf_pages(reader, 0, len(reader.pages)):
+            parts.append(budget.take(text))
+            if budget.exhausted:
+                break
+    return "\n".join(parts).strip()
+
+
+def _attachment_text(name: str, content_type: str, data: bytes, depth: int, budget: _Budget) -> str:
+    """Text of a nested attachment, dispatching on its content rather than its label"""
+    lower = name.lower()
+    magic = data[:4]
+    if depth >= DOCUMENT_MAX_DEPTH:
+        return "[Not extracted: nested too deeply]"
+    if budget.exhausted:
+        return "[Not extracted: character or time budget reached]"
+    if magic == b"%PDF":
+        return _pdf_text(data, budget)
+    if magic == _ZIP_MAGIC and (lower.endswith(".docx") or content_type == DOCX_MEDIA_TYPE):
+        return _docx_text(BytesIO(data), budget)
+    if (magic in (_ZIP_MAGIC, _OLE_MAGIC) and lower.endswith((".xlsx", ".xls"))) or lower.endswith(".csv"):
+        return budget.take(summarize_table(data))
+    if magic == _OLE_MAGIC and lower.endswith(".msg"):
+        return _msg_text(data, depth + 1, budget)
+    if content_type == "message/rfc822" or lower.endswith(".eml"):
+        return _email_text(_parse_email(BytesIO(data)), depth + 1, budget)
+    if content_type.startswith("text/"):
+        text = data.decode("utf-8", errors="ignore")
+        return budget.take(_html_to_text(text) if content_type == "text/html" else text)
+    return f"[Not extracted: {content_type or 'unknown type'}, {len(data):,} bytes]"
+
+
+def _parse_email(stream: BinaryIO) -> EmailMessage:
+    parser = BytesFeedParser(policy=policy.default)
+    while True:
+        chunk = stream.read(_FEED_CHUNK)
+        if not chunk:
+            break
+        parser.feed(chunk)
+    return parser.close()
+
+
+def _email_body(message: EmailMessage) -> str:
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except (LookupError, UnicodeError):
+        content = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+    return _html_to_text(content) if part.get_content_type() == "text/html" else content.strip()
+
+
+def _email_text(message: EmailMessage, depth: int, budget: _Budget) -> str:
+    headers = [f"{name}: {message[name]}" for name in ("From", "To", "Cc", "Date", "Subject") if message[name]]
+    sections = ["\n".join(headers), budget.take(_email_body(message))]
+    for index, part in enumerate(message.iter_attachments(), start=1):
+        name = part.get_filename() or f"attachment-{index}"
+        content_type = part.get_content_type()
+        if content_type == "message/rfc822":
+            # Forwarded messages arrive already parsed as the part's payload
+            inner = part.get_payload(0) if part.is_multipart() else _parse_email(BytesIO(part.get_payload(decode=True) or b""))
+            text = _email_text(inner, depth + 1, budget) if depth + 1 < DOCUMENT_MAX_DEPTH else "[Not extracted: nested too deeply]"
+        else:
+            text = _attachment_text(name, content_type, part.get_payload(decode=True) or b"", depth + 1, budget)
+        sections.append(f"[Attachment: {name} ({content_type})]\n{text}\n[End of Attachment: {name}]")
+    return "\n\n".join(s for s in sections if s)
+
+
+def _msg_text(data: Union[bytes, str], depth: int, budget: _Budget) -> str:
+    if extract_msg is None:
+        return "[Outlook .msg preview unavailable: extract-msg is not installed. Save the message as .eml and upload it again.]"
+    message = extract_msg.openMsg(data)
+    try:
+        headers = [
+            f"{label}: {value}"
+            for label, value in (
+                ("From", message.sender), ("To", message.to), ("Cc", message.cc),
+                ("Date", message.date), ("Subject", message.subject),
+            )
+            if value
+        ]
+        sections = ["\n".join(headers), budget.take((message.body or "").strip())]
+        for index, attachment in enumerate(message.attachments, start=1):
+            name = attachment.longFilename or attachment.shortFilename or f"attachment-{index}"
+            payload = attachment.data
+            if isinstance(payload, bytes):
+                text = _attachment_text(name, "", payload, depth + 1, budget)
+            else:
+                text = "[Embedded Outlook message not extracted]"
+            sections.append(f"[Attachment: {name}]\n{text}\n[End of Attachment: {name}]")
+    finally:
+        message.close()
+    return "\n\n".join(s for s in sections if s)
+
+
+def _open_binary(source: DocumentSource) -> BinaryIO:
+    return BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+
+
+def extract_document(
+    source: DocumentSource,
+    max_chars: int = DOCUMENT_MAX_CHARS,
+    timeout_s: float = DOCUMENT_PARSE_TIMEOUT_S,
+) -> str:
+    """
+    Extract an email (.eml MIME or Outlook .msg) or a DOCX file to text.
+
+    Runs in the extraction worker pool. The format is sniffed from the content.
+    Emails are rendered as headers and body, followed by each attachment
+    extracted recursively up to DOCUMENT_MAX_DEPTH. One character and time
+    budget covers the document and everything nested in it.
+    """
+    budget = _Budget(max_chars, timeout_s)
+    with _open_binary(source) as stream:
+        magic = stream.read(4)
+        stream.seek(0)
+        if magic == _ZIP_MAGIC:
+            return _docx_text(stream, budget)
+        if magic == _OLE_MAGIC:
+            # extract_msg opens the file itself from a path or bytes
+            return _msg_text(source, 0, budget)
+        return _email_text(_parse_email(stream), 0, budget)
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction output changes so stale disk entries are ignored
+EXTRACTOR_VERSION = "3"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_URLS = 4096
+
+
+def content_hash(data: bytes) -> str:
+    """Stable content key for a downloaded attachment body"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _entry_key(content_key: str, media_type: str) -> str:
+    raw = f"{EXTRACTOR_VERSION}:{media_type}:{content_key}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _url_key(url: str, media_type: str) -> str:
+    raw = f"{EXTRACTOR_VERSION}:{media_type}:{url}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ExtractCache:
+    """
+    Two-tier cache of extracted attachment text.
+
+    Entries are content-addressed (sha256 of the downloaded body) so the
+    same file uploaded under two URLs is parsed once. A small URL index maps
+    each URL we have already seen to its content key, which lets later turns
+    skip the download entirely.
+
+    The memory tier is an LRU bounded by the UTF-8 size of the stored text.
+    The optional disk tier survives restarts and is shared between workers
+    pointed at the same directory; its reads and writes run in a thread so
+    they never block the event loop.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_dir: Optional[str] = None,
+        max_urls: int = DEFAULT_MAX_URLS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_urls = max_urls
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._urls: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(os.path.join(disk_dir, "urls"), exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ExtractCache":
+        return cls(
+            max_bytes=int(os.getenv("EXTRACT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            disk_dir=os.getenv("EXTRACT_CACHE_DIR") or None,
+        )
+
+    # --- lookups
+
+    def peek_by_url(self, url: str, media_type: str) -> Optional[str]:
+        """Memory-tier lookup of a URL we have already resolved, for callers that cannot await"""
+        content_key = self._memory_url(_url_key(url, media_type))
+        if content_key is None:
+            return None
+        return self._memory_entry(_entry_key(content_key, media_type))
+
+    async def get_by_url(self, url: str, media_type: str) -> Optional[str]:
+        """Return cached text for a URL we have already resolved, without any I/O on a memory hit"""
+        ukey = _url_key(url, media_type)
+        content_key = self._memory_url(ukey)
+        if content_key is None and self.disk_dir:
+            content_key = await asyncio.to_thread(self._disk_read, os.path.join("urls", ukey))
+        if content_key is None:
+            # Unknown URL; the miss is recorded by the content lookup after download
+            return None
+        return await self.get_by_content(content_key, media_type)
+
+    async def get_by_content(self, content_key: str, media_type: str) -> Optional[str]:
+        key = _entry_key(content_key, media_type)
+        text = self._memory_entry(key)
+        if text is not None:
+            return text
+
+        if self.disk_dir:
+            text = await asyncio.to_thread(self._disk_read, self._disk_entry_path(key))
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, text)
+        return text
+
+    def _memory_url(self, ukey: str) -> Optional[str]:
+        with self._lock:
+            content_key = self._urls.get(ukey)
+            if content_key is not None:
+                self._urls.move_to_end(ukey)
+            return content_key
+
+    def _memory_entry(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return text
+
+    # --- writes
+
+    async def put(self, url: str, media_type: str, content_key: str, text: str) -> None:
+        key = _entry_key(content_key, media_type)
+        ukey = _url_key(url, media_type)
+        with self._lock:
+            self._insert(key, text)
+            self._urls[ukey] = content_key
+            self._urls.move_to_end(ukey)
+            while len(self._urls) > self.max_urls:
+                self._urls.popitem(last=False)
+
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, ukey, content_key, text)
+
+    def _insert(self, key: str, text: str) -> None:
+        # Caller holds the lock
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._sizes[key]
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    # --- disk tier
+
+    def _disk_entry_path(self, key: str) -> str:
+        return os.path.join(key[:2], f"{key}.txt")
+
+    def _disk_read(self, rel_path: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(os.path.join(self.disk_dir, rel_path), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"extract cache disk read failed: {e}")
+            return None
+
+    def _disk_put(self, key: str, ukey: str, content_key: str, text: str) -> None:
+        # Entry before URL, so a URL found on disk always resolves to text
+        self._disk_write(self._disk_entry_path(key), text)
+        self._disk_write(os.path.join("urls", ukey), content_key)
+
+    def _disk_write(self, rel_path: str, text: str) -> None:
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, rel_path)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"extract cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+extract_cache = ExtractCache.from_env()
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+FETCH_TIMEOUT_S = float(os.getenv("ATTACHMENT_FETCH_TIMEOUT_S", "30"))
+FETCH_CONNECT_TIMEOUT_S = float(os.getenv("ATTACHMENT_CONNECT_TIMEOUT_S", "5"))
+FETCH_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+FETCH_CONCURRENCY = int(os.getenv("ATTACHMENT_FETCH_CONCURRENCY", "8"))
+SPOOL_THRESHOLD_BYTES = int(os.getenv("ATTACHMENT_SPOOL_THRESHOLD_BYTES", str(2 * 1024 * 1024)))
+SPOOL_DIR = os.getenv("ATTACHMENT_SPOOL_DIR") or None
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class SpooledAttachment:
+    """
+    Download target that stays in memory until it crosses a size threshold,
+    then moves to a temp file on disk. The sha256 is computed as chunks
+    arrive, so the content key never needs the whole body in memory.
+    """
+
+    def __init__(self, threshold: int = SPOOL_THRESHOLD_BYTES):
+        self.threshold = threshold
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer: Optional[BytesIO] = BytesIO()
+        self._file: Optional[BinaryIO] = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self.threshold:
+            fd, self.path = tempfile.mkstemp(prefix="attachment-", dir=SPOOL_DIR)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        elif self._file is None:
+            self._buffer.write(chunk)
+            return
+        self._file.write(chunk)
+
+    def finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def content_key(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """Bytes for small bodies, the spool file path for large ones"""
+        return self.path if self.path is not None else self._buffer.getvalue()
+
+    def open(self) -> BinaryIO:
+        if self.path is not None:
+            return open(self.path, "rb")
+        return BytesIO(self._buffer.getvalue())
+
+    def close(self) -> None:
+        self.finish()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._buffer = None
+
+    def __enter__(self) -> "SpooledAttachment":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for attachment downloads"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(FETCH_TIMEOUT_S, connect=FETCH_CONNECT_TIMEOUT_S),
+            limits=httpx.Limits(
+                max_connections=FETCH_CONCURRENCY * 2,
+                max_keepalive_connections=FETCH_CONCURRENCY,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def aclose_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_to_spool(url: str, max_bytes: int = FETCH_MAX_BYTES) -> SpooledAttachment:
+    """Stream url into a SpooledAttachment, aborting once the body exceeds max_bytes"""
+    spool = SpooledAttachment()
+    try:
+        async with _semaphore:
+            client = get_http_client()
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise AttachmentTooLarge(
+                        f"attachment is {int(declared)} bytes (limit {max_bytes})"
+                    )
+
+                async for chunk in response.aiter_bytes():
+                    if spool.size + len(chunk) > max_bytes:
+                        raise AttachmentTooLarge(f"attachment exceeds {max_bytes} bytes")
+                    spool.write(chunk)
+        spool.finish()
+    except BaseException:
+        spool.close()
+        raise
+
+    logger.debug("fetched attachment | bytes=%d spooled=%s url=%s", spool.size, spool.path is not None, url)
+    return spool
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from .extract_cache import extract_cache
+from .orchestrator import is_extractable, prefetch_attachment
+
+
+logger = logging.getLogger(__name__)
+
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "1000"))
+# Finished jobs are forgotten after this; the extracted text stays in the extract cache
+INGEST_JOB_TTL_S = float(os.getenv("INGEST_JOB_TTL_S", "3600"))
+
+JOB_STATUSES = ("pending", "running", "ready", "error", "unsupported")
+
+
+def job_id_for(url: str, media_type: str) -> str:
+    return hashlib.sha256(f"{media_type}\n{url}".encode("utf-8")).hexdigest()[:24]
+
+
+class IngestJob:
+    """Background extraction of one uploaded attachment"""
+
+    def __init__(self, job_id: str, url: str, media_type: str):
+        self.id = job_id
+        self.url = url
+        self.media_type = media_type
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.chars: Optional[int] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "mediaType": self.media_type,
+            "chars": self.chars,
+            "error": self.error,
+            "elapsed_ms": int(((self.finished_at or time.time()) - self.created_at) * 1000),
+        }
+
+
+class IngestJobs:
+    """
+    Registry of prefetch jobs, keyed by URL and media type so repeated calls
+    for one upload share a job. The extraction itself goes through the same
+    single-flight path as chat turns, so a turn that references the file while
+    the job runs waits on it instead of downloading again.
+    """
+
+    def __init__(self, max_jobs: int = INGEST_MAX_JOBS, ttl_s: float = INGEST_JOB_TTL_S):
+        self.max_jobs = max_jobs
+        self.ttl_s = ttl_s
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        for job_id in [j for j, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+        while len(self._jobs) >= self.max_jobs:
+            # Prefer forgetting finished jobs; running ones keep going regardless
+            finished = next((j for j, job in self._jobs.items() if job.finished_at), None)
+            if finished is None:
+                self._jobs.popitem(last=False)
+            else:
+                del self._jobs[finished]
+
+    def start(self, url: str, media_type: str) -> IngestJob:
+        """Return the job for this attachment, starting extraction if it is not cached or running"""
+        job_id = job_id_for(url, media_type)
+        job = self._jobs.get(job_id)
+        if job is not None and job.status != "error":
+            return job
+
+        self._purge()
+        job = self._jobs[job_id] = IngestJob(job_id, url, media_type)
+        if not is_extractable(media_type):
+            job.status = "unsupported"
+            job.finished_at = time.time()
+            return job
+        # Memory tier only: this runs inline in the request; the job checks the disk tier
+        cached = extract_cache.peek_by_url(url, media_type)
+        if cached is not None:
+            job.status = "ready"
+            job.chars = len(cached)
+            job.finished_at = time.time()
+            return job
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: IngestJob) -> None:
+        job.status = "running"
+        try:
+            text = await prefetch_attachment(job.url, job.media_type)
+        except asyncio.CancelledError:
+            job.status = "error"
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            logger.warning("attachment prefetch failed | url=%s error=%s", job.url, e)
+            job.status = "error"
+            job.error = str(e)
+        else:
+            job.status = "ready"
+            job.chars = len(text)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Remembered jobs per status, every status included so gauges drop back to zero"""
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+
+ingest_jobs = IngestJobs()
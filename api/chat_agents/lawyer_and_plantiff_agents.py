@@ -1,9 +1,26 @@
-from agents import Agent, Runner, WebSearchTool, function_tool
+import asyncio
+import logging
+import os
+import time
+from typing import Any, List
+
+from agents import Agent, RunContextWrapper, Runner, function_tool
 from dotenv import load_dotenv
 
+from .admission import subagent_governor
+from .retrieval import search_attachments
+from .web_search import web_search_tools
+from .run_context import ChatRunContext, data_event, text_delta_from_event, tool_name_from_event
+from .telemetry import record
+
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Upper bound on one sub-agent run, including its web searches
+SUBAGENT_TIMEOUT_S = float(os.getenv("SUBAGENT_TIMEOUT_S", "90"))
+
 # 1) Plaintiff Agent Instructions
 plaintiff_instructions = """
 Role & Mission
@@ -148,23 +165,75 @@ _PLAINTIFF_AGENT = Agent(
     name="plaintiff-agent",
     model="gpt-4.1",
     instructions=plaintiff_instructions,
-    tools=[WebSearchTool()],
+    tools=[*web_search_tools(), search_attachments],
 )
 
 _LAWYER_AGENT = Agent(
     name="lawyer-agent",
     model="gpt-4.1",
     instructions=lawyer_instructions,
-    tools=[WebSearchTool()],
+    tools=[*web_search_tools(), search_attachments],
 )
 
 
+async def run_subagent(
+    ctx: RunContextWrapper[Any],
+    agent: Agent,
+    tool_name: str,
+    query: str,
+    timeout_s: float = SUBAGENT_TIMEOUT_S,
+) -> str:
+    """
+    Run a sub-agent with streaming, forwarding its progress and partial text
+    to the client through the run context. On timeout the partial answer is
+    returned with a note; cancellation of the outer run cancels the sub-agent.
+    """
+    run_ctx = ctx.context if isinstance(ctx.context, ChatRunContext) else None
+
+    def emit(name: str, **data: Any) -> None:
+        if run_ctx is not None:
+            run_ctx.emit(data_event(name, {"agent": tool_name, **data}))
+
+    start = time.time()
+    emit("agent-progress", status="started")
+    # The run context carries the conversation's attachment index for search_attachments
+    streamed = Runner.run_streamed(agent, query, context=run_ctx)
+    partial: List[str] = []
+    try:
+        async with asyncio.timeout(timeout_s):
+            async for ev in streamed.stream_events():
+                delta = text_delta_from_event(ev)
+                if delta:
+                    partial.append(delta)
+                    emit("agent-text", delta=delta)
+                    continue
+                called = tool_name_from_event(ev)
+                if called:
+                    emit("agent-progress", status="tool", tool=called)
+    except TimeoutError:
+        streamed.cancel()
+        record("subagent", time.time() - start, tool_name)
+        logger.warning("%s timed out after %.1fs", tool_name, timeout_s)
+        emit("agent-progress", status="timeout")
+        return "".join(partial) + f"\n\n[{tool_name} stopped after {timeout_s:g}s; answer may be incomplete]"
+    except asyncio.CancelledError:
+        streamed.cancel()
+        raise
+
+    record("subagent", time.time() - start, tool_name)
+    logger.info("%s finished | duration_ms=%d", tool_name, int((time.time() - start) * 1000))
+    emit("agent-progress", status="finished")
+    return str(streamed.final_output or "".join(partial))
+
+
 @function_tool(name_override="plaintiffAgent")
-def plaintiffAgent(query: str) -> str:
-    agent = Runner(_PLAINTIFF_AGENT).run(query)
-    return agent 
+async def plaintiffAgent(ctx: RunContextWrapper[Any], query: str) -> str:
+    """Analyze a potential plaintiff's situation: claims, case strength, deadlines, next steps and firms."""
+    async with subagent_governor.slot():
+        return await run_subagent(ctx, _PLAINTIFF_AGENT, "plaintiffAgent", query)
 
 @function_tool(name_override="lawyerAgent")
-def lawyerAgent(query: str) -> str:
-    agent = Runner(_LAWYER_AGENT).run(query)
-    return agent 
+async def lawyerAgent(ctx: RunContextWrapper[Any], query: str) -> str:
+    """Produce a research memo for counsel: issues, applicable law, analysis, risks and a take/decline call."""
+    async with subagent_governor.slot():
+        return await run_subagent(ctx, _LAWYER_AGENT, "lawyerAgent", query)
@@ -1,307 +1,740 @@
+import asyncio
+import hashlib
 import json 
 import time
 import logging 
 import os
 import re
-import csv
-import requests
-from io import BytesIO, StringIO
-from typing import List, Any, Dict, AsyncIterator
+from typing import List, Any, Dict, AsyncIterator, Awaitable, Callable, Optional, Tuple
 from dotenv import load_dotenv
-from agents import Agent, Runner, WebSearchTool, CodeInterpreterTool
-import PyPDF2
+from agents import Agent, Runner
 
 # subagent
 from .lawyer_and_plantiff_agents import plaintiffAgent, lawyerAgent
+from .admission import ADMISSION_MAX_BUFFERED_EVENTS, SlowConsumer, extraction_governor
+from .batch_intake import BATCH_INTAKE_MODE, stream_batch_intake
+from .compaction import compact_history
+from .extract_cache import extract_cache
+from .state_store import conversation_store
+from .response_cache import replay_chunks, response_cache
+from .sse import END_STEP, START_STEP, TEXT_END, TEXT_START, SSEEncoder, encode_delta, encode_event
+from .run_context import (
+    ChatRunContext,
+    data_event,
+    text_delta_from_event,
+    tool_call_id_from_event,
+    tool_name_from_event,
+)
+from .telemetry import cancelled_runs, mark, record, timed
+from .fetch import SpooledAttachment, fetch_to_spool
+from .pdf_engine import extract_pdf, run_in_pool
+from .tabular import TABULAR_PARSE_TIMEOUT_S, summarize_table
+from .documents import DOCUMENT_PARSE_TIMEOUT_S, DOCX_MEDIA_TYPE, EMAIL_MEDIA_TYPES, extract_document
+from .web_search import web_search_tools
+from .structured import STRUCTURED_ADDENDUM, STRUCTURED_MODE, CaseReport, FieldStreamParser, structured_result
+from .retrieval import RETRIEVAL_INLINE_MAX_CHARS, AttachmentIndex, index_for, render_excerpts, render_reference, search_attachments
 
 
 logger = logging.getLogger(__name__)
 
-def extract_pdf_text(url: str) -> str:
+# Pattern to match file references: [File: filename (mediaType) - URL: url]
+FILE_REF_PATTERN = re.compile(r'\[File: ([^(]+) \(([^)]+)\) - URL: ([^\]]+)\]')
+# Stored user messages list their attachments as [filename, mediaType, url] under this key
+ATTACHMENTS_KEY = "attachments"
+
+TABULAR_MEDIA_TYPES = (
+    'text/csv',
+    'application/vnd.ms-excel',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+)
+DOCUMENT_MEDIA_TYPES = EMAIL_MEDIA_TYPES + (DOCX_MEDIA_TYPE,)
+
+# Extractions currently running, so concurrent references to one URL share a download,
+# with the number of requests waiting on each so abandoned ones can be cancelled
+_inflight: Dict[Tuple[str, str], "asyncio.Future[str]"] = {}
+_inflight_waiters: Dict[Tuple[str, str], int] = {}
+
+async def _await_shared(key: Tuple[str, str], task: "asyncio.Future[str]") -> str:
+    # shield() keeps one cancelled request from killing a download others still need;
+    # once every waiter has gone the download is cancelled too
+    _inflight_waiters[key] = _inflight_waiters.get(key, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _inflight_waiters[key] -= 1
+        if not _inflight_waiters[key]:
+            del _inflight_waiters[key]
+            if not task.done():
+                _inflight.pop(key, None)
+                task.cancel()
+
+async def _cached_extract(
+    url: str,
+    media_type: str,
+    parse: Callable[[SpooledAttachment], Awaitable[str]],
+    kind: str,
+) -> str:
+    """Return extracted text for url, downloading and parsing only on a cache miss"""
+    cached = await extract_cache.get_by_url(url, media_type)
+    if cached is not None:
+        return cached
+
+    key = (url, media_type)
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await _await_shared(key, pending)
+
+    async def _extract() -> str:
+        async with extraction_governor.slot():
+            with timed("attachment_fetch"):
+                attachment = await fetch_to_spool(url)
+            with attachment:
+                content_key = attachment.content_key
+                text = await extract_cache.get_by_content(content_key, media_type)
+                if text is None:
+                    with timed("parse", kind):
+                        text = await parse(attachment)
+        await extract_cache.put(url, media_type, content_key, text)
+        return text
+
+    task = asyncio.ensure_future(_extract())
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await _await_shared(key, task)
+
+async def _summarize_tabular(attachment: SpooledAttachment) -> str:
+    # Profiling large ledgers is CPU-bound, so it shares the extraction worker pool
+    deadline = time.monotonic() + TABULAR_PARSE_TIMEOUT_S
+    try:
+        return await run_in_pool(deadline, summarize_table, attachment.source)
+    except TimeoutError:
+        raise TimeoutError(f"profiling the table took longer than {TABULAR_PARSE_TIMEOUT_S:g}s") from None
+
+def _parse_pdf(attachment: SpooledAttachment) -> Awaitable[str]:
+    return extract_pdf(attachment.source)
+
+async def _parse_document(attachment: SpooledAttachment) -> str:
+    # The worker also checks the budget between parts; if it is stuck inside one
+    # parser the pool is retired so the worker is not lost
+    deadline = time.monotonic() + DOCUMENT_PARSE_TIMEOUT_S + 5
+    try:
+        return await run_in_pool(deadline, extract_document, attachment.source)
+    except TimeoutError:
+        raise TimeoutError(f"document parsing took longer than {DOCUMENT_PARSE_TIMEOUT_S:g}s") from None
+
+def is_extractable(media_type: str) -> bool:
+    return (
+        media_type == 'application/pdf'
+        or media_type in TABULAR_MEDIA_TYPES
+        or media_type in DOCUMENT_MEDIA_TYPES
+    )
+
+async def prefetch_attachment(url: str, media_type: str) -> str:
+    """Extract an attachment into the shared cache ahead of the chat turn; raises on failure"""
+    if media_type == 'application/pdf':
+        return await _cached_extract(url, media_type, _parse_pdf, "pdf")
+    if media_type in TABULAR_MEDIA_TYPES:
+        return await _cached_extract(url, media_type, _summarize_tabular, "tabular")
+    if media_type in DOCUMENT_MEDIA_TYPES:
+        return await _cached_extract(url, media_type, _parse_document, "document")
+    raise ValueError(f"unsupported media type {media_type!r}")
+
+async def extract_pdf_text(url: str) -> str:
     """Extract text from PDF file"""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        pdf_file = BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-            
-        return text.strip()
+        return await _cached_extract(
+            url,
+            'application/pdf',
+            _parse_pdf,
+            "pdf",
+        )
     except Exception as e:
         logger.error(f"Error extracting PDF text: {e}")
         return f"[Error reading PDF: {str(e)}]"
 
-def extract_tabular_data(url: str, media_type: str) -> str:
+async def extract_tabular_data(url: str, media_type: str) -> str:
     """Extract data from CSV or Excel-like files"""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-
-        if media_type == 'text/csv':
-            decoded = response.content.decode('utf-8', errors='ignore')
-            reader = csv.reader(StringIO(decoded))
-            rows = []
-            for idx, row in enumerate(reader):
-                rows.append(', '.join(cell.strip() for cell in row))
-                if idx >= 99:
-                    rows.append('...')
-                    break
-            return '\n'.join(rows) if rows else '[CSV contained no rows]'
-
-        return (
-            '[Preview unavailable for non-CSV spreadsheet formats. '
-            'Download the file to inspect its contents.]'
+        return await _cached_extract(
+            url,
+            media_type,
+            _summarize_tabular,
+            "tabular",
         )
     except Exception as e:
         logger.error(f"Error extracting tabular data: {e}")
         return f"[Error reading tabular data: {str(e)}]"
 
-def process_file_content(content: str) -> str:
+async def extract_document_text(url: str, media_type: str) -> str:
+    """Extract text from an email (with its attachments) or a Word document"""
+    try:
+        return await _cached_extract(
+            url,
+            media_type,
+            _parse_document,
+            "document",
+        )
+    except Exception as e:
+        logger.error(f"Error extracting document text: {e}")
+        return f"[Error reading document: {str(e)}]"
+
+async def _excerpt_if_long(
+    index: Optional[AttachmentIndex],
+    url: str,
+    media_type: str,
+    filename: str,
+    text: str,
+    query: Optional[str],
+) -> str:
+    if index is None:
+        return text
+    # Long documents contribute only the passages relevant to the question.
+    # Earlier messages (query None) get a fixed reference instead, so their
+    # content, compaction keys and the provider's prompt prefix stay stable.
+    doc = await index.add(url, media_type, filename, text)
+    if len(text) > RETRIEVAL_INLINE_MAX_CHARS:
+        if query is None:
+            return render_reference(doc)
+        return render_excerpts(doc, index.search(query, document=doc))
+    return text
+
+async def _render_file_ref(
+    filename: str,
+    media_type: str,
+    url: str,
+    query: Optional[str] = "",
+    index: Optional[AttachmentIndex] = None,
+) -> str:
+    filename = filename.strip()
+    media_type = media_type.strip()
+    url = url.strip()
+
+    if media_type == 'application/pdf':
+        file_content = await extract_pdf_text(url)
+        file_content = await _excerpt_if_long(index, url, media_type, filename, file_content, query)
+        return f"[PDF File: {filename}]\n{file_content}\n[End of PDF]"
+    elif media_type in TABULAR_MEDIA_TYPES:
+        file_content = await extract_tabular_data(url, media_type)
+        if index is not None:
+            await index.add(url, media_type, filename, file_content)
+        return f"[Tabular File: {filename}]\n{file_content}\n[End of Tabular File]"
+    elif media_type in DOCUMENT_MEDIA_TYPES:
+        file_content = await extract_document_text(url, media_type)
+        file_content = await _excerpt_if_long(index, url, media_type, filename, file_content, query)
+        return f"[Document File: {filename}]\n{file_content}\n[End of Document]"
+    else:
+        return f"[File: {filename} ({media_type}) - Content not processed]"
+
+async def process_file_content(content: str, query: Optional[str] = "", index: Optional[AttachmentIndex] = None) -> str:
     """Process message content and extract file contents"""
-    # Pattern to match file references: [File: filename (mediaType) - URL: url]
-    file_pattern = r'\[File: ([^(]+) \(([^)]+)\) - URL: ([^\]]+)\]'
-    
-    def replace_file_ref(match):
-        filename = match.group(1).strip()
-        media_type = match.group(2).strip()
-        url = match.group(3).strip()
-        
-        if media_type == 'application/pdf':
-            file_content = extract_pdf_text(url)
-            return f"[PDF File: {filename}]\n{file_content}\n[End of PDF]"
-        elif media_type in [
-            'text/csv',
-            'application/vnd.ms-excel',
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        ]:
-            file_content = extract_tabular_data(url, media_type)
-            return f"[Tabular File: {filename}]\n{file_content}\n[End of Tabular File]"
-        else:
-            return f"[File: {filename} ({media_type}) - Content not processed]"
-    
-    return re.sub(file_pattern, replace_file_ref, content)
-
-
+    matches = list(FILE_REF_PATTERN.finditer(content))
+    if not matches:
+        return content
+
+    rendered = iter(await asyncio.gather(
+        *(_render_file_ref(*match.groups(), query=query, index=index) for match in matches)
+    ))
+    return FILE_REF_PATTERN.sub(lambda _: next(rendered), content)
+
+
+
+def _current_question(history: List[Dict[str, Any]]) -> str:
+    for m in reversed(history):
+        if m.get("role", "user").lower() == "user":
+            return FILE_REF_PATTERN.sub(" ", str(m.get("content", "")))
+    return ""
+
+async def to_agent_messages(history: List[Dict[str, Any]], index: Optional[AttachmentIndex] = None):
+    # Resolve every attachment in the thread concurrently; with an index, long
+    # files in the newest user message are reduced to the passages that match
+    # its question and long files in older messages to a fixed reference
+    query = _current_question(history)
+    newest = max((i for i, m in enumerate(history) if m.get("role", "user").lower() == "user"), default=-1)
+    processed = await asyncio.gather(
+        *(
+            process_file_content(str(m.get("content", "")), query if i == newest else None, index)
+            for i, m in enumerate(history)
+        )
+    )
 
-def to_agent_messages(history: List[Dict[str, Any]]):
     msgs = []
-    for m in history:
+    for m, processed_text in zip(history, processed):
         role = m.get("role", "user").lower()
-        text = str(m.get("content", ""))
-        
-        # Process file content if present
-        processed_text = process_file_content(text)
 
         if role == "system":
             msgs.append({"content": processed_text, "role": "developer", "type": "message"})
         elif role == "assistant":
             msgs.append({"content": processed_text, "role": "assistant", "type": "message"})
         else:
-            msgs.append({"content": processed_text, "role": "user", "type": "message"})
+            msg = {"content": processed_text, "role": "user", "type": "message"}
+            refs = FILE_REF_PATTERN.findall(str(m.get("content", "")))
+            if refs:
+                # Kept with the stored history so the attachment index can be rebuilt
+                # in another worker or after a restart; stripped before the model sees it
+                msg[ATTACHMENTS_KEY] = [[name.strip(), media_type.strip(), url.strip()] for name, media_type, url in refs]
+            msgs.append(msg)
 
     return msgs
 
-async def stream_chat_py(
-    messages: List[Dict[str, Any]],
-    selected_chat_mode: str,
-) -> AsyncIterator[str]:
-
-    start_time = time.time()
-    logger.info(
-        "stream_chat_py invoked | messages=%d selected_chat_mode=%s",
-        len(messages or []),
-        selected_chat_mode,
-    )
-
-    code_tool = CodeInterpreterTool(
-        tool_config={"type": "code_interpreter", "container": {"type": "auto"}}
-    )
-    
-    instructions = """
-    You are part of a full-stack demo built by AI Engineer **Yasser Ali** (Next.js frontend, FastAPI+Python backend). 
-    This project showcases two legal AI agents (for plaintiffs and for lawyers) under a single orchestrator, plus a Q&A 
-    about Yasser's background. The company audience is **Eve**, a startup building AI to help lawyers work faster.
-
-    ──────────────────────────────────────────────────────────────────────────────
-    SYSTEM GOALS
-    - Give Eve a hands-on demo of a dual-agent legal assistant:
-    1) plaintiffAgent — helps potential plaintiffs understand their case and prepare for counsel.
-    2) lawyerAgent — helps lawyers triage, research, and memo a case quickly.
-    - Also answer questions about **Yasser** (skills, projects, philosophy) to support hiring decisions.
-    - Always be honest, source-driven, and explicit about uncertainty.
-
-    DISCLAIMER (show succinctly atop substantive legal responses)
-    "I'm not your lawyer. This is general information, not legal advice. Laws vary by jurisdiction and change frequently—verify with a licensed attorney. If you face urgent deadlines (e.g., statute of limitations), contact counsel immediately."
-
-    ──────────────────────────────────────────────────────────────────────────────
-    ROUTING / MODES
-    - If the user appears to be a **potential plaintiff**, route to **plaintiffAgent**.
-    - If the user self-identifies as a **lawyer** or frames the question in counsel terms, route to **lawyerAgent**.
-    - If unclear: ask one targeted question ("Are you seeking guidance as a potential plaintiff, or analysis as counsel?").
-    - Both sub-agents must use the web search tool for statutes, deadlines, and firm recommendations and **cite sources**.
-
-    Agents: 
-    1. plaintiffAgent
-    2. lawyerAgent
-
-    Research Protocol (both agents)
-    - Use web search for legal specifics and firm recs; prefer primary sources (.gov, court sites, official codes).
-    - Provide 2–5 reputable citations for any legal rule, deadline, or recommendation.
-    - Summarize disagreements/splits if authorities conflict; surface uncertainty explicitly.
-
-    Multi-Intake & Ranking
-    - When given multiple intake emails/PDFs/texts, extract structured fields, score each case, and produce:
-    - A ranking table (CaseID, Theory, Jurisdiction, SOL risk, Strength 0–100, Top 3 Risks, Evidence Highlights).
-    - A one-paragraph rationale per case.
-    - Offer a draft outbound intake letter for the **top 1–2** cases.
-
-    Attachments / Files
-    - Accept short text or PDFs (intake forms). If multiple, batch analyze and rank as above.
-    - If unable to read a file, ask for text or a readable PDF copy.
-
-    ──────────────────────────────────────────────────────────────────────────────
-    ABOUT YASSER (use for "Why hire Yasser?" and general background)
-    - Full-stack AI engineer focused on **agentic systems**, **RAG**, and **production UX**.
-    - Built multi-agent apps: 
-    * "Data Analyst AI Agent": 
-     - Main project thus far has been his Data Analyst Agent that takes in user prompts and data, and then answers questions from the data using an orchestrator agent to figure out the task, several coding agents running in parallel (more if more complex, less if less complex) and then a reporter agent that aggregates the results found from the the coding agent and builds charts along with the report for the user to see. This project impressed multiple CFOs and financial executies at the company and they deeemd it the most innovative project on the Data Science team. 
-    • "Atlas" — Next.js + FastAPI + GCP/Vercel multi-agent "Data Analyst" system (SQL-ReAct, PDF RAG, streaming UI).  
-    • "Career Titan" — AI career/resume platform with structured YAML/JSON resumes, realtime preview, attachments.  
-    - Industry: Kaiser Data Science (Finance) — designed agent workflows generating insights from live data; strong Python/SQL,
-    prompt-engineering, Axolotl fine-tuning, continuous LLM monitoring concepts (accuracy/hallucination tracking).
-    - Background: Applied Mathematics (UCSB). Comfortable with ML (CNNs/transfer learning), orchestration (Next.js/React/TS),
-    backend APIs (FastAPI), and evaluation pipelines.
-    - Strengths hiring managers care about:
-    1) **Product velocity** — ships end-to-end features (UI to inference) with clean DX.  
-    2) **Agent reliability focus** — consensus/self-check patterns, citation-first outputs, JSON-safe responses.  
-    3) **Designing for adoption** — intake/ranking workflows, checklists, and "explain-your-answer" UX for trust.  
-    4) **Ownership** — takes ambiguous problem statements to working demos with measurable value.
-
-    ──────────────────────────────────────────────────────────────────────────────
-    FAQ BUTTON HANDLERS (answer these crisply if user clicks/asks)
-
-    1) "What are some ideas to further improve Eve?"
-    - Expand scope beyond lawyers to **potential plaintiffs** (consumer-facing pre-intake). The agent can:
-    • Pre-screen claims; score strength; flag SOL/notice rules with citations.
-    • Auto-draft a polished **intake letter** from user facts.
-    • Recommend suitable firms (neutral criteria + disclosure).  
-    - Dual benefit / business model: offer a transparent **Premium Placement** to firms (clearly labeled "Sponsored") that 
-    prioritizes their listing within reason and jurisdiction/practice-area fit—creating a lead-gen channel for Eve.
-    - Reliability upgrades: enforce **cite-every-claim**, structured outputs, automatic uncertainty flags, and human-in-the-loop
-    checkpoints for low-confidence or high-variance answers.
-    - Ops integrations: CRM push (create matter/leads), SOL calculators, conflict check prompts, templated demand letters,
-    pattern-jury-instructions linking, and deposition/ROGs boilerplates with placeholders.
-
-    2) "How could we reduce hallucinations in AI Agents?"
-    - **Citations by default**: every legal proposition or deadline must have a source (statute/case/court/agency page).
-    - **Parallel consensus**: run multiple sub-agents (different prompts/tools) in parallel; compare outputs.  
-    If they converge → higher confidence; if they diverge → expose differences to user and elevate to **human-review**.
-    - **Adjudicator pass**: a final reviewer agent checks claims vs. citations (regex/semantic matches) and enforces schema.
-    - **RAG + retrieval guards**: restrict legal answers to retrieved, jurisdiction-matched passages; highlight quoted spans.
-    - **Evaluation & logs**: track disagreement rate, missing-citation rate, and edit distance vs. ground truth in regression tests.
-
-    3) "How could I use this chatbot?"
-    - Ask about **Yasser** (projects, decisions, stack choices) or request a **live demo** of plaintiff/lawyer flows.
-    - Upload one or more **intake forms** (short PDFs or text) and have the system **analyze & rank** case strength.
-    - For lawyers: paste a fact pattern; get an **issue-spotted memo** with controlling authority and a take/decline call.
-    - For potential plaintiffs: describe your situation; receive a **case snapshot**, **strength score**, **next steps**, and a 
-    **draft letter** to send to law firms—plus **firm recommendations** with citations.
-    - Ask for "**JSON output**" to integrate directly with your pipeline/CRM.
-
-    4) "Why hire Yasser?"
-    - Demonstrated ability to **ship agentic products** end-to-end (robust backends, real-time tooling, strong agents built for real productivity).
-    - Obsessed with **reliability** (citations, consensus checks, structured evidence, measurable quality metrics).
-    - Versatile stack: **Next.js/React/TS**, **FastAPI/Python**, SQL, cloud deploy (GCP/Vercel), vector/RAG, model fine-tuning.
-    - Clear communicator who turns vague needs into **useful, trustworthy tools**—exactly what Eve needs to win adoption.
-    - 
-
-    ──────────────────────────────────────────────────────────────────────────────
-    TONE & STYLE
-    - Clear, succinct, neutral; translate legal jargon into plain English.
-    - Surface uncertainty; avoid overclaiming. Use bullets, tables, and checklists.
-    - When asked for strategy/ideas, give a prioritized list with quick win → roadmap.
-
-    EXAMPLES / PROMPTS USERS CAN TRY
-    - "Here are 3 intake emails—rank them and write a one-page memo for the strongest case."  
-    - "Analyze this employment termination timeline for retaliation; cite CA authority and give a take/decline call."  
-    - "Draft a neutral intake letter from these facts for an NYC wage case and list 5 suitable firms with citations."  
-    - "Show how Eve could monetize plaintiff pre-intake without harming trust."  
-    - "Why should Eve trust your legal answers? Explain your consensus + citation approach."  
-
-    OUTPUT MODES
-    - Markdown by default. Offer an optional **JSON block** with fields:
-    {mode, jurisdiction, facts_snapshot, claims, elements_map, case_strength_score, risks, deadlines, recommendation, sources}.
-
-    REMINDERS
-    - Never present legal specifics without citations. 
-    - If laws vary by state or are unsettled, describe the split and recommend attorney review.
-    - If given multiple files, produce a **ranking table** first, then per-case summaries.
-
-    END OF SYSTEM INSTRUCTIONS
-    """.strip() 
-    
-    agent = Agent(
+def model_input(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Messages without the server-side attachment manifest"""
+    return [
+        {k: v for k, v in m.items() if k != ATTACHMENTS_KEY} if ATTACHMENTS_KEY in m else m
+        for m in messages
+    ]
+
+async def restore_index(index: AttachmentIndex, history: List[Dict[str, Any]]) -> None:
+    """
+    Rebuild a conversation's attachment index from the manifest in its stored
+    history. The index lives in one worker's memory, so it is missing after a
+    restart or when another worker stored the conversation; the text comes
+    from the extract cache when it is still there.
+    """
+    refs = {tuple(ref) for m in history for ref in m.get(ATTACHMENTS_KEY, ())}
+    if not refs or index.documents:
+        return
+    with timed("index_restore"):
+        await asyncio.gather(
+            *(_render_file_ref(name, media_type, url, query=None, index=index) for name, media_type, url in refs),
+            return_exceptions=True,
+        )
+    logger.info("attachment index restored | files=%d documents=%d", len(refs), len(index.documents))
+
+ORCHESTRATOR_INSTRUCTIONS = """
+You are part of a full-stack demo built by AI Engineer **Yasser Ali** (Next.js frontend, FastAPI+Python backend). 
+This project showcases two legal AI agents (for plaintiffs and for lawyers) under a single orchestrator, plus a Q&A 
+about Yasser's background. The company audience is **Eve**, a startup building AI to help lawyers work faster.
+
+──────────────────────────────────────────────────────────────────────────────
+SYSTEM GOALS
+- Give Eve a hands-on demo of a dual-agent legal assistant:
+1) plaintiffAgent — helps potential plaintiffs understand their case and prepare for counsel.
+2) lawyerAgent — helps lawyers triage, research, and memo a case quickly.
+- Also answer questions about **Yasser** (skills, projects, philosophy) to support hiring decisions.
+- Always be honest, source-driven, and explicit about uncertainty.
+
+DISCLAIMER (show succinctly atop substantive legal responses)
+"I'm not your lawyer. This is general information, not legal advice. Laws vary by jurisdiction and change frequently—verify with a licensed attorney. If you face urgent deadlines (e.g., statute of limitations), contact counsel immediately."
+
+──────────────────────────────────────────────────────────────────────────────
+ROUTING / MODES
+- If the user appears to be a **potential plaintiff**, route to **plaintiffAgent**.
+- If the user self-identifies as a **lawyer** or frames the question in counsel terms, route to **lawyerAgent**.
+- If unclear: ask one targeted question ("Are you seeking guidance as a potential plaintiff, or analysis as counsel?").
+- Both sub-agents must use the web search tool for statutes, deadlines, and firm recommendations and **cite sources**.
+
+Agents: 
+1. plaintiffAgent
+2. lawyerAgent
+
+Research Protocol (both agents)
+- Use web search for legal specifics and firm recs; prefer primary sources (.gov, court sites, official codes).
+- Provide 2–5 reputable citations for any legal rule, deadline, or recommendation.
+- Summarize disagreements/splits if authorities conflict; surface uncertainty explicitly.
+
+Multi-Intake & Ranking
+- When given multiple intake emails/PDFs/texts, extract structured fields, score each case, and produce:
+- A ranking table (CaseID, Theory, Jurisdiction, SOL risk, Strength 0–100, Top 3 Risks, Evidence Highlights).
+- A one-paragraph rationale per case.
+- Offer a draft outbound intake letter for the **top 1–2** cases.
+
+Attachments / Files
+- Accept short text, PDFs, emails (.eml/.msg, with their attachments) and Word documents (intake forms). If multiple, batch analyze and rank as above.
+- If unable to read a file, ask for text or a readable PDF copy.
+- Long PDFs arrive as excerpts tagged like [file.pdf p.3], or as an [Indexed: ...] reference when attached to an earlier message. Call search_attachments to find other passages, and cite the page tags you rely on.
+
+──────────────────────────────────────────────────────────────────────────────
+ABOUT YASSER (use for "Why hire Yasser?" and general background)
+- Full-stack AI engineer focused on **agentic systems**, **RAG**, and **production UX**.
+- Built multi-agent apps: 
+* "Data Analyst AI Agent": 
+ - Main project thus far has been his Data Analyst Agent that takes in user prompts and data, and then answers questions from the data using an orchestrator agent to figure out the task, several coding agents running in parallel (more if more complex, less if less complex) and then a reporter agent that aggregates the results found from the the coding agent and builds charts along with the report for the user to see. This project impressed multiple CFOs and financial executies at the company and they deeemd it the most innovative project on the Data Science team. 
+• "Atlas" — Next.js + FastAPI + GCP/Vercel multi-agent "Data Analyst" system (SQL-ReAct, PDF RAG, streaming UI).  
+• "Career Titan" — AI career/resume platform with structured YAML/JSON resumes, realtime preview, attachments.  
+- Industry: Kaiser Data Science (Finance) — designed agent workflows generating insights from live data; strong Python/SQL,
+prompt-engineering, Axolotl fine-tuning, continuous LLM monitoring concepts (accuracy/hallucination tracking).
+- Background: Applied Mathematics (UCSB). Comfortable with ML (CNNs/transfer learning), orchestration (Next.js/React/TS),
+backend APIs (FastAPI), and evaluation pipelines.
+- Strengths hiring managers care about:
+1) **Product velocity** — ships end-to-end features (UI to inference) with clean DX.  
+2) **Agent reliability focus** — consensus/self-check patterns, citation-first outputs, JSON-safe responses.  
+3) **Designing for adoption** — intake/ranking workflows, checklists, and "explain-your-answer" UX for trust.  
+4) **Ownership** — takes ambiguous problem statements to working demos with measurable value.
+
+──────────────────────────────────────────────────────────────────────────────
+FAQ BUTTON HANDLERS (answer these crisply if user clicks/asks)
+
+1) "What are some ideas to further improve Eve?"
+- Expand scope beyond lawyers to **potential plaintiffs** (consumer-facing pre-intake). The agent can:
+• Pre-screen claims; score strength; flag SOL/notice rules with citations.
+• Auto-draft a polished **intake letter** from user facts.
+• Recommend suitable firms (neutral criteria + disclosure).  
+- Dual benefit / business model: offer a transparent **Premium Placement** to firms (clearly labeled "Sponsored") that 
+prioritizes their listing within reason and jurisdiction/practice-area fit—creating a lead-gen channel for Eve.
+- Reliability upgrades: enforce **cite-every-claim**, structured outputs, automatic uncertainty flags, and human-in-the-loop
+checkpoints for low-confidence or high-variance answers.
+- Ops integrations: CRM push (create matter/leads), SOL calculators, conflict check prompts, templated demand letters,
+pattern-jury-instructions linking, and deposition/ROGs boilerplates with placeholders.
+
+2) "How could we reduce hallucinations in AI Agents?"
+- **Citations by default**: every legal proposition or deadline must have a source (statute/case/court/agency page).
+- **Parallel consensus**: run multiple sub-agents (different prompts/tools) in parallel; compare outputs.  
+If they converge → higher confidence; if they diverge → expose differences to user and elevate to **human-review**.
+- **Adjudicator pass**: a final reviewer agent checks claims vs. citations (regex/semantic matches) and enforces schema.
+- **RAG + retrieval guards**: restrict legal answers to retrieved, jurisdiction-matched passages; highlight quoted spans.
+- **Evaluation & logs**: track disagreement rate, missing-citation rate, and edit distance vs. ground truth in regression tests.
+
+3) "How could I use this chatbot?"
+- Ask about **Yasser** (projects, decisions, stack choices) or request a **live demo** of plaintiff/lawyer flows.
+- Upload one or more **intake forms** (short PDFs or text) and have the system **analyze & rank** case strength.
+- For lawyers: paste a fact pattern; get an **issue-spotted memo** with controlling authority and a take/decline call.
+- For potential plaintiffs: describe your situation; receive a **case snapshot**, **strength score**, **next steps**, and a 
+**draft letter** to send to law firms—plus **firm recommendations** with citations.
+- Ask for "**JSON output**" to integrate directly with your pipeline/CRM.
+
+4) "Why hire Yasser?"
+- Demonstrated ability to **ship agentic products** end-to-end (robust backends, real-time tooling, strong agents built for real productivity).
+- Obsessed with **reliability** (citations, consensus checks, structured evidence, measurable quality metrics).
+- Versatile stack: **Next.js/React/TS**, **FastAPI/Python**, SQL, cloud deploy (GCP/Vercel), vector/RAG, model fine-tuning.
+- Clear communicator who turns vague needs into **useful, trustworthy tools**—exactly what Eve needs to win adoption.
+- 
+
+──────────────────────────────────────────────────────────────────────────────
+TONE & STYLE
+- Clear, succinct, neutral; translate legal jargon into plain English.
+- Surface uncertainty; avoid overclaiming. Use bullets, tables, and checklists.
+- When asked for strategy/ideas, give a prioritized list with quick win → roadmap.
+
+EXAMPLES / PROMPTS USERS CAN TRY
+- "Here are 3 intake emails—rank them and write a one-page memo for the strongest case."  
+- "Analyze this employment termination timeline for retaliation; cite CA authority and give a take/decline call."  
+- "Draft a neutral intake letter from these facts for an NYC wage case and list 5 suitable firms with citations."  
+- "Show how Eve could monetize plaintiff pre-intake without harming trust."  
+- "Why should Eve trust your legal answers? Explain your consensus + citation approach."  
+
+OUTPUT MODES
+- Markdown by default. Offer an optional **JSON block** with fields:
+{mode, jurisdiction, facts_snapshot, claims, elements_map, case_strength_score, risks, deadlines, recommendation, sources}.
+
+REMINDERS
+- Never present legal specifics without citations. 
+- If laws vary by state or are unsettled, describe the split and recommend attorney review.
+- If given multiple files, produce a **ranking table** first, then per-case summaries.
+
+END OF SYSTEM INSTRUCTIONS
+""".strip()
+
+# Part of response cache keys, so cached replies expire with any prompt change
+PROMPT_VERSION = hashlib.sha256(ORCHESTRATOR_INSTRUCTIONS.encode("utf-8")).hexdigest()[:12]
+
+# selectedChatModel ids sent by the frontend -> OpenAI model behind them
+CHAT_MODELS = {
+    "chat-model": "gpt-4.1",
+}
+DEFAULT_MODEL = "gpt-4.1"
+
+def build_orchestrator(model: str) -> Agent:
+    return Agent(
         name="agent",
-        model="gpt-4.1",
-        instructions=instructions,
+        model=model,
+        instructions=ORCHESTRATOR_INSTRUCTIONS,
         tools=[
-            WebSearchTool(),
+            *web_search_tools(),
             plaintiffAgent,
-            lawyerAgent
+            lawyerAgent,
+            search_attachments,
         ]
     )
 
-    agent_input = to_agent_messages(messages)
-    logger.debug("agent_input_preview=%s", json.dumps(agent_input[-3:], ensure_ascii=False))
-
-    # Prologue 
-    yield f"data: {json.dumps({"type": "start-step"})}\n\n"
-    yield f"data: {json.dumps({"type": "text-start"})}\n\n"
+# Built once at import and shared by every request; agents hold no per-run state
+_ORCHESTRATORS: Dict[str, Agent] = {
+    model: build_orchestrator(model) for model in set(CHAT_MODELS.values()) | {DEFAULT_MODEL}
+}
+
+# Structured-output variants that reply with one CaseReport JSON object
+_STRUCTURED_ORCHESTRATORS: Dict[str, Agent] = {
+    model: agent.clone(
+        name="structured-agent",
+        instructions=ORCHESTRATOR_INSTRUCTIONS + STRUCTURED_ADDENDUM,
+        output_type=CaseReport,
+    )
+    for model, agent in _ORCHESTRATORS.items()
+}
+STRUCTURED_PROMPT_VERSION = hashlib.sha256((ORCHESTRATOR_INSTRUCTIONS + STRUCTURED_ADDENDUM).encode("utf-8")).hexdigest()[:12]
 
-    try: 
-        logger.info(
-            "Runner.run_streamed start | model=%s tools=%d history=%d",
-            getattr(agent, "model", "unknown"),
-            len(getattr(agent, "tools", []) or []),
-            len(agent_input),
-        )
+def get_orchestrator(selected_chat_model: str, structured: bool = False) -> Agent:
+    """Shared orchestrator for a frontend model id; unknown ids use the default model"""
+    agents = _STRUCTURED_ORCHESTRATORS if structured else _ORCHESTRATORS
+    return agents[CHAT_MODELS.get(selected_chat_model, DEFAULT_MODEL)]
 
-        streamed = Runner.run_streamed(agent, input=agent_input)
-        logger.info("Runner.run_streamed stream established")
+_RUN_DONE = object()
 
+async def _pump_run_events(streamed, run_ctx: ChatRunContext) -> None:
+    try:
         async for ev in streamed.stream_events():
+            if run_ctx.events.qsize() >= ADMISSION_MAX_BUFFERED_EVENTS:
+                # The client stopped reading; stop paying for output nobody will see
+                logger.warning("slow consumer, cancelling run | buffered=%d", run_ctx.events.qsize())
+                streamed.cancel()
+                cancelled_runs.inc(reason="slow_consumer")
+                run_ctx.events.put_nowait(SlowConsumer("client is not reading the stream"))
+                return
+            run_ctx.events.put_nowait(ev)
+    except Exception as e:
+        run_ctx.events.put_nowait(e)
+    else:
+        run_ctx.events.put_nowait(_RUN_DONE)
+
+async def collect_intakes(content: str) -> List[Tuple[str, str]]:
+    """Resolve every attachment in a message to (filename, extracted text) for batch scoring"""
+    matches = list(FILE_REF_PATTERN.finditer(content))
+    texts = await asyncio.gather(*(_render_file_ref(*match.groups()) for match in matches))
+    return [(match.group(1).strip(), text) for match, text in zip(matches, texts)]
+
+async def _stream_batch_intake(
+    messages: List[Dict[str, Any]],
+    intake_agent: Optional[str],
+    reply_parts: List[str],
+) -> AsyncIterator[bytes]:
+    """Batch intake frames; the reply text is collected into reply_parts"""
+    last_user = next((m for m in reversed(messages) if m.get("role", "user").lower() == "user"), {})
+    content = str(last_user.get("content", ""))
+    intakes = await collect_intakes(content)
+    if not intakes:
+        message = "Batch intake mode needs one or more intake files attached to the message."
+        reply_parts.append(message)
+        yield encode_event({"type": "text-delta", "delta": message})
+        return
+
+    user_request = FILE_REF_PATTERN.sub("", content)
+    async for payload in stream_batch_intake(intakes, user_request, intake_agent or "lawyer"):
+        if payload.get("type") == "text-delta":
+            reply_parts.append(payload["delta"])
+        yield encode_event(payload)
+
+async def _stream_run(
+    agent: Agent,
+    agent_input: List[Dict[str, Any]],
+    run_ctx: ChatRunContext,
+    reply_parts: List[str],
+    on_text: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Run the orchestrator and yield its SSE frames; reply text is collected into reply_parts.
+    on_text derives extra payloads from the streamed text (see SSEEncoder).
+    """
+    logger.info(
+        "Runner.run_streamed start | model=%s tools=%d history=%d",
+        getattr(agent, "model", "unknown"),
+        len(getattr(agent, "tools", []) or []),
+        len(agent_input),
+    )
+
+    run_started = time.perf_counter()
+    streamed = Runner.run_streamed(agent, input=agent_input, context=run_ctx)
+    logger.info("Runner.run_streamed stream established")
+    first_event = True
+    # call_id -> (tool name, start time) for function tools awaiting their output
+    tools_running: Dict[str, Tuple[str, float]] = {}
+
+    # Runner events and tool-emitted payloads share one queue so sub-agent
+    # progress is forwarded while the orchestrator waits on the tool call
+    pump = asyncio.create_task(_pump_run_events(streamed, run_ctx))
+    sse = SSEEncoder(on_text=on_text)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(run_ctx.events.get(), sse.timeout())
+            except TimeoutError:
+                # Coalescing window closed with no new events; send what is buffered
+                yield sse.flush()
+                continue
+            if item is _RUN_DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            if isinstance(item, dict):
+                yield sse.event(item)
+                continue
+
+            ev = item
             et = getattr(ev, "type", "")
             if et:
                 logger.debug("stream_event | type=%s", et)
-
-            # Handle raw_response_event with ResponseTextDeltaEvent
-            if et == "raw_response_event":
-                data = getattr(ev, "data", None)
-                if data and hasattr(data, '__class__') and 'ResponseTextDeltaEvent' in str(data.__class__):
-                    delta = getattr(data, "delta", "")
-                    if delta:
-                        yield f"data: {json.dumps({"type": "text-delta", "delta": delta})}\n\n"
-
-            elif et in ("text.delta", "response.text.delta", "agent.output_text.delta"):
-                chunk = getattr(ev, "delta", None) or getattr(ev, "text", "")
-                if chunk: 
-                    yield f"data: {json.dumps({"type": "text-delta", "delta": chunk})}\n\n"
+            if first_event:
+                first_event = False
+                record("first_model_event", time.perf_counter() - run_started)
+
+            delta = text_delta_from_event(ev)
+            tool = tool_name_from_event(ev)
+            if getattr(ev, "name", "") == "tool_output":
+                running = tools_running.pop(tool_call_id_from_event(ev) or "", None)
+                if running is not None:
+                    record("tool", time.perf_counter() - running[1], running[0])
+
+            if delta:
+                if not reply_parts:
+                    mark("first_text_delta")
+                reply_parts.append(delta)
+                frame = sse.delta(delta)
+                if frame:
+                    yield frame
+
+            elif tool:
+                call_id = tool_call_id_from_event(ev)
+                if call_id:
+                    tools_running[call_id] = (tool, time.perf_counter())
+                progress = {"agent": "orchestrator", "status": "tool", "tool": tool}
+                yield sse.event(data_event("agent-progress", progress))
 
             elif et in ("error", "agent.error", "run.error"):
                 msg = str(getattr(ev, "error", "unknown_error"))
                 logger.error("stream_event error | type=%s message=%s", et, msg)
-                yield f"data: {json.dumps({"type": "error", "message": msg})}\n\n"
-                
-        yield f"data: {json.dumps({"type": "text-end"})}\n\n"
-        yield f"data: {json.dumps({"type": "end-step"})}\n\n"
+                run_ctx.errors.append(msg)
+                yield sse.event({"type": "error", "message": msg})
+        tail = sse.flush()
+        if tail:
+            yield tail
+    finally:
+        pump.cancel()
+        if not streamed.is_complete:
+            streamed.cancel()
+
+CONVERSATION_NOT_FOUND = {
+    "type": "error",
+    "code": "conversation_not_found",
+    "message": "Unknown or expired conversationId; resend the full messages array",
+}
+
+async def stream_chat_py(
+    messages: List[Dict[str, Any]],
+    selected_chat_mode: str,
+    mode: Optional[str] = None,
+    intake_agent: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    new_message: Optional[Dict[str, Any]] = None,
+    owner: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Stream one assistant turn as encoded SSE frames.
+
+    With conversation_id, processed history is kept server-side: the client may
+    send only new_message and the stored history is extended instead of
+    re-resolving the whole thread. Sending full messages resets the state.
+    A conversation is only visible to the owner that created it; without an
+    authenticated owner nothing is stored and only full messages are accepted.
+    """
+
+    start_time = time.time()
+    logger.info(
+        "stream_chat_py invoked | messages=%d selected_chat_mode=%s",
+        len(messages or []),
+        selected_chat_mode,
+    )
+
+    if conversation_id and owner is None:
+        # Server-side state needs the proxy's authenticated user: an id alone could be
+        # guessed, so unauthenticated callers get no stored history and store nothing
+        if new_message is not None:
+            yield encode_event(CONVERSATION_NOT_FOUND)
+            return
+        conversation_id = None
+
+    if mode == BATCH_INTAKE_MODE:
+        history: Optional[List[Dict[str, Any]]] = []
+        if conversation_id and new_message is not None:
+            history = await conversation_store.get(conversation_id, owner)
+            if history is None:
+                yield encode_event(CONVERSATION_NOT_FOUND)
+                return
+        yield START_STEP
+        yield TEXT_START
+        try:
+            batch_messages = [new_message] if new_message is not None else messages
+            reply_parts: List[str] = []
+            async for chunk in _stream_batch_intake(batch_messages, intake_agent, reply_parts):
+                yield chunk
+            if conversation_id:
+                # Store the turn so a follow-up can send only the new message
+                index = index_for(conversation_id, owner)
+                conversation = history + await to_agent_messages(batch_messages, index)
+                reply = {"content": "".join(reply_parts), "role": "assistant", "type": "message"}
+                if not await conversation_store.put(conversation_id, conversation + [reply], owner):
+                    logger.warning("conversation owned by another client not stored | id=%s", conversation_id)
+            yield TEXT_END
+            yield END_STEP
+        except Exception as e:
+            logger.exception("batch intake failed")
+            yield encode_event({"type": "error", "message": str(e)})
+        finally:
+            logger.info("stream_chat_py finished | mode=%s duration_ms=%d", mode, int((time.time() - start_time) * 1000))
+        return
+
+    structured = mode == STRUCTURED_MODE
+    agent = get_orchestrator(selected_chat_mode, structured)
+    index = index_for(conversation_id, owner)
+
+    if conversation_id and new_message is not None:
+        history = await conversation_store.get(conversation_id, owner)
+        if history is None:
+            yield encode_event(CONVERSATION_NOT_FOUND)
+            return
+        await restore_index(index, history)
+        with timed("message_conversion"):
+            conversation = history + await to_agent_messages([new_message], index)
+    else:
+        with timed("message_conversion"):
+            conversation = await to_agent_messages(messages, index)
+
+    agent_input = compact_history(model_input(conversation))
+    prompt_version = STRUCTURED_PROMPT_VERSION if structured else PROMPT_VERSION
+    cache_key = response_cache.key_for(conversation, getattr(agent, "model", selected_chat_mode), prompt_version)
+    cached = response_cache.get(cache_key) if cache_key else None
+    reply_parts: List[str] = []
+    # Structured mode streams the JSON as text and reports each top-level field as it closes
+    on_text = FieldStreamParser().feed if structured else None
+    logger.debug("agent_input_preview=%s", json.dumps(agent_input[-3:], ensure_ascii=False))
+
+    # Prologue 
+    yield START_STEP
+    yield TEXT_START
+
+    try: 
+        if cached is not None:
+            logger.info("response cache hit | model=%s", getattr(agent, "model", "unknown"))
+            mark("first_text_delta")
+            async for chunk in replay_chunks(cached):
+                yield encode_delta(chunk)
+                if on_text is not None:
+                    for payload in on_text(chunk):
+                        yield encode_event(payload)
+            reply_parts.append(cached)
+            if structured:
+                yield encode_event(structured_result(cached))
+        else:
+            run_ctx = ChatRunContext(retrieval=index)
+            async for frame in _stream_run(agent, agent_input, run_ctx, reply_parts, on_text):
+                yield frame
+            cacheable = not run_ctx.errors
+            if structured:
+                result = structured_result("".join(reply_parts))
+                # An invalid report would otherwise be replayed for a day
+                cacheable = cacheable and not result["data"]["errors"]
+                yield encode_event(result)
+            if cache_key and cacheable:
+                response_cache.put(cache_key, "".join(reply_parts))
+
+        if conversation_id:
+            reply = {"content": "".join(reply_parts), "role": "assistant", "type": "message"}
+            if not await conversation_store.put(conversation_id, conversation + [reply], owner):
+                logger.warning("conversation owned by another client not stored | id=%s", conversation_id)
+
+        yield TEXT_END
+        yield END_STEP
 
     except Exception as e:
         logger.exception("stream_chat_py unhandled exception")
-        yield f"data: {json.dumps({"type": "error in orchestrator.py", "message": str(e)})}\n\n"
+        yield encode_event({"type": "error in orchestrator.py", "message": str(e)})
 
     finally: 
         end_time = time.time()
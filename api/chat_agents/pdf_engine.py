@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import mmap
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar, Union
+
+import PyPDF2
+
+
+logger = logging.getLogger(__name__)
+
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_JOB = int(os.getenv("PDF_PAGES_PER_JOB", "25"))
+PDF_DOCUMENT_DEADLINE_S = float(os.getenv("PDF_DOCUMENT_DEADLINE_S", "60"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "400000"))
+# Separates pages in extracted text, as pdftotext does; retrieval uses it for page citations
+PAGE_BREAK = "\f"
+
+# In-memory bytes for small downloads, a file path for spooled ones
+PdfSource = Union[bytes, str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Jobs in flight per pool, so a retired pool is only killed once the others have finished
+_jobs: Dict[ProcessPoolExecutor, Set["asyncio.Future[Any]"]] = {}
+# Retired pools whose stuck workers have not been killed yet, and the tasks that kill them
+_retired: Set[ProcessPoolExecutor] = set()
+_reapers: Set["asyncio.Task[None]"] = set()
+T = TypeVar("T")
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Worker processes used for PyPDF2 parsing, created on first use"""
+    global _pool
+    if _pool is None:
+        # spawn keeps children free of the server's threads and event loop
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def warm_pdf_pool() -> None:
+    """Start every worker now so the first attachment does not pay process spawn time"""
+    pool = get_pdf_pool()
+    for _ in range(PDF_POOL_WORKERS):
+        pool.submit(_warm_worker)
+
+
+def shutdown_pdf_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    for pool in list(_retired):
+        _kill_workers(pool)
+
+
+def _kill_workers(pool: ProcessPoolExecutor) -> None:
+    _retired.discard(pool)
+    # ProcessPoolExecutor.kill_workers() on 3.14+; earlier versions only expose _processes
+    kill_workers = getattr(pool, "kill_workers", None)
+    if kill_workers is not None:
+        kill_workers()
+    else:
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def recycle_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool broken by a crashed worker; the next get_pdf_pool() call starts a fresh one"""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def retire_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Stop sending jobs to a pool whose worker overran its deadline.
+
+    A worker stuck inside a parser cannot be interrupted, and killing one
+    process breaks the whole executor, so new jobs go to a fresh pool while
+    the jobs already running in this one, other users' included, finish.
+    Only then are its remaining (stuck) workers killed. Until that happens
+    the host runs up to twice PDF_POOL_WORKERS processes.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+    if pool in _retired:
+        return
+    logger.warning("retiring extraction pool after a job overran its deadline")
+    # Not shut down yet: shutdown() forgets the worker processes that must be killed
+    _retired.add(pool)
+
+    async def reap() -> None:
+        # Every job has its own deadline, so this wait is bounded
+        while _jobs.get(pool):
+            await asyncio.wait(set(_jobs[pool]))
+        _kill_workers(pool)
+
+    task = asyncio.ensure_future(reap())
+    _reapers.add(task)
+    task.add_done_callback(_reapers.discard)
+
+
+async def run_in_pool(deadline: float, fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run fn in the worker pool until the time.monotonic() deadline.
+
+    Raises asyncio.TimeoutError when the deadline passes and retires the
+    pool, so a pathological file cannot hold a worker for good while jobs
+    already running beside it are left to finish. A job lost to a crashed
+    pool is retried once in a fresh one.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        if time.monotonic() >= deadline:
+            # Nothing was submitted, so there is no worker to reclaim
+            raise asyncio.TimeoutError()
+        pool = get_pdf_pool()
+        future = loop.run_in_executor(pool, fn, *args)
+        jobs = _jobs.setdefault(pool, set())
+        jobs.add(future)
+        try:
+            return await asyncio.wait_for(future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            retire_pdf_pool(pool)
+            raise
+        except BrokenProcessPool:
+            # A crashed worker poisons the executor; rebuild it
+            recycle_pdf_pool(pool)
+            if attempt:
+                raise
+        finally:
+            jobs.discard(future)
+            if not jobs and _jobs.get(pool) is jobs:
+                del _jobs[pool]
+    raise AssertionError("unreachable")
+
+
+# --- worker side (must stay importable without the rest of the app)
+
+def _warm_worker() -> None:
+    # Importing this module in the child already loaded PyPDF2
+    return None
+
+
+@contextmanager
+def _open_reader(source: PdfSource) -> Iterator[PyPDF2.PdfReader]:
+    if isinstance(source, bytes):
+        yield PyPDF2.PdfReader(BytesIO(source))
+        return
+    # Map spooled files instead of reading them so each worker's RSS stays flat
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield PyPDF2.PdfReader(mapped)
+
+
+def iter_pdf_pages(reader: PyPDF2.PdfReader, start: int, stop: int) -> Iterator[str]:
+    """Yield the text of pages [start, stop), substituting a placeholder for pages that fail"""
+    for index in range(start, stop):
+        try:
+            yield reader.pages[index].extract_text() or ""
+        except Exception as e:
+            yield f"[Page {index + 1} could not be extracted: {e}]"
+
+
+def _collect(texts: Iterator[str], max_chars: int) -> List[str]:
+    pages = []
+    used = 0
+    for text in texts:
+        pages.append(text)
+        used += len(text)
+        if used >= max_chars:
+            break
+    return pages
+
+
+def _extract_range(source: PdfSource, start: int, stop: int, max_chars: int) -> List[str]:
+    with _open_reader(source) as reader:
+        return _collect(iter_pdf_pages(reader, start, stop), max_chars)
+
+
+def _extract_first_range(source: PdfSource, stop: int, max_chars: int) -> Tuple[int, List[str]]:
+    with _open_reader(source) as reader:
+        page_count = len(reader.pages)
+        return page_count, _collect(iter_pdf_pages(reader, 0, min(stop, page_count)), max_chars)
+
+
+# --- event loop side
+
+async def stream_pdf_pages(
+    source: PdfSource,
+    max_chars: int = PDF_MAX_CHARS,
+    pages_per_job: int = PDF_PAGES_PER_JOB,
+    deadline_s: float = PDF_DOCUMENT_DEADLINE_S,
+) -> AsyncIterator[str]:
+    """
+    Yield page texts in order while the worker pool extracts them.
+
+    The first job also reports the page count. Remaining pages are split into
+    ranges and extracted in parallel through a sliding window no wider than
+    the pool, so at most a few ranges are ever held in memory. Extraction
+    stops early once max_chars of text have been produced.
+
+    Ranges that fail become a placeholder instead of failing the document;
+    once the per-document deadline passes, everything left is replaced by a
+    single placeholder and the pool is retired so the stuck worker does not
+    stay occupied.
+    """
+    deadline = time.monotonic() + deadline_s
+
+    try:
+        page_count, first_pages = await run_in_pool(deadline, _extract_first_range, source, pages_per_job, max_chars)
+    except asyncio.TimeoutError:
+        # The page count comes from that first job, so no page range can be named here
+        logger.warning("pdf extraction deadline hit on the first pages")
+        yield f"[No pages could be extracted: time budget of {deadline_s:g}s reached]"
+        return
+
+    used = 0
+    last_page = 0
+    for text in first_pages:
+        yield text
+        used += len(text)
+        last_page += 1
+    if used >= max_chars:
+        if last_page < page_count:
+            yield f"[Extraction stopped after page {last_page} of {page_count}: character budget reached]"
+        return
+
+    ranges = deque(
+        (start, min(start + pages_per_job, page_count))
+        for start in range(pages_per_job, page_count, pages_per_job)
+    )
+    window: deque = deque()
+
+    def _refill() -> None:
+        while ranges and len(window) < PDF_POOL_WORKERS:
+            start, stop = ranges.popleft()
+            remaining_chars = max_chars - used
+            job = asyncio.ensure_future(run_in_pool(deadline, _extract_range, source, start, stop, remaining_chars))
+            window.append((start, stop, job))
+
+    try:
+        _refill()
+        while window:
+            start, stop, job = window.popleft()
+            try:
+                pages = await job
+                last_page = start + len(pages)
+            except asyncio.TimeoutError:
+                logger.warning("pdf extraction deadline hit | pages=%d-%d", start + 1, page_count)
+                yield f"[Pages {start + 1}-{page_count} could not be extracted: time budget reached]"
+                return
+            except Exception as e:
+                logger.warning("pdf page range failed | pages=%d-%d reason=%s", start + 1, stop, e)
+                # Pad with empty pages so later page numbers stay aligned
+                pages = [f"[Pages {start + 1}-{stop} could not be extracted: {e}]"] + [""] * (stop - start - 1)
+                last_page = stop
+
+            for text in pages:
+                yield text
+                used += len(text)
+            if used >= max_chars:
+                if last_page < page_count:
+                    yield f"[Extraction stopped after page {last_page} of {page_count}: character budget reached]"
+                return
+            _refill()
+    finally:
+        for _, _, job in window:
+            job.cancel()
+
+
+async def extract_pdf(source: PdfSource, max_chars: int = PDF_MAX_CHARS) -> str:
+    """Extract text from a PDF in the worker pool, up to max_chars; pages are separated by form feeds"""
+    pages = [text async for text in stream_pdf_pages(source, max_chars=max_chars)]
+    return PAGE_BREAK.join(pages).strip()
@@ -0,0 +1,413 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .telemetry import cancelled_runs
+
+
+logger = logging.getLogger(__name__)
+
+REPLAY_STORE = os.getenv("REPLAY_STORE", "memory")
+REPLAY_DIR = os.getenv("REPLAY_DIR", "replay")
+REPLAY_MAX_EVENTS = int(os.getenv("REPLAY_MAX_EVENTS", "5000"))
+REPLAY_MAX_BYTES = int(os.getenv("REPLAY_MAX_BYTES", str(2 * 1024 * 1024)))
+REPLAY_MAX_RUNS = int(os.getenv("REPLAY_MAX_RUNS", "1000"))
+REPLAY_TTL_S = float(os.getenv("REPLAY_TTL_S", "600"))
+# A detached run with no reader for this long is cancelled
+REPLAY_ABANDON_S = float(os.getenv("REPLAY_ABANDON_S", "60"))
+REPLAY_FILE_POLL_S = float(os.getenv("REPLAY_FILE_POLL_S", "0.1"))
+
+STREAM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+# Ids picked by clients must be long enough to hold 128 random bits (e.g. secrets.token_urlsafe(16))
+CLIENT_STREAM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{22,64}$")
+
+
+class ReplayChunk(NamedTuple):
+    events: List[Tuple[int, bytes]]  # (seq, frame) with seq > the requested position
+    done: bool
+    gap: bool  # events after the requested position were already evicted
+    cursor: Any = None  # store-specific position to continue reading from
+
+
+class ReplayStore(ABC):
+    """
+    Per-run log of sequence-numbered SSE frames, bounded in size and expired
+    after REPLAY_TTL_S, so a client can reconnect with Last-Event-ID. Each run
+    records the client that started it; only that client may resume it.
+    """
+
+    @abstractmethod
+    async def create(self, run_id: str, owner: str) -> bool:
+        """Start a run's log; False if the id is already in use"""
+        ...
+
+    @abstractmethod
+    async def owner(self, run_id: str) -> Optional[str]:
+        """Client that started the run, or None for an unknown or expired run"""
+        ...
+
+    @abstractmethod
+    async def append(self, run_id: str, frame: bytes) -> int:
+        ...
+
+    @abstractmethod
+    async def finish(self, run_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def read(self, run_id: str, after: int, cursor: Any = None) -> Optional[ReplayChunk]:
+        """Frames after seq `after`, or None for an unknown or expired run; counts as reader activity"""
+        ...
+
+    @abstractmethod
+    async def wait(self, run_id: str, after: int, timeout: float) -> None:
+        """Return once frames after `after` may exist or timeout has passed"""
+        ...
+
+    @abstractmethod
+    def last_read(self, run_id: str) -> float:
+        ...
+
+
+class _Buffer:
+    def __init__(self, owner: str) -> None:
+        self.owner = owner
+        self.events: Deque[Tuple[int, bytes]] = deque()
+        self.size = 0
+        self.next_seq = 1
+        self.done = False
+        self.updated_at = time.time()
+        self.read_at = time.time()
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.updated_at = time.time()
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class MemoryReplayStore(ReplayStore):
+    """Ring buffers in this worker's memory"""
+
+    def __init__(
+        self,
+        max_events: int = REPLAY_MAX_EVENTS,
+        max_bytes: int = REPLAY_MAX_BYTES,
+        max_runs: int = REPLAY_MAX_RUNS,
+        ttl_s: float = REPLAY_TTL_S,
+    ):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_runs = max_runs
+        self.ttl_s = ttl_s
+        self._runs: "OrderedDict[str, _Buffer]" = OrderedDict()
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        for run_id in [r for r, b in self._runs.items() if b.updated_at < cutoff]:
+            del self._runs[run_id]
+        while len(self._runs) >= self.max_runs:
+            self._runs.popitem(last=False)
+
+    def _live(self, run_id: str) -> Optional[_Buffer]:
+        buffer = self._runs.get(run_id)
+        if buffer is not None and buffer.updated_at < time.time() - self.ttl_s:
+            del self._runs[run_id]
+            return None
+        return buffer
+
+    async def create(self, run_id: str, owner: str) -> bool:
+        self._purge()
+        if self._live(run_id) is not None:
+            return False
+        self._runs[run_id] = _Buffer(owner)
+        return True
+
+    async def owner(self, run_id: str) -> Optional[str]:
+        buffer = self._live(run_id)
+        return buffer.owner if buffer is not None else None
+
+    async def append(self, run_id: str, frame: bytes) -> int:
+        buffer = self._runs.get(run_id)
+        if buffer is None:
+            return 0  # evicted to make room; the run keeps going without a log
+        seq = buffer.next_seq
+        buffer.next_seq += 1
+        buffer.events.append((seq, frame))
+        buffer.size += len(frame)
+        while len(buffer.events) > 1 and (len(buffer.events) > self.max_events or buffer.size > self.max_bytes):
+            buffer.size -= len(buffer.events.popleft()[1])
+        buffer.notify()
+        return seq
+
+    async def finish(self, run_id: str) -> None:
+        buffer = self._runs.get(run_id)
+        if buffer is not None:
+            buffer.done = True
+            buffer.notify()
+
+    async def read(self, run_id: str, after: int, cursor: Any = None) -> Optional[ReplayChunk]:
+        buffer = self._live(run_id)
+        if buffer is None:
+            return None
+        buffer.read_at = time.time()
+        first = buffer.events[0][0] if buffer.events else buffer.next_seq
+        # Sequence numbers are contiguous, so the frames after `after` are the
+        # newest ones; index them from the right instead of scanning the log
+        count = min(len(buffer.events), max(0, buffer.next_seq - 1 - after))
+        events = [buffer.events[i] for i in range(len(buffer.events) - count, len(buffer.events))]
+        return ReplayChunk(events, buffer.done, after + 1 < first)
+
+    async def wait(self, run_id: str, after: int, timeout: float) -> None:
+        buffer = self._runs.get(run_id)
+        if buffer is None or buffer.done or buffer.next_seq - 1 > after:
+            return
+        try:
+            await asyncio.wait_for(buffer.changed.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    def last_read(self, run_id: str) -> float:
+        buffer = self._runs.get(run_id)
+        return buffer.read_at if buffer is not None else 0.0
+
+
+class FileReplayStore(ReplayStore):
+    """
+    Append-only log file per run in a directory shared by every worker on the
+    host, so a reconnect served by another worker can still replay and tail.
+    Records are "<seq> <length>\\n<frame>"; a .done marker ends the run, a
+    .seen file's mtime records reader activity and .owner holds the client.
+    """
+
+    def __init__(self, directory: str = REPLAY_DIR, max_bytes: int = REPLAY_MAX_BYTES, ttl_s: float = REPLAY_TTL_S):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._writers: Dict[str, Any] = {}
+        self._next_seq: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str, suffix: str) -> str:
+        if not STREAM_ID_PATTERN.match(run_id):
+            raise ValueError(f"invalid stream id {run_id!r}")
+        return os.path.join(self.directory, run_id + suffix)
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # The owner is written once but lives as long as the run's log
+            stamp = path[: -len(".owner")] + ".log" if name.endswith(".owner") else path
+            try:
+                if not os.path.exists(stamp) or os.path.getmtime(stamp) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def _touch(self, run_id: str) -> None:
+        with open(self._path(run_id, ".seen"), "a"):
+            pass
+        os.utime(self._path(run_id, ".seen"))
+
+    def _create(self, run_id: str, owner: str) -> bool:
+        self._purge()
+        try:
+            fd = os.open(self._path(run_id, ".log"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with open(self._path(run_id, ".owner"), "w", encoding="utf-8") as f:
+            f.write(owner)
+        self._writers[run_id] = os.fdopen(fd, "ab")
+        self._next_seq[run_id] = 1
+        self._touch(run_id)
+        return True
+
+    def _append(self, run_id: str, frame: bytes) -> int:
+        seq = self._next_seq[run_id]
+        self._next_seq[run_id] = seq + 1
+        writer = self._writers[run_id]
+        writer.write(b"%d %d\n" % (seq, len(frame)) + frame)
+        writer.flush()
+        if writer.tell() > self.max_bytes:
+            self._compact(run_id)
+        return seq
+
+    def _compact(self, run_id: str) -> None:
+        # Keep the newest half of the budget; readers notice the new inode and rescan
+        path = self._path(run_id, ".log")
+        records = self._records(path, 0, 0)[0]
+        kept: List[Tuple[int, bytes]] = []
+        size = 0
+        for seq, frame in reversed(records):
+            size += len(frame)
+            if kept and size > self.max_bytes // 2:
+                break
+            kept.append((seq, frame))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for seq, frame in reversed(kept):
+                f.write(b"%d %d\n" % (seq, len(frame)) + frame)
+        self._writers[run_id].close()
+        os.replace(tmp, path)
+        self._writers[run_id] = open(path, "ab")
+
+    @staticmethod
+    def _records(path: str, after: int, offset: int) -> Tuple[List[Tuple[int, bytes]], int, Optional[int]]:
+        """Records after seq `after` starting at byte offset, the end offset and the first seq seen"""
+        events: List[Tuple[int, bytes]] = []
+        first: Optional[int] = None
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    break
+                seq, length = (int(part) for part in header.split())
+                frame = f.read(length)
+                if len(frame) < length:
+                    break  # record still being written
+                offset = f.tell()
+                if first is None:
+                    first = seq
+                if seq > after:
+                    events.append((seq, frame))
+        return events, offset, first
+
+    def _read(self, run_id: str, after: int, cursor: Any) -> Optional[ReplayChunk]:
+        path = self._path(run_id, ".log")
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+        self._touch(run_id)
+        # cursor is (inode, offset) from the previous read of this log
+        offset = cursor[1] if cursor and cursor[0] == inode else 0
+        events, end, first = self._records(path, after, offset)
+        gap = offset == 0 and first is not None and after + 1 < first
+        return ReplayChunk(events, os.path.exists(self._path(run_id, ".done")), gap, (inode, end))
+
+    def _owner(self, run_id: str) -> Optional[str]:
+        if not os.path.exists(self._path(run_id, ".log")):
+            return None
+        try:
+            with open(self._path(run_id, ".owner"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _finish(self, run_id: str) -> None:
+        writer = self._writers.pop(run_id, None)
+        if writer is not None:
+            writer.close()
+        self._next_seq.pop(run_id, None)
+        open(self._path(run_id, ".done"), "w").close()
+
+    async def create(self, run_id: str, owner: str) -> bool:
+        return await asyncio.to_thread(self._create, run_id, owner)
+
+    async def owner(self, run_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self._owner, run_id)
+
+    async def append(self, run_id: str, frame: bytes) -> int:
+        # Small buffered writes; cheaper inline than a thread hop per frame
+        return self._append(run_id, frame)
+
+    async def finish(self, run_id: str) -> None:
+        await asyncio.to_thread(self._finish, run_id)
+
+    async def read(self, run_id: str, after: int, cursor: Any = None) -> Optional[ReplayChunk]:
+        return await asyncio.to_thread(self._read, run_id, after, cursor)
+
+    async def wait(self, run_id: str, after: int, timeout: float) -> None:
+        await asyncio.sleep(min(timeout, REPLAY_FILE_POLL_S))
+
+    def last_read(self, run_id: str) -> float:
+        try:
+            return os.path.getmtime(self._path(run_id, ".seen"))
+        except OSError:
+            return 0.0
+
+
+def replay_store_from_env() -> ReplayStore:
+    if REPLAY_STORE == "file":
+        return FileReplayStore()
+    if REPLAY_STORE != "memory":
+        logger.warning(f"Unknown REPLAY_STORE={REPLAY_STORE!r}, using memory")
+    return MemoryReplayStore()
+
+
+replay_store = replay_store_from_env()
+
+# Detached runs, referenced so they are not garbage collected mid-stream
+_detached: Set["asyncio.Task[None]"] = set()
+
+
+def with_event_id(seq: int, frame: bytes) -> bytes:
+    return b"id: %d\n" % seq + frame
+
+
+def start_detached_run(run_id: str, frames: AsyncIterator[bytes], store: ReplayStore = replay_store) -> None:
+    """
+    Drain frames into the run's log in a background task that outlives the
+    request, so a dropped connection can resume instead of rerunning the turn.
+    The run is cancelled if no reader has looked at it for REPLAY_ABANDON_S.
+    """
+
+    async def produce() -> None:
+        try:
+            async for frame in frames:
+                await store.append(run_id, frame)
+        finally:
+            await store.finish(run_id)
+
+    async def supervise() -> None:
+        producer = asyncio.create_task(produce())
+        try:
+            while not producer.done():
+                await asyncio.wait({producer}, timeout=REPLAY_ABANDON_S / 4)
+                if not producer.done() and time.time() - store.last_read(run_id) > REPLAY_ABANDON_S:
+                    logger.info("detached run abandoned, cancelling | stream_id=%s", run_id)
+                    cancelled_runs.inc(reason="abandoned")
+                    producer.cancel()
+                    break
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+    task = asyncio.create_task(supervise())
+    _detached.add(task)
+    task.add_done_callback(_detached.discard)
+
+
+async def replay_stream(
+    run_id: str,
+    after: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    store: ReplayStore = replay_store,
+    poll_s: float = 1.0,
+) -> AsyncIterator[bytes]:
+    """Frames after seq `after` with SSE ids, then the live tail until the run ends"""
+    cursor = None
+    while True:
+        chunk = await store.read(run_id, after, cursor)
+        if chunk is None:
+            return
+        if chunk.gap:
+            yield b'data: {"type":"error","code":"replay_gap","message":"Missed events are no longer buffered"}\n\n'
+            return
+        cursor = chunk.cursor
+        for seq, frame in chunk.events:
+            yield with_event_id(seq, frame)
+            after = seq
+        if chunk.done and not chunk.events:
+            return
+        if not chunk.events:
+            if await is_disconnected():
+                return
+            await store.wait(run_id, after, poll_s)
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# Canned questions are short; long fact patterns practically never repeat verbatim
+RESPONSE_CACHE_MAX_PROMPT_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_PROMPT_CHARS", "300"))
+RESPONSE_CACHE_REPLAY_CHARS_PER_S = float(os.getenv("RESPONSE_CACHE_REPLAY_CHARS_PER_S", "4000"))
+
+_REPLAY_CHUNK_CHARS = 48
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(text: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer"""
+    return _TRAILING_PUNCT.sub("", " ".join(text.split()).lower())
+
+
+class ResponseCache:
+    """
+    LRU with TTL of complete assistant replies to single-turn questions.
+
+    Keys combine the normalized question, the model and a hash of the
+    orchestrator prompt, so editing the instructions invalidates every entry.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_s: float = RESPONSE_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, messages: List[Dict[str, Any]], model: str, prompt_version: str) -> Optional[str]:
+        """Cache key for a conversation, or None when the turn is not cacheable"""
+        if self.max_entries <= 0 or len(messages) != 1 or messages[0].get("role", "user") != "user":
+            return None
+        content = messages[0].get("content")
+        if not isinstance(content, str) or len(content) > RESPONSE_CACHE_MAX_PROMPT_CHARS:
+            return None
+        question = normalize_prompt(content)
+        if not question:
+            return None
+        return hashlib.sha256(f"{prompt_version}\0{model}\0{question}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] > self.ttl_s:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        if not text.strip():
+            return
+        self._entries[key] = (time.time(), text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+async def replay_chunks(
+    text: str,
+    chars_per_s: float = RESPONSE_CACHE_REPLAY_CHARS_PER_S,
+    chunk_chars: int = _REPLAY_CHUNK_CHARS,
+) -> AsyncIterator[str]:
+    """Re-stream a cached reply in word-aligned chunks, paced like a live model"""
+    delay = chunk_chars / chars_per_s if chars_per_s > 0 else 0.0
+    pos = 0
+    while pos < len(text):
+        end = min(len(text), pos + chunk_chars)
+        if end < len(text):
+            space = text.rfind(" ", pos + 1, end)
+            if space > pos:
+                end = space + 1
+        yield text[pos:end]
+        pos = end
+        if delay and pos < len(text):
+            await asyncio.sleep(delay)
+
+
+response_cache = ResponseCache()
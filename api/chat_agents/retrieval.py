@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from agents import RunContextWrapper, function_tool
+
+from .pdf_engine import PAGE_BREAK
+from .run_context import ChatRunContext
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to pure Python
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+# Attachments longer than this are shown as top-k excerpts instead of in full
+RETRIEVAL_INLINE_MAX_CHARS = int(os.getenv("RETRIEVAL_INLINE_MAX_CHARS", "12000"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1000"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "150"))
+RETRIEVAL_MAX_DOCUMENTS = int(os.getenv("RETRIEVAL_MAX_DOCUMENTS", "256"))
+RETRIEVAL_MAX_CONVERSATIONS = int(os.getenv("RETRIEVAL_MAX_CONVERSATIONS", "1000"))
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is it its of on or our she "
+    "that the their them there they this to was we were what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class Passage(NamedTuple):
+    page: Optional[int]  # 1-based; None for documents without pages
+    text: str
+
+
+def _windows(text: str, size: int, overlap: int) -> Iterator[str]:
+    """Split text into windows of about size chars, breaking at whitespace"""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = text.rfind(" ", start + size // 2, end)
+            end = cut if cut > 0 else end
+        yield text[start:end].strip()
+        if end >= len(text):
+            return
+        # Start the next window on a word boundary about overlap chars back
+        space = text.find(" ", end - overlap, end)
+        start = max(start + 1, space + 1 if space >= 0 else end - overlap)
+
+
+def chunk_text(text: str, paged: bool, size: int = RETRIEVAL_CHUNK_CHARS, overlap: int = RETRIEVAL_CHUNK_OVERLAP) -> List[Passage]:
+    """Passages that never cross a page break, so each has one page to cite"""
+    pages = text.split(PAGE_BREAK) if paged else [text]
+    passages = []
+    for number, page in enumerate(pages, start=1):
+        page = " ".join(page.split())
+        for window in _windows(page, size, overlap):
+            if window:
+                passages.append(Passage(number if paged else None, window))
+    return passages
+
+
+class IndexedDocument:
+    """One attachment's passages with BM25 postings"""
+
+    def __init__(self, name: str, text: str, paged: bool):
+        self.name = name
+        self.passages = chunk_text(text, paged)
+        self.lengths: List[int] = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for i, passage in enumerate(self.passages):
+            counts = Counter(tokenize(passage.text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(i)
+                tfs.append(tf)
+        self.postings = postings
+        self.total_length = sum(self.lengths)
+        if np is not None:
+            self._np_lengths = np.asarray(self.lengths, dtype=np.float64)
+            self._np_postings = {
+                term: (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float64))
+                for term, (ids, tfs) in postings.items()
+            }
+
+    def df(self, term: str) -> int:
+        posting = self.postings.get(term)
+        return len(posting[0]) if posting else 0
+
+    def score(self, weights: Dict[str, float], avgdl: float) -> List[Tuple[float, int]]:
+        """(score, passage index) for passages matching any weighted query term"""
+        if np is not None:
+            scores = np.zeros(len(self.passages))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._np_lengths / avgdl)
+            for term, idf in weights.items():
+                posting = self._np_postings.get(term)
+                if posting is not None:
+                    ids, tfs = posting
+                    scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[ids])
+            hits = np.nonzero(scores)[0]
+            return [(float(scores[i]), int(i)) for i in hits]
+
+        totals: Dict[int, float] = {}
+        for term, idf in weights.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            for i, tf in zip(*posting):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / avgdl)
+                totals[i] = totals.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return [(score, i) for i, score in totals.items()]
+
+
+class Hit(NamedTuple):
+    name: str
+    page: Optional[int]
+    text: str
+    score: float
+
+    def cite(self) -> str:
+        return f"[{self.name} p.{self.page}]" if self.page else f"[{self.name}]"
+
+
+# Indexed documents by (url, media_type, text length), shared across conversations
+_documents: "OrderedDict[Tuple[str, str, int], IndexedDocument]" = OrderedDict()
+
+
+async def index_document(url: str, media_type: str, name: str, text: str) -> IndexedDocument:
+    key = (url, media_type, len(text))
+    doc = _documents.get(key)
+    if doc is None:
+        # Tokenizing a few hundred pages takes long enough to stall other streams
+        doc = await asyncio.to_thread(IndexedDocument, name, text, media_type == "application/pdf")
+        _documents[key] = doc
+        while len(_documents) > RETRIEVAL_MAX_DOCUMENTS:
+            _documents.popitem(last=False)
+    else:
+        _documents.move_to_end(key)
+    return doc
+
+
+class AttachmentIndex:
+    """BM25 search over the attachments of one conversation; IDF spans all of them"""
+
+    def __init__(self) -> None:
+        self.documents: Dict[Tuple[str, str], IndexedDocument] = {}
+
+    async def add(self, url: str, media_type: str, name: str, text: str) -> IndexedDocument:
+        doc = await index_document(url, media_type, name, text)
+        self.documents[(url, media_type)] = doc
+        return doc
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, document: Optional[IndexedDocument] = None) -> List[Hit]:
+        docs = list(self.documents.values())
+        passages = sum(len(d.passages) for d in docs)
+        terms = set(tokenize(query))
+        if not passages or not terms:
+            return []
+        avgdl = max(1.0, sum(d.total_length for d in docs) / passages)
+        weights = {}
+        for term in terms:
+            df = sum(d.df(term) for d in docs)
+            if df:
+                weights[term] = math.log(1 + (passages - df + 0.5) / (df + 0.5))
+        scored = []
+        for doc in [document] if document is not None else docs:
+            scored.extend((score, i, doc) for score, i in doc.score(weights, avgdl))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [Hit(doc.name, doc.passages[i].page, doc.passages[i].text, score) for score, i, doc in scored[:k]]
+
+
+_conversations: "OrderedDict[Tuple[str, str], AttachmentIndex]" = OrderedDict()
+
+
+def index_for(conversation_id: Optional[str], owner: str) -> AttachmentIndex:
+    """The conversation's index, kept so turns that send only the new message can still search"""
+    if not conversation_id:
+        return AttachmentIndex()
+    # Keyed by owner too, so a guessed conversation id cannot search someone else's files
+    key = (owner, conversation_id)
+    index = _conversations.get(key)
+    if index is None:
+        index = _conversations[key] = AttachmentIndex()
+        while len(_conversations) > RETRIEVAL_MAX_CONVERSATIONS:
+            _conversations.popitem(last=False)
+    else:
+        _conversations.move_to_end(key)
+    return index
+
+
+def render_reference(doc: IndexedDocument) -> str:
+    """Fixed placeholder for a long attachment from an earlier message; stable across turns"""
+    return (
+        f"[Indexed: {len(doc.passages)} passages not shown here; "
+        "call search_attachments to quote this file and cite pages as shown]"
+    )
+
+
+def render_excerpts(doc: IndexedDocument, hits: List[Hit]) -> str:
+    """Excerpt block that replaces a long attachment's full text"""
+    if not hits:
+        # No overlap with the question; the opening passages are the best guess
+        hits = [Hit(doc.name, p.page, p.text, 0.0) for p in doc.passages[:RETRIEVAL_TOP_K]]
+    header = (
+        f"[Excerpts: {len(hits)} of {len(doc.passages)} passages most relevant to the question; "
+        "call search_attachments for other parts of this file and cite pages as shown]"
+    )
+    return "\n\n".join([header] + [f"{hit.cite()} {hit.text}" for hit in hits])
+
+
+@function_tool
+async def search_attachments(ctx: RunContextWrapper[Any], query: str, k: int = RETRIEVAL_TOP_K) -> str:
+    """Search the files attached to this conversation and return the most relevant passages with page citations.
+
+    Args:
+        query: Keywords or a question about the attached files.
+        k: Number of passages to return.
+    """
+    run_ctx = ctx.context if isinstance(ctx.context, ChatRunContext) else None
+    index = run_ctx.retrieval if run_ctx is not None else None
+    if index is None or not index.documents:
+        return "No attachments are available to search in this conversation."
+    hits = index.search(query, max(1, min(k, 20)))
+    if not hits:
+        return f"No passages in the attachments match {query!r}."
+    return "\n\n".join(f"{hit.cite()} {hit.text}" for hit in hits)
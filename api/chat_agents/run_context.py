@@ -0,0 +1,60 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class ChatRunContext:
+    """
+    Per-request state handed to Runner.run_streamed as the run context.
+
+    Tools receive it through RunContextWrapper.context and use emit() to push
+    SSE payloads that stream_chat_py interleaves with the orchestrator's own
+    output, so sub-agent progress reaches the client while the tool runs.
+    """
+
+    events: "asyncio.Queue[Any]" = field(default_factory=asyncio.Queue)
+    errors: List[str] = field(default_factory=list)
+    # AttachmentIndex over this conversation's files, searched by the search_attachments tool
+    retrieval: Optional[Any] = None
+
+    def emit(self, payload: Dict[str, Any]) -> None:
+        self.events.put_nowait(payload)
+
+
+def data_event(name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Custom SSE payload in the AI SDK's data-part shape, not persisted in the chat history"""
+    return {"type": f"data-{name}", "data": data, "transient": True}
+
+
+def text_delta_from_event(ev: Any) -> Optional[str]:
+    """Text delta carried by an agents SDK stream event, if any"""
+    et = getattr(ev, "type", "")
+    if et == "raw_response_event":
+        data = getattr(ev, "data", None)
+        if data and 'ResponseTextDeltaEvent' in str(data.__class__):
+            return getattr(data, "delta", "") or None
+        return None
+    if et in ("text.delta", "response.text.delta", "agent.output_text.delta"):
+        return getattr(ev, "delta", None) or getattr(ev, "text", "") or None
+    return None
+
+
+def tool_name_from_event(ev: Any) -> Optional[str]:
+    """Name of the tool being called, for run_item_stream_event tool_called events"""
+    if getattr(ev, "type", "") != "run_item_stream_event" or getattr(ev, "name", "") != "tool_called":
+        return None
+    raw = getattr(getattr(ev, "item", None), "raw_item", None)
+    if isinstance(raw, dict):
+        return raw.get("name") or raw.get("type") or "tool"
+    return getattr(raw, "name", None) or getattr(raw, "type", None) or "tool"
+
+
+def tool_call_id_from_event(ev: Any) -> Optional[str]:
+    """call_id linking a tool_called run item to its tool_output"""
+    if getattr(ev, "type", "") != "run_item_stream_event":
+        return None
+    raw = getattr(getattr(ev, "item", None), "raw_item", None)
+    if isinstance(raw, dict):
+        return raw.get("call_id")
+    return getattr(raw, "call_id", None)
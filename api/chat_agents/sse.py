@@ -0,0 +1,86 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "30"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+
+# C-accelerated JSON string quoting (what json.dumps uses internally), without
+# the per-call encoder setup. Non-ASCII is kept as UTF-8 rather than \u escapes.
+_quote = json.encoder.encode_basestring
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def encode_event(payload: Dict[str, Any]) -> bytes:
+    """One SSE frame for an arbitrary payload"""
+    return b"data: " + _dumps(payload).encode("utf-8") + b"\n\n"
+
+
+def encode_delta(text: str) -> bytes:
+    """text-delta frame built without going through the dict encoder"""
+    return b'data: {"type":"text-delta","delta":' + _quote(text).encode("utf-8") + b"}\n\n"
+
+
+START_STEP = encode_event({"type": "start-step"})
+TEXT_START = encode_event({"type": "text-start"})
+TEXT_END = encode_event({"type": "text-end"})
+END_STEP = encode_event({"type": "end-step"})
+
+
+class SSEEncoder:
+    """
+    Frames one response stream and coalesces consecutive text deltas.
+
+    Deltas are buffered until window_ms has passed since the first buffered
+    one or max_bytes of UTF-8 text have accumulated; any other event flushes the buffer
+    first so ordering is preserved. The caller polls timeout() so a quiet
+    model still gets its buffered text out when the window closes.
+    window_ms=0 disables coalescing. on_text, when given, maps each flushed
+    text chunk to extra payloads sent right after it, so events derived from
+    the text are coalesced with it.
+    """
+
+    def __init__(
+        self,
+        window_ms: float = SSE_COALESCE_MS,
+        max_bytes: int = SSE_COALESCE_BYTES,
+        on_text: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+    ):
+        self.window_s = max(0.0, window_ms) / 1000
+        self.max_bytes = max_bytes
+        self.on_text = on_text
+        self._parts: List[str] = []
+        self._size = 0
+        self._first_at = 0.0
+
+    def delta(self, text: str) -> bytes:
+        """Buffer a delta; returns a frame when the buffer is due, else b''"""
+        if not self._parts:
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        # UTF-8 size, as the setting's name says; the encode is skipped for ASCII text
+        self._size += len(text) if text.isascii() else len(text.encode("utf-8"))
+        if self._size >= self.max_bytes or time.monotonic() - self._first_at >= self.window_s:
+            return self.flush()
+        return b""
+
+    def event(self, payload: Dict[str, Any]) -> bytes:
+        return self.flush() + encode_event(payload)
+
+    def flush(self) -> bytes:
+        if not self._parts:
+            return b""
+        text = self._parts[0] if len(self._parts) == 1 else "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        if self.on_text is None:
+            return encode_delta(text)
+        return encode_delta(text) + b"".join(encode_event(p) for p in self.on_text(text))
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until buffered text must be flushed, or None when nothing is buffered"""
+        if not self._parts:
+            return None
+        return max(0.0, self._first_at + self.window_s - time.monotonic())
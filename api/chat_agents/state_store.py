@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.sqlite3")
+CONVERSATION_TTL_S = float(os.getenv("CONVERSATION_TTL_S", str(6 * 3600)))
+CONVERSATION_MAX = int(os.getenv("CONVERSATION_MAX", "2000"))
+# Stored histories carry inlined attachment text, so the memory store is also bounded by size
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(256 * 1024 * 1024)))
+
+AgentMessages = List[Dict[str, Any]]
+
+
+class ConversationStore(ABC):
+    """
+    Server-side conversation state: the processed agent messages for each
+    conversation id (attachments already resolved), so clients only need to
+    send the newest message.
+
+    Each conversation belongs to the authenticated user that created it; other
+    owners get None as if the id did not exist and cannot overwrite it.
+    """
+
+    @abstractmethod
+    async def get(self, conversation_id: str, owner: str) -> Optional[AgentMessages]:
+        ...
+
+    @abstractmethod
+    async def put(self, conversation_id: str, messages: AgentMessages, owner: str) -> bool:
+        """Store the messages; False when the id belongs to another owner"""
+        ...
+
+    @abstractmethod
+    async def delete(self, conversation_id: str) -> None:
+        ...
+
+
+class MemoryConversationStore(ConversationStore):
+    """Per-worker LRU with TTL expiry, bounded by count and by the UTF-8 size of the message text"""
+
+    def __init__(
+        self,
+        max_conversations: int = CONVERSATION_MAX,
+        ttl_s: float = CONVERSATION_TTL_S,
+        max_bytes: int = CONVERSATION_MAX_BYTES,
+    ):
+        self.max_conversations = max_conversations
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, str, AgentMessages]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+
+    def _live(self, conversation_id: str) -> Optional[Tuple[float, str, AgentMessages]]:
+        entry = self._entries.get(conversation_id)
+        if entry is not None and time.time() - entry[0] > self.ttl_s:
+            self._remove(conversation_id)
+            return None
+        return entry
+
+    async def get(self, conversation_id: str, owner: str) -> Optional[AgentMessages]:
+        entry = self._live(conversation_id)
+        if entry is None or entry[1] != owner:
+            return None
+        self._entries.move_to_end(conversation_id)
+        return list(entry[2])
+
+    async def put(self, conversation_id: str, messages: AgentMessages, owner: str) -> bool:
+        entry = self._live(conversation_id)
+        if entry is not None and entry[1] != owner:
+            return False
+        size = sum(len(str(m.get("content", "")).encode("utf-8")) for m in messages)
+        self._remove(conversation_id)
+        if size > self.max_bytes:
+            logger.warning("conversation too large to store | id=%s bytes=%d", conversation_id, size)
+            return True
+        self._entries[conversation_id] = (time.time(), owner, list(messages))
+        self._sizes[conversation_id] = size
+        self._bytes += size
+        while len(self._entries) > self.max_conversations or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    async def delete(self, conversation_id: str) -> None:
+        self._remove(conversation_id)
+
+    def _remove(self, conversation_id: str) -> None:
+        if self._entries.pop(conversation_id, None) is not None:
+            self._bytes -= self._sizes.pop(conversation_id)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """File-backed store shared by every worker on the host; queries run off the event loop"""
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, ttl_s: float = CONVERSATION_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL, owner TEXT NOT NULL DEFAULT '')"
+        )
+        try:
+            # Databases created before conversations had owners
+            self._conn.execute("ALTER TABLE conversations ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations(updated_at)")
+
+    def _get(self, conversation_id: str, owner: str) -> Optional[AgentMessages]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages FROM conversations WHERE id = ? AND owner = ? AND updated_at >= ?",
+                (conversation_id, owner, time.time() - self.ttl_s),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, conversation_id: str, messages: AgentMessages, owner: str) -> bool:
+        now = time.time()
+        payload = json.dumps(messages, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (now - self.ttl_s,))
+            # Another owner's live conversation is left untouched
+            cursor = self._conn.execute(
+                "INSERT INTO conversations (id, messages, updated_at, owner) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at "
+                "WHERE conversations.owner = excluded.owner",
+                (conversation_id, payload, now, owner),
+            )
+        return cursor.rowcount > 0
+
+    def _delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    async def get(self, conversation_id: str, owner: str) -> Optional[AgentMessages]:
+        return await asyncio.to_thread(self._get, conversation_id, owner)
+
+    async def put(self, conversation_id: str, messages: AgentMessages, owner: str) -> bool:
+        return await asyncio.to_thread(self._put, conversation_id, messages, owner)
+
+    async def delete(self, conversation_id: str) -> None:
+        await asyncio.to_thread(self._delete, conversation_id)
+
+
+def store_from_env() -> ConversationStore:
+    if CONVERSATION_STORE == "sqlite":
+        return SQLiteConversationStore()
+    if CONVERSATION_STORE != "memory":
+        logger.warning(f"Unknown CONVERSATION_STORE={CONVERSATION_STORE!r}, using memory")
+    return MemoryConversationStore()
+
+
+conversation_store = store_from_env()
@@ -0,0 +1,222 @@
+import json
+import logging
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .run_context import data_event
+
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_MODE = "structured"
+
+
+class Deadline(BaseModel):
+    description: str = Field(description="What must happen, e.g. 'File DFEH/CRD complaint'")
+    due: str = Field(description="Date or period, e.g. '2025-03-01' or '3 years from termination'")
+    source: str = Field(description="Statute, rule or URL the deadline comes from")
+
+
+class ElementMapping(BaseModel):
+    claim: str
+    element: str
+    status: Literal["met", "unclear", "missing"]
+    facts: str = Field(description="Facts supporting or undermining the element")
+
+
+class CaseReport(BaseModel):
+    # Field order is generation order: the fields clients act on first come first
+    mode: Literal["plaintiff", "lawyer"]
+    jurisdiction: str = Field(description="State/federal jurisdiction the claims arise in")
+    deadlines: List[Deadline]
+    facts_snapshot: List[str] = Field(description="Key facts as short bullets")
+    claims: List[str] = Field(description="Potential claims or defenses")
+    elements_map: List[ElementMapping]
+    case_strength_score: int = Field(ge=0, le=100, description="Case strength 0-100 per the scoring rubric")
+    risks: List[str]
+    recommendation: str = Field(description="Next steps, or take/decline/investigate for counsel")
+    sources: List[str] = Field(description="Citations (URLs or statute cites) relied on")
+
+
+STRUCTURED_ADDENDUM = """
+
+---
+Structured Output Mode
+The client integrates your answer into a CRM. Reply only with the JSON object of the output schema, no markdown.
+Fill `mode` with "plaintiff" or "lawyer" from the routing rules. Research with your tools first as usual;
+every deadline needs a `source`.
+""".rstrip()
+
+
+class FieldStreamParser:
+    """
+    Incremental parser for one streamed JSON object.
+
+    feed() takes raw text chunks as the model produces them and returns
+    data-field-delta payloads with each top-level field's new content and a
+    data-field-complete payload with the parsed value as soon as that field's
+    value closes, so clients can act on early fields before the object ends.
+    String values are streamed decoded; other values as raw JSON text.
+    """
+
+    def __init__(self) -> None:
+        self.state = "before_object"
+        self.fields: Dict[str, Any] = {}
+        self._key: List[str] = []
+        self._raw: List[str] = []
+        self._kind = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = 0  # characters left in the current backslash escape
+        self._emitted = 0  # characters of the current value already sent as deltas
+        self._field = ""
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        for ch in text:
+            self._step(ch, events)
+        if self.state == "in_value":
+            self._emit_delta(events, final=False)
+        return events
+
+    def _step(self, ch: str, events: List[Dict[str, Any]]) -> None:
+        state = self.state
+        if state == "in_value":
+            self._value_char(ch, events)
+        elif state == "before_object":
+            # Anything the model says before the object is not part of it
+            if ch == "{":
+                self.state = "before_key"
+        elif state == "before_key":
+            if ch == '"':
+                self.state = "in_key"
+                self._key = []
+            elif ch == "}":
+                self.state = "done"
+        elif state == "in_key":
+            if self._escape:
+                self._escape -= 1
+                self._key.append(ch)
+            elif ch == "\\":
+                self._escape = 1
+                self._key.append(ch)
+            elif ch == '"':
+                self._field = json.loads('"' + "".join(self._key) + '"')
+                self.state = "after_key"
+            else:
+                self._key.append(ch)
+        elif state == "after_key":
+            if ch == ":":
+                self.state = "before_value"
+        elif state == "before_value":
+            if not ch.isspace():
+                self._start_value(ch, events)
+        elif state == "after_value":
+            if ch == ",":
+                self.state = "before_key"
+            elif ch == "}":
+                self.state = "done"
+
+    def _start_value(self, ch: str, events: List[Dict[str, Any]]) -> None:
+        self.state = "in_value"
+        self._raw = [ch]
+        self._emitted = 0
+        self._escape = 0
+        if ch == '"':
+            self._kind = "text"
+            self._emitted = 1  # the opening quote is not content
+        else:
+            self._kind = "json"
+            self._depth = 1 if ch in "[{" else 0
+            self._in_string = False
+
+    def _value_char(self, ch: str, events: List[Dict[str, Any]]) -> None:
+        if self._kind == "text":
+            if self._escape:
+                # \uXXXX needs four more characters after the u
+                self._escape = 4 if self._escape == 1 and ch == "u" and self._raw[-1] == "\\" else self._escape - 1
+                self._raw.append(ch)
+            elif ch == "\\":
+                self._escape = 1
+                self._raw.append(ch)
+            elif ch == '"':
+                self._raw.append(ch)
+                self._complete(events)
+            else:
+                self._raw.append(ch)
+            return
+
+        if self._depth == 0:
+            # Scalar: number, true, false or null ends at the next delimiter
+            if ch in ",}" or ch.isspace():
+                self._complete(events)
+                self._step(ch, events)
+                return
+            self._raw.append(ch)
+            return
+
+        self._raw.append(ch)
+        if self._in_string:
+            if self._escape:
+                self._escape = 0
+            elif ch == "\\":
+                self._escape = 1
+            elif ch == '"':
+                self._in_string = False
+        elif ch == '"':
+            self._in_string = True
+        elif ch in "[{":
+            self._depth += 1
+        elif ch in "]}":
+            self._depth -= 1
+            if self._depth == 0:
+                self._complete(events)
+
+    def _emit_delta(self, events: List[Dict[str, Any]], final: bool) -> None:
+        end = len(self._raw)
+        if self._kind == "text":
+            if final:
+                end -= 1  # closing quote
+            elif self._escape:
+                # Hold back an escape sequence that is still arriving
+                end = "".join(self._raw).rfind("\\", self._emitted)
+        if end <= self._emitted:
+            return
+        segment = "".join(self._raw[self._emitted:end])
+        if self._kind == "text":
+            try:
+                delta = json.loads('"' + segment + '"')
+            except ValueError:
+                return
+            if delta and "\ud800" <= delta[-1] <= "\udbff" and not final:
+                return  # high surrogate; wait for its pair
+        else:
+            delta = segment
+        self._emitted = end
+        if delta:
+            events.append(data_event("field-delta", {"field": self._field, "kind": self._kind, "delta": delta}))
+
+    def _complete(self, events: List[Dict[str, Any]]) -> None:
+        self._emit_delta(events, final=True)
+        raw = "".join(self._raw)
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            logger.warning("structured output field did not parse | field=%s", self._field)
+            value = None
+        self.fields[self._field] = value
+        events.append(data_event("field-complete", {"field": self._field, "value": value}))
+        self.state = "after_value"
+        self._escape = 0
+
+
+def structured_result(text: str) -> Dict[str, Any]:
+    """Final data-structured-output payload: the validated object, or the validation errors"""
+    start = text.find("{")
+    try:
+        report = CaseReport.model_validate_json(text[start:] if start >= 0 else text)
+    except ValidationError as e:
+        errors = [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+        return data_event("structured-output", {"value": None, "errors": errors})
+    return data_event("structured-output", {"value": report.model_dump(), "errors": []})
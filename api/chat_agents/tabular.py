@@ -0,0 +1,326 @@
+import csv
+import heapq
+import logging
+import os
+import re
+from datetime import date, datetime
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import openpyxl
+except ImportError:  # XLSX digests are skipped without it
+    openpyxl = None
+
+
+logger = logging.getLogger(__name__)
+
+TABULAR_CHUNK_ROWS = int(os.getenv("TABULAR_CHUNK_ROWS", "5000"))
+TABULAR_MAX_ROWS = int(os.getenv("TABULAR_MAX_ROWS", "2000000"))
+TABULAR_MAX_COLUMNS = int(os.getenv("TABULAR_MAX_COLUMNS", "60"))
+TABULAR_MAX_SHEETS = int(os.getenv("TABULAR_MAX_SHEETS", "5"))
+TABULAR_SAMPLE_ROWS = int(os.getenv("TABULAR_SAMPLE_ROWS", "5"))
+TABULAR_TOP_K = int(os.getenv("TABULAR_TOP_K", "5"))
+# Time budget for profiling one file; the worker running it is reclaimed once it passes
+TABULAR_PARSE_TIMEOUT_S = float(os.getenv("TABULAR_PARSE_TIMEOUT_S", "60"))
+
+# Bytes of a CSV read to detect its delimiter
+_SNIFF_BYTES = 64 * 1024
+
+# Distinct values counted exactly per column; past this the column is high-cardinality
+# and only values already seen keep counting, so memory stays bounded
+_DISTINCT_CAPACITY = 10000
+
+NULL_TOKENS = {"", "na", "n/a", "null", "none", "nan", "-", "#n/a"}
+BOOL_TOKENS = {"true": True, "false": False, "yes": True, "no": False}
+_NUMBER_RE = re.compile(r"^\(?-?\$?-?[\d,]*\.?\d+(?:[eE][-+]?\d+)?\)?%?$")
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0"
+
+TableSource = Union[bytes, str]
+
+
+def _parse_number(text: str) -> Optional[float]:
+    if not _NUMBER_RE.match(text):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    cleaned = text.strip("()%").replace("$", "").replace(",", "")
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _parse_date(text: str) -> Optional[datetime]:
+    if not text[:1].isdigit() or len(text) < 6:
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class ColumnStats:
+    """Single-pass statistics for one column, bounded in memory regardless of row count"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.kinds: Dict[str, int] = {}
+        self.num_min: Optional[float] = None
+        self.num_max: Optional[float] = None
+        self.num_sum = 0.0
+        self.date_min: Optional[datetime] = None
+        self.date_max: Optional[datetime] = None
+        self.top: Dict[str, int] = {}
+        self.distinct_overflow = False
+
+    def update(self, values: Iterable[Any]) -> None:
+        kinds = self.kinds
+        for value in values:
+            self.count += 1
+            if isinstance(value, str):
+                value = value.strip()
+                if value.lower() in NULL_TOKENS:
+                    self.nulls += 1
+                    continue
+            elif value is None:
+                self.nulls += 1
+                continue
+
+            kind, number, when = self._classify(value)
+            kinds[kind] = kinds.get(kind, 0) + 1
+            if number is not None:
+                self.num_sum += number
+                if self.num_min is None or number < self.num_min:
+                    self.num_min = number
+                if self.num_max is None or number > self.num_max:
+                    self.num_max = number
+            elif when is not None:
+                if self.date_min is None or when < self.date_min:
+                    self.date_min = when
+                if self.date_max is None or when > self.date_max:
+                    self.date_max = when
+            self._count_top(_display(value))
+
+    @staticmethod
+    def _classify(value: Any) -> Tuple[str, Optional[float], Optional[datetime]]:
+        if isinstance(value, bool):
+            return "bool", None, None
+        if isinstance(value, (int, float)):
+            return ("int" if float(value).is_integer() else "float"), float(value), None
+        if isinstance(value, datetime):
+            return "date", None, value
+        if isinstance(value, date):
+            return "date", None, datetime(value.year, value.month, value.day)
+
+        text = str(value)
+        if text.lower() in BOOL_TOKENS:
+            return "bool", None, None
+        number = _parse_number(text)
+        if number is not None:
+            return ("int" if number.is_integer() and "." not in text else "float"), number, None
+        when = _parse_date(text)
+        if when is not None:
+            return "date", None, when
+        return "text", None, None
+
+    def _count_top(self, key: str) -> None:
+        top = self.top
+        if key in top:
+            top[key] += 1
+        elif len(top) < _DISTINCT_CAPACITY:
+            top[key] = 1
+        else:
+            self.distinct_overflow = True
+
+    @property
+    def dtype(self) -> str:
+        non_null = self.count - self.nulls
+        if not non_null:
+            return "empty"
+        kind, seen = max(self.kinds.items(), key=lambda item: item[1])
+        numeric = self.kinds.get("int", 0) + self.kinds.get("float", 0)
+        if kind in ("int", "float") and numeric >= 0.9 * non_null:
+            return "float" if self.kinds.get("float") else "int"
+        if seen >= 0.9 * non_null:
+            return kind
+        return "mixed"
+
+    @property
+    def distinct(self) -> str:
+        return f"{len(self.top):,}+" if self.distinct_overflow else f"{len(self.top):,}"
+
+    def top_values(self, k: int = TABULAR_TOP_K) -> List[Tuple[str, int]]:
+        # Values seen once carry no signal (IDs, free text), so they are not listed
+        top = heapq.nlargest(k, self.top.items(), key=lambda item: item[1])
+        return [(value, count) for value, count in top if count > 1]
+
+
+def _display(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def _fmt_number(value: Optional[float]) -> str:
+    if value is None:
+        return ""
+    if value.is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _fmt_cell(text: str, limit: int = 40) -> str:
+    text = text.replace("|", "/").replace("\n", " ")
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+class TableDigest:
+    """Accumulates a compact schema-plus-sample description of one table"""
+
+    def __init__(self, header: List[str], title: Optional[str] = None):
+        self.title = title
+        self.header = [h or f"column_{i + 1}" for i, h in enumerate(header)]
+        self.columns = [ColumnStats(name) for name in self.header[:TABULAR_MAX_COLUMNS]]
+        self.rows = 0
+        self.truncated = False
+        self.sample: List[List[Any]] = []
+
+    def add_chunk(self, rows: List[List[Any]]) -> None:
+        if len(self.sample) < TABULAR_SAMPLE_ROWS:
+            self.sample.extend(rows[: TABULAR_SAMPLE_ROWS - len(self.sample)])
+        self.rows += len(rows)
+        width = len(self.columns)
+        # Pad short rows so a column missing from every row of a chunk still
+        # counts its nulls, then transpose once so each column updates in one loop
+        padded = (row[:width] if len(row) >= width else list(row) + [None] * (width - len(row)) for row in rows)
+        for stats, values in zip(self.columns, zip(*padded)):
+            stats.update(values)
+
+    def render(self) -> str:
+        lines = []
+        if self.title:
+            lines.append(f"Sheet: {self.title}")
+        shape = f"Rows: {self.rows:,}{'+' if self.truncated else ''}  Columns: {len(self.header)}"
+        if len(self.header) > len(self.columns):
+            shape += f" (first {len(self.columns)} profiled)"
+        lines.append(shape)
+        lines.append("")
+        lines.append("| column | type | non-null | nulls | distinct | min | max | sum | top values |")
+        lines.append("| --- | --- | --- | --- | --- | --- | --- | --- | --- |")
+        for stats in self.columns:
+            dtype = stats.dtype
+            low = high = total = ""
+            if dtype in ("int", "float"):
+                low, high, total = _fmt_number(stats.num_min), _fmt_number(stats.num_max), _fmt_number(stats.num_sum)
+            elif dtype == "date" and stats.date_min is not None:
+                low, high = stats.date_min.date().isoformat(), stats.date_max.date().isoformat()
+            top = ", ".join(f"{_fmt_cell(value, 24)} ({count})" for value, count in stats.top_values())
+            lines.append(
+                f"| {_fmt_cell(stats.name)} | {dtype} | {stats.count - stats.nulls:,} | {stats.nulls:,} "
+                f"| {stats.distinct} | {low} | {high} | {total} | {top} |"
+            )
+
+        if self.sample:
+            lines.append("")
+            lines.append(f"Sample rows (first {len(self.sample)}):")
+            lines.append(", ".join(_fmt_cell(h) for h in self.header))
+            for row in self.sample:
+                lines.append(", ".join(_fmt_cell(_display(cell)) for cell in row))
+        return "\n".join(lines)
+
+
+# --- readers
+
+def _chunks(rows: Iterator[List[Any]], size: int) -> Iterator[List[List[Any]]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _digest_rows(rows: Iterator[List[Any]], title: Optional[str] = None) -> Optional[TableDigest]:
+    header = next(rows, None)
+    if header is None:
+        return None
+    digest = TableDigest(["" if h is None else str(h).strip() for h in header], title=title)
+    for chunk in _chunks(rows, TABULAR_CHUNK_ROWS):
+        remaining = TABULAR_MAX_ROWS - digest.rows
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            digest.truncated = True
+        digest.add_chunk(chunk)
+        if digest.truncated:
+            break
+    return digest
+
+
+def _open_binary(source: TableSource) -> BinaryIO:
+    return BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+
+
+def summarize_csv(stream: BinaryIO) -> str:
+    # Sniff from the first bytes of the file; reading characters through the
+    # wrapper could pull in up to four times as much
+    head = stream.read(_SNIFF_BYTES).decode("utf-8", errors="ignore")
+    stream.seek(0)
+    with TextIOWrapper(stream, encoding="utf-8", errors="ignore", newline="") as f:
+        try:
+            dialect = csv.Sniffer().sniff(head, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        digest = _digest_rows(iter(csv.reader(f, dialect)))
+    return digest.render() if digest else "[CSV contained no rows]"
+
+
+def summarize_xlsx(stream: BinaryIO) -> str:
+    if openpyxl is None:
+        return "[XLSX preview unavailable: openpyxl is not installed]"
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sections = []
+        for sheet in workbook.worksheets[:TABULAR_MAX_SHEETS]:
+            rows = (list(row) for row in sheet.iter_rows(values_only=True))
+            digest = _digest_rows(rows, title=sheet.title)
+            if digest is not None:
+                sections.append(digest.render())
+        if len(workbook.worksheets) > TABULAR_MAX_SHEETS:
+            sections.append(f"[{len(workbook.worksheets) - TABULAR_MAX_SHEETS} more sheets not profiled]")
+    finally:
+        workbook.close()
+    return "\n\n".join(sections) if sections else "[Workbook contained no rows]"
+
+
+def summarize_table(source: TableSource) -> str:
+    """
+    Profile a CSV or XLSX file in one streaming pass and return a digest.
+
+    The format is sniffed from the content rather than trusted from the media
+    type, since browsers commonly label plain CSV as application/vnd.ms-excel.
+    """
+    with _open_binary(source) as stream:
+        magic = stream.read(4)
+        stream.seek(0)
+        if magic == _ZIP_MAGIC:
+            return summarize_xlsx(stream)
+        if magic == _OLE_MAGIC:
+            return (
+                "[Preview unavailable for legacy .xls workbooks. "
+                "Save the file as .xlsx or CSV and upload it again.]"
+            )
+        return summarize_csv(stream)
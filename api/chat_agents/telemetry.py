@@ -0,0 +1,177 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Include per-stage timings in the SSE metrics event (the histograms are always kept)
+SSE_METRICS_DETAIL = os.getenv("SSE_METRICS_DETAIL", "0") == "1"
+
+# Seconds; covers cache hits (ms) through long sub-agent runs (minutes)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...]) -> str:
+    parts = []
+    for key, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return ",".join(parts)
+
+
+def _fmt(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _label_str(key + (("le", _fmt(bound)),))
+                lines.append(f"{self.name}_bucket{{{labels}}} {cumulative}")
+            labels = f"{{{_label_str(key)}}}" if key else ""
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], int] = {}
+
+    def inc(self, amount: int = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for key, value in snapshot:
+            labels = f"{{{_label_str(key)}}}" if key else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+stage_seconds = Histogram("chat_stage_seconds", "Latency of each chat request stage in seconds")
+cancelled_runs = Counter("chat_cancelled_runs_total", "Chat runs cancelled before completion, by reason")
+
+
+class RequestTimings:
+    """Stage timings for one chat request; every record also feeds the shared histogram"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float, name: str = "") -> None:
+        stage_seconds.observe(seconds, stage=stage, name=name)
+        key = f"{stage}:{name}" if name else stage
+        self.stages[key] = self.stages.get(key, 0.0) + seconds
+
+    def mark(self, stage: str) -> None:
+        """Record time since the request started, the first time stage is reached"""
+        if stage not in self.stages:
+            self.record(stage, time.perf_counter() - self.started)
+
+    def summary_ms(self) -> Dict[str, int]:
+        return {key: int(seconds * 1000) for key, seconds in self.stages.items()}
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    """Begin timing a request; tasks spawned afterwards inherit it through the context"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def record(stage: str, seconds: float, name: str = "") -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.record(stage, seconds, name)
+    else:
+        stage_seconds.observe(seconds, stage=stage, name=name)
+
+
+def mark(stage: str) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.mark(stage)
+
+
+@contextmanager
+def timed(stage: str, name: str = "") -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start, name)
+
+
+def _render_stats(lines: List[str], metric: str, help_text: str, label: str, stats: Dict[str, Dict[str, Any]]) -> None:
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} gauge")
+    for group, values in sorted(stats.items()):
+        for stat, value in sorted(values.items()):
+            labels = _label_str(((label, group), ("stat", stat)))
+            lines.append(f"{metric}{{{labels}}} {value}")
+
+
+def render_metrics(
+    cache_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+    admission_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+    ingest_stats: Optional[Dict[str, int]] = None,
+) -> str:
+    """Prometheus exposition of the stage histograms plus cache, admission and prefetch counters"""
+    lines = stage_seconds.render() + cancelled_runs.render()
+    if cache_stats:
+        _render_stats(lines, "chat_cache_stat", "Cache counters and sizes", "cache", cache_stats)
+    if admission_stats:
+        _render_stats(lines, "chat_admission_stat", "Admission control slots and queues", "governor", admission_stats)
+    if ingest_stats is not None:
+        lines.append("# HELP chat_ingest_jobs Attachment prefetch jobs remembered by this worker, by status")
+        lines.append("# TYPE chat_ingest_jobs gauge")
+        for status, count in sorted(ingest_stats.items()):
+            lines.append(f"chat_ingest_jobs{{{_label_str((('status', status),))}}} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,38 @@
+import logging
+import os
+import time
+
+from agents import set_default_openai_client
+from openai import AsyncOpenAI
+
+from .orchestrator import CHAT_MODELS, DEFAULT_MODEL, get_orchestrator
+from .pdf_engine import warm_pdf_pool
+
+
+logger = logging.getLogger(__name__)
+
+# Open a TLS connection to OpenAI during startup (one cheap metadata request)
+WARMUP_OPENAI_CONNECT = os.getenv("WARMUP_OPENAI_CONNECT", "1") == "1"
+
+
+async def warm_up() -> None:
+    """Pay cold-start costs on FastAPI startup instead of on the first chat request"""
+    start = time.time()
+
+    for selected in CHAT_MODELS:
+        get_orchestrator(selected)
+
+    warm_pdf_pool()
+
+    if os.getenv("OPENAI_API_KEY"):
+        # The agents SDK creates its client lazily on the first model call; share one up front
+        client = AsyncOpenAI()
+        set_default_openai_client(client)
+
+        if WARMUP_OPENAI_CONNECT:
+            try:
+                await client.with_options(max_retries=0, timeout=5).models.retrieve(DEFAULT_MODEL)
+            except Exception as e:
+                logger.warning(f"OpenAI warm-up request failed: {e}")
+
+    logger.info("warm-up finished | duration_ms=%d", int((time.time() - start) * 1000))
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents import Agent, RunContextWrapper, Runner, WebSearchTool, function_tool
+
+from .response_cache import normalize_prompt
+
+
+logger = logging.getLogger(__name__)
+
+# "agent": cached web_search function tool backed by a small search agent;
+# "stub": canned offline results; "hosted": each agent keeps its own uncached WebSearchTool
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "agent")
+WEB_SEARCH_MODEL = os.getenv("WEB_SEARCH_MODEL", "gpt-4.1-mini")
+# Statutes, deadlines and firm listings change slowly; a day keeps them fresh enough
+WEB_SEARCH_TTL_S = float(os.getenv("WEB_SEARCH_TTL_S", "86400"))
+WEB_SEARCH_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_MAX_ENTRIES", "2048"))
+WEB_SEARCH_TIMEOUT_S = float(os.getenv("WEB_SEARCH_TIMEOUT_S", "45"))
+WEB_SEARCH_STUB_DELAY_S = float(os.getenv("WEB_SEARCH_STUB_DELAY_S", "0.2"))
+
+_SEARCHER = Agent(
+    name="web-searcher",
+    model=WEB_SEARCH_MODEL,
+    instructions=(
+        "Search the web for the query and report what you find as terse bullets. "
+        "Prefer primary legal sources (official codes, courts, .gov agencies, bar associations). "
+        "Quote statute and rule numbers, deadlines and dates exactly, give the URL of every source "
+        "and note when sources disagree. Do not answer beyond what the sources say."
+    ),
+    tools=[WebSearchTool()],
+)
+
+
+async def _agent_search(query: str) -> str:
+    result = await Runner.run(_SEARCHER, query)
+    return str(result.final_output).strip()
+
+
+async def _stub_search(query: str) -> str:
+    await asyncio.sleep(WEB_SEARCH_STUB_DELAY_S)
+    slug = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+    return (
+        f"- Stub result for {query!r}: the limitations period is two years from the date of injury.\n"
+        f"  Source: https://example.gov/statutes/{slug}\n"
+        f"- Stub result for {query!r}: notice must be filed within 180 days.\n"
+        f"  Source: https://example.org/courts/{slug}"
+    )
+
+
+class SearchCache:
+    """
+    LRU with TTL of web search results keyed by the normalized query.
+
+    Concurrent lookups of one query share a single search, so a routed turn
+    where the orchestrator and a sub-agent ask the same question searches
+    once; the search is cancelled once every caller waiting on it has been.
+    Failures are not cached.
+    """
+
+    def __init__(self, max_entries: int = WEB_SEARCH_MAX_ENTRIES, ttl_s: float = WEB_SEARCH_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
+        self._waiters: Dict[str, int] = {}
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] > self.ttl_s:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        if self.max_entries <= 0 or not text:
+            return
+        self._entries[key] = (time.time(), text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def search(self, query: str) -> str:
+        key = normalize_prompt(query)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.shared += 1
+            return await self._await_shared(key, pending)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._search(key, query))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await self._await_shared(key, task)
+
+    async def _await_shared(self, key: str, task: "asyncio.Future[str]") -> str:
+        # shield() keeps the search alive for other waiters if this caller is cancelled;
+        # once every waiter has gone (their clients disconnected) the search is cancelled too
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not task.done():
+                    self._inflight.pop(key, None)
+                    task.cancel()
+
+    async def _search(self, key: str, query: str) -> str:
+        backend = _stub_search if WEB_SEARCH_BACKEND == "stub" else _agent_search
+        try:
+            text = await asyncio.wait_for(backend(query), WEB_SEARCH_TIMEOUT_S)
+        except Exception:
+            self.errors += 1
+            raise
+        self.put(key, text)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.shared) / lookups, 4) if lookups else 0.0,
+        }
+
+
+search_cache = SearchCache()
+
+
+@function_tool
+async def web_search(ctx: RunContextWrapper[Any], query: str) -> str:
+    """Search the web for statutes, case law, deadlines, agencies or law firms; returns findings with source URLs.
+
+    Args:
+        query: A specific search query, including the jurisdiction where relevant.
+    """
+    try:
+        return await search_cache.search(query)
+    except Exception as e:
+        logger.warning("web search failed | query=%r error=%s", query, e)
+        return f"[Web search failed: {e}. Say that sources could not be checked.]"
+
+
+def web_search_tools() -> List[Any]:
+    """Search tool for an agent's tool list; one shared cache unless WEB_SEARCH_BACKEND=hosted"""
+    if WEB_SEARCH_BACKEND == "hosted":
+        return [WebSearchTool()]
+    return [web_search]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from chat_agents.admission import ADDRESS_CLIENT_PREFIX, ADMISSION_ADDRESS_FACTOR, Governor, Overloaded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_waiters_are_granted_in_fifo_order():
+    async def scenario():
+        governor = Governor("test", limit=1, per_client=10, max_queue=10)
+        holder = governor.enqueue("a")
+        waiters = [governor.enqueue(client) for client in ("b", "c", "d")]
+        assert holder.granted and [w.position for w in waiters] == [1, 2, 3]
+
+        current = holder
+        for index, waiter in enumerate(waiters):
+            current.release()
+            assert [w.granted for w in waiters] == [i <= index for i in range(len(waiters))]
+            current = waiter
+    run(scenario())
+
+
+def test_client_at_its_cap_does_not_block_others():
+    async def scenario():
+        governor = Governor("test", limit=3, per_client=1, max_queue=10)
+        a1 = governor.enqueue("a")
+        a2 = governor.enqueue("a")
+        b1 = governor.enqueue("b")
+        assert a1.granted and not a2.granted and b1.granted
+        assert governor.stats()["active"] == 2 and governor.stats()["queued"] == 1
+
+        a1.release()
+        assert a2.granted
+        assert governor.stats() == {"active": 2, "queued": 0, "limit": 3, "rejected": 0}
+    run(scenario())
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        governor = Governor("test", limit=1, per_client=1, max_queue=1)
+        governor.enqueue("a")
+        governor.enqueue("b")
+        with pytest.raises(Overloaded):
+            governor.enqueue("c")
+        assert governor.rejected == 1
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue_and_holder_releases_slot():
+    async def scenario():
+        governor = Governor("test", limit=1, per_client=1, max_queue=10)
+        holding = asyncio.Event()
+
+        async def hold(client):
+            async with governor.slot(client):
+                holding.set()
+                await asyncio.sleep(60)
+
+        holder = asyncio.create_task(hold("a"))
+        await holding.wait()
+        waiter = asyncio.create_task(hold("b"))
+        await asyncio.sleep(0)
+        assert governor.stats()["queued"] == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert governor.stats()["queued"] == 0
+
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+        assert governor.active == 0
+        assert governor.enqueue("c").granted
+    run(scenario())
+
+
+def test_slot_times_out_in_queue():
+    async def scenario():
+        governor = Governor("test", limit=1, per_client=1, max_queue=10)
+        governor.enqueue("a")
+        with pytest.raises(Overloaded):
+            async with governor.slot("b", timeout_s=0.01):
+                pass
+        assert governor.stats()["queued"] == 0
+    run(scenario())
+
+
+def test_address_clients_get_a_larger_cap():
+    governor = Governor("test", limit=100, per_client=2, max_queue=10)
+    assert governor.client_limit("user-1") == 2
+    assert governor.client_limit(ADDRESS_CLIENT_PREFIX + "10.0.0.1") == 2 * max(1, ADMISSION_ADDRESS_FACTOR)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from chat_agents import batch_intake, orchestrator
+from chat_agents.admission import Governor
+from chat_agents.batch_intake import IntakeAssessment, stream_batch_intake
+from chat_agents.state_store import MemoryConversationStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def roomy_governor(monkeypatch):
+    # Every case gets a slot at once, so completion order is set by the fake run times
+    monkeypatch.setattr(batch_intake, "subagent_governor", Governor("test", limit=10, per_client=10, max_queue=10))
+
+
+class FakeRun:
+    def __init__(self, assessment):
+        self.assessment = assessment
+
+    def final_output_as(self, cls):
+        return self.assessment
+
+
+def assessment(strength: int) -> IntakeAssessment:
+    return IntakeAssessment(
+        theory="retaliation", jurisdiction="CA", sol_risk="low", strength=strength,
+        top_risks=[], evidence_highlights=[], rationale="",
+    )
+
+
+def test_results_stream_in_completion_order_and_ties_rank_in_intake_order(monkeypatch):
+    # Later intakes finish first; every case scores the same
+    delays = {"Case 1": 0.06, "Case 2": 0.04, "Case 3": 0.02}
+
+    async def fake_run(agent, query):
+        await asyncio.sleep(delays[query.split("\n")[0]])
+        return FakeRun(assessment(70))
+
+    monkeypatch.setattr(batch_intake.Runner, "run", fake_run)
+
+    async def scenario():
+        intakes = [("a.pdf", "A"), ("b.pdf", "B"), ("c.pdf", "C")]
+        payloads = [p async for p in stream_batch_intake(intakes, "rank these")]
+        finished = [p["data"]["caseId"] for p in payloads if p["type"] == "data-intake-result"]
+        assert finished == ["Case 3", "Case 2", "Case 1"]
+        table = payloads[-1]["delta"]
+        rows = [line.split("|")[2].strip() for line in table.splitlines() if line[:3] in ("| 1", "| 2", "| 3")]
+        assert rows == ["Case 1", "Case 2", "Case 3"]
+    run(scenario())
+
+
+def test_failed_cases_are_listed_unranked(monkeypatch):
+    async def fake_run(agent, query):
+        if query.startswith("Case 2\n"):
+            raise RuntimeError("model error")
+        return FakeRun(assessment(50))
+
+    monkeypatch.setattr(batch_intake.Runner, "run", fake_run)
+
+    async def scenario():
+        payloads = [p async for p in stream_batch_intake([("a", "A"), ("b", "B")], "")]
+        assert "Not ranked (scoring failed): Case 2" in payloads[-1]["delta"]
+    run(scenario())
+
+
+def test_unknown_conversation_is_reported_in_batch_mode(monkeypatch):
+    monkeypatch.setattr(orchestrator, "conversation_store", MemoryConversationStore())
+
+    async def scenario():
+        frames = [f async for f in orchestrator.stream_chat_py(
+            [], "chat-model", mode=batch_intake.BATCH_INTAKE_MODE, conversation_id="missing",
+            new_message={"role": "user", "content": "score these"}, owner="alice",
+        )]
+        assert len(frames) == 1 and b"conversation_not_found" in frames[0]
+    run(scenario())
@@ -0,0 +1,62 @@
+import asyncio
+
+from starlette.requests import Request
+
+import chat
+
+
+def request(headers=None, host="203.0.113.7"):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "POST", "path": "/api/chat", "headers": raw, "client": (host, 1234)})
+
+
+def test_client_id_needs_the_proxy_secret(monkeypatch):
+    monkeypatch.setattr(chat, "PROXY_SHARED_SECRET", "s3cret")
+    assert chat._client_id(request({"x-client-id": "user-1", "x-proxy-secret": "s3cret"})) == "user-1"
+    # A forged id without the secret, or with a wrong one, is identified by address
+    assert chat._client_id(request({"x-client-id": "user-1"})) == "addr:203.0.113.7"
+    assert chat._client_id(request({"x-client-id": "user-1", "x-proxy-secret": "guess"})) == "addr:203.0.113.7"
+    assert chat._client_id(request({"x-client-id": "addr:10.0.0.1", "x-proxy-secret": "s3cret"})) == "addr:203.0.113.7"
+
+
+def test_client_id_is_ignored_without_a_configured_secret(monkeypatch):
+    monkeypatch.setattr(chat, "PROXY_SHARED_SECRET", "")
+    assert chat._client_id(request({"x-client-id": "user-1", "x-proxy-secret": ""})) == "addr:203.0.113.7"
+
+
+def test_resume_is_limited_to_the_client_that_started_the_run():
+    from fastapi.testclient import TestClient
+
+    async def start(run_id: str, owner: str) -> None:
+        await chat.replay_store.create(run_id, owner)
+        await chat.replay_store.append(run_id, b'data: {"type":"text-delta"}\n\n')
+        await chat.replay_store.finish(run_id)
+
+    client = TestClient(chat.app)
+    asyncio.run(start("a" * 22, "addr:testclient"))
+    asyncio.run(start("b" * 22, "user-1"))
+    assert client.get("/api/chat/stream/" + "a" * 22).status_code == 200
+    assert client.get("/api/chat/stream/" + "b" * 22).status_code == 204
+
+
+def test_client_chosen_stream_id_must_be_long_enough():
+    from fastapi.testclient import TestClient
+
+    body = {"messages": [{"role": "user", "content": "hi"}], "selectedChatModel": "chat-model", "streamId": "short-id"}
+    assert TestClient(chat.app).post("/api/chat", json=body).status_code == 409
+
+
+def test_metrics_include_ingest_jobs():
+    from fastapi.testclient import TestClient
+
+    body = TestClient(chat.app).get("/metrics").text
+    assert 'chat_ingest_jobs{status="ready"}' in body
+
+
+def test_message_only_turn_from_an_unauthenticated_caller_is_not_found(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(chat, "PROXY_SHARED_SECRET", "s3cret")
+    body = {"message": {"role": "user", "content": "more"}, "conversationId": "c1", "selectedChatModel": "chat-model"}
+    text = TestClient(chat.app).post("/api/chat", json=body, headers={"x-client-id": "user-1"}).text
+    assert "conversation_not_found" in text and "unexpected keyword" not in text
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from chat_agents import compaction, orchestrator
+from chat_agents.compaction import compact_history, stub_attachments
+from chat_agents.pdf_engine import PAGE_BREAK
+from chat_agents.retrieval import AttachmentIndex
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+LONG_PDF = PAGE_BREAK.join(
+    f"Page {page}: overtime wages retaliation deadline filing notice employer policy handbook. " * 60
+    for page in range(1, 21)
+)
+REF = "[File: intake.pdf (application/pdf) - URL: http://x/intake.pdf]"
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Record block summaries compact_history asks for instead of calling the model"""
+    keys = []
+    monkeypatch.setattr(compaction.summary_cache, "schedule", lambda key, block: keys.append(key))
+    monkeypatch.setattr(compaction.summary_cache, "_entries", compaction.OrderedDict())
+    return keys
+
+
+def _thread(turns):
+    messages = [{"role": "user", "content": f"Please review this intake {REF}"}]
+    for turn in range(turns):
+        messages.append({"role": "assistant", "content": f"Answer {turn}: " + "analysis " * 200})
+        messages.append({"role": "user", "content": f"Follow-up question {turn} about the case"})
+    return messages
+
+
+def test_stub_does_not_depend_on_the_body():
+    a = stub_attachments("[PDF File: a.pdf]\nshort body\n[End of PDF]")
+    b = stub_attachments("[PDF File: a.pdf]\na much longer body than before\n[End of PDF]")
+    assert a == b == "[PDF File: a.pdf - content omitted from an earlier turn]"
+
+
+def test_recent_messages_are_kept_verbatim(scheduled):
+    messages = [{"role": "user", "content": f"message {i} " + "x" * 4000} for i in range(30)]
+    compacted = compact_history(messages, token_budget=5000, keep_messages=4, block_size=8)
+    assert compacted[-4:] == messages[-4:]
+    assert compacted[0]["role"] == "developer" and compacted[0]["content"].startswith("[Summary of earlier conversation, messages 1-8]")
+    assert len(scheduled) == 3
+
+
+def test_under_budget_history_is_unchanged(scheduled):
+    messages = [{"role": "user", "content": "short"}] * 10
+    assert compact_history(messages, token_budget=10_000) is messages
+    assert scheduled == []
+
+
+def test_summary_keys_are_stable_across_turns(monkeypatch, scheduled):
+    """A later turn with a different question must reuse the earlier turn's block summaries"""
+    async def fake_pdf(url):
+        return LONG_PDF
+
+    monkeypatch.setattr(orchestrator, "extract_pdf_text", fake_pdf)
+
+    async def turn(messages):
+        scheduled.clear()
+        agent_messages = orchestrator.model_input(await orchestrator.to_agent_messages(messages, AttachmentIndex()))
+        compact_history(agent_messages, token_budget=2000, keep_messages=2, block_size=4)
+        return agent_messages, list(scheduled)
+
+    async def scenario():
+        thread = _thread(6)
+        first, first_keys = await turn(thread + [{"role": "user", "content": "When is the filing deadline?"}])
+        second, second_keys = await turn(thread + [{"role": "user", "content": "Was overtime paid on page 7?"}])
+        # Earlier messages render identically, so the provider can cache the prompt prefix
+        assert first[:-1] == second[:-1]
+        assert first_keys and first_keys == second_keys
+    run(scenario())
+
+
+def test_summary_keys_extend_as_the_thread_grows(scheduled):
+    messages = [{"role": "user", "content": f"m{i} " + "y" * 4000} for i in range(20)]
+    compact_history(messages, token_budget=3000, keep_messages=2, block_size=4)
+    shorter = list(scheduled)
+    scheduled.clear()
+    compact_history(messages + [{"role": "user", "content": "z" * 4000}] * 4, token_budget=3000, keep_messages=2, block_size=4)
+    assert scheduled[:len(shorter)] == shorter and len(scheduled) > len(shorter)
@@ -0,0 +1,79 @@
+import zipfile
+from email.message import EmailMessage
+from io import BytesIO
+
+from chat_agents import documents
+from chat_agents.documents import extract_document
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def docx(body: str) -> bytes:
+    xml = f'<?xml version="1.0"?><w:document xmlns:w="{_W_NS}"><w:body>{body}</w:body></w:document>'
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+
+def email(subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "client@example.com"
+    message["To"] = "intake@example.com"
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+def test_docx_paragraphs_and_table_rows():
+    data = docx(
+        "<w:p><w:r><w:t>Demand letter</w:t></w:r></w:p>"
+        "<w:tbl><w:tr>"
+        "<w:tc><w:p><w:r><w:t>Wages</w:t></w:r></w:p></w:tc>"
+        "<w:tc><w:p><w:r><w:t>$4,200</w:t></w:r></w:p></w:tc>"
+        "</w:tr></w:tbl>"
+    )
+    text = extract_document(data)
+    assert text.splitlines()[0] == "Demand letter"
+    assert "Wages | $4,200" in text
+
+
+def test_docx_over_the_uncompressed_limit_is_not_parsed(monkeypatch):
+    monkeypatch.setattr(documents, "DOCX_MAX_XML_BYTES", 100)
+    # Compresses to almost nothing but would expand past the limit
+    text = extract_document(docx("<w:p><w:r><w:t>" + "a" * 10_000 + "</w:t></w:r></w:p>"))
+    assert text.startswith("[Word document body is") and "over the 100 byte limit" in text
+
+
+def test_docx_respects_the_character_budget():
+    paragraphs = "".join(f"<w:p><w:r><w:t>{'x' * 50}</w:t></w:r></w:p>" for _ in range(20))
+    text = extract_document(docx(paragraphs), max_chars=120)
+    assert text.count("x") == 120
+    assert text.endswith("[Document truncated: character or time budget reached]")
+
+
+def test_email_headers_body_and_nested_attachments():
+    forwarded = email("Original complaint", "My manager cut my hours after I reported it.")
+    message = email("Fwd: intake", "See the forwarded message and my notes.")
+    message.add_attachment(b"Timeline: reported 2024-01-05", maintype="text", subtype="plain", filename="notes.txt")
+    message.add_attachment(forwarded)
+    text = extract_document(message.as_bytes())
+    assert "From: client@example.com" in text and "Subject: Fwd: intake" in text
+    assert "See the forwarded message" in text
+    assert "[Attachment: notes.txt (text/plain)]\nTimeline: reported 2024-01-05" in text
+    assert "Subject: Original complaint" in text and "cut my hours" in text
+
+
+def test_email_nesting_stops_at_the_depth_limit(monkeypatch):
+    monkeypatch.setattr(documents, "DOCUMENT_MAX_DEPTH", 1)
+    message = email("outer", "outer body")
+    message.add_attachment(email("inner", "inner body"))
+    text = extract_document(message.as_bytes())
+    assert "outer body" in text
+    assert "inner body" not in text and "[Not extracted: nested too deeply]" in text
+
+
+def test_msg_without_extract_msg_is_reported(monkeypatch):
+    monkeypatch.setattr(documents, "extract_msg", None)
+    text = extract_document(documents._OLE_MAGIC + b"\x00" * 60)
+    assert "extract-msg is not installed" in text
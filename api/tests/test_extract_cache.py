@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+from chat_agents.extract_cache import ExtractCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_disk_tier_survives_a_restart_and_runs_off_the_event_loop(tmp_path):
+    threads = []
+
+    class Recording(ExtractCache):
+        def _disk_read(self, rel_path):
+            threads.append(threading.current_thread())
+            return super()._disk_read(rel_path)
+
+        def _disk_write(self, rel_path, text):
+            threads.append(threading.current_thread())
+            super()._disk_write(rel_path, text)
+
+    async def scenario():
+        await Recording(disk_dir=str(tmp_path)).put("https://x/a.pdf", "application/pdf", "abc", "text")
+        restarted = Recording(disk_dir=str(tmp_path))
+        assert await restarted.get_by_url("https://x/a.pdf", "application/pdf") == "text"
+        assert restarted.stats()["disk_hits"] == 1
+    run(scenario())
+    assert threads and threading.main_thread() not in threads
+
+
+def test_memory_hit_and_content_addressing():
+    async def scenario():
+        cache = ExtractCache()
+        await cache.put("https://x/a.pdf", "application/pdf", "sha-1", "text")
+        assert await cache.get_by_url("https://x/a.pdf", "application/pdf") == "text"
+        # Same body under another URL resolves by content; another type does not
+        assert await cache.get_by_content("sha-1", "application/pdf") == "text"
+        assert await cache.get_by_content("sha-1", "text/csv") is None
+        assert await cache.get_by_url("https://x/b.pdf", "application/pdf") is None
+        assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+    run(scenario())
+
+
+def test_memory_tier_is_bounded_by_utf8_size():
+    async def scenario():
+        cache = ExtractCache(max_bytes=10)
+        await cache.put("u1", "application/pdf", "k1", "ééé")  # 6 bytes
+        await cache.put("u2", "application/pdf", "k2", "éé")  # 4 bytes, fits beside it
+        await cache.put("u3", "application/pdf", "k3", "x")
+        assert await cache.get_by_url("u1", "application/pdf") is None
+        assert cache.stats()["evictions"] == 1
+    run(scenario())
+
+
+class FakeDownloads:
+    """Stands in for fetch_to_spool; counts downloads and notices cancellation"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self, url):
+        from chat_agents.fetch import SpooledAttachment
+
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        spool = SpooledAttachment()
+        spool.write(url.encode())
+        spool.finish()
+        return spool
+
+
+def _extractor(monkeypatch, delay):
+    from chat_agents import orchestrator
+
+    downloads = FakeDownloads(delay)
+    parses = []
+
+    async def parse(attachment):
+        parses.append(attachment.source)
+        return "parsed " + attachment.source.decode()
+
+    monkeypatch.setattr(orchestrator, "extract_cache", ExtractCache())
+    monkeypatch.setattr(orchestrator, "fetch_to_spool", downloads)
+    return lambda url: orchestrator._cached_extract(url, "application/pdf", parse, "pdf"), downloads, parses
+
+
+def test_concurrent_requests_share_one_download_and_later_ones_hit(monkeypatch):
+    extract, downloads, parses = _extractor(monkeypatch, delay=0.05)
+
+    async def scenario():
+        results = await asyncio.gather(*(extract("https://x/a.pdf") for _ in range(3)))
+        assert results == ["parsed https://x/a.pdf"] * 3
+        assert await extract("https://x/a.pdf") == "parsed https://x/a.pdf"
+        assert downloads.started == 1 and len(parses) == 1
+    run(scenario())
+
+
+def test_download_is_cancelled_when_its_last_waiter_is(monkeypatch):
+    extract, downloads, _ = _extractor(monkeypatch, delay=10)
+
+    async def scenario():
+        first = asyncio.ensure_future(extract("https://x/a.pdf"))
+        second = asyncio.ensure_future(extract("https://x/a.pdf"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        # Still needed by the second request
+        assert downloads.cancelled == 0
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert downloads.started == 1 and downloads.cancelled == 1
+    run(scenario())
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import os
+
+import httpx
+import pytest
+
+from chat_agents import fetch
+from chat_agents.fetch import AttachmentTooLarge, SpooledAttachment, fetch_to_spool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_small_bodies_stay_in_memory():
+    with SpooledAttachment(threshold=16) as spool:
+        spool.write(b"hello ")
+        spool.write(b"world")
+        spool.finish()
+        assert spool.path is None and spool.source == b"hello world"
+        assert spool.content_key == hashlib.sha256(b"hello world").hexdigest()
+
+
+def test_large_bodies_spill_to_a_file_that_close_removes():
+    spool = SpooledAttachment(threshold=8)
+    for chunk in (b"0123", b"4567", b"89ab"):
+        spool.write(chunk)
+    spool.finish()
+    assert spool.path is not None and spool.source == spool.path
+    with spool.open() as f:
+        assert f.read() == b"0123456789ab"
+    assert spool.content_key == hashlib.sha256(b"0123456789ab").hexdigest()
+    path = spool.path
+    spool.close()
+    assert not os.path.exists(path)
+
+
+def _serve(monkeypatch, body: bytes, headers=None):
+    def handler(request):
+        return httpx.Response(200, content=body, headers=headers or {})
+
+    monkeypatch.setattr(fetch, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_fetch_streams_the_body_into_a_spool(monkeypatch):
+    _serve(monkeypatch, b"x" * 100)
+
+    async def scenario():
+        with await fetch_to_spool("https://files/a.pdf") as spool:
+            assert spool.size == 100 and spool.source == b"x" * 100
+    run(scenario())
+
+
+def test_declared_length_over_the_limit_is_refused(monkeypatch):
+    _serve(monkeypatch, b"x" * 100, {"content-length": "100"})
+
+    async def scenario():
+        with pytest.raises(AttachmentTooLarge):
+            await fetch_to_spool("https://files/a.pdf", max_bytes=50)
+    run(scenario())
+
+
+def test_streamed_body_over_the_limit_is_aborted(monkeypatch):
+    async def stream():
+        for _ in range(10):
+            yield b"x" * 20
+
+    def handler(request):
+        return httpx.Response(200, content=stream())
+
+    monkeypatch.setattr(fetch, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        with pytest.raises(AttachmentTooLarge):
+            await fetch_to_spool("https://files/a.pdf", max_bytes=50)
+    run(scenario())
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from chat_agents import pdf_engine
+from chat_agents.pdf_engine import run_in_pool, stream_pdf_pages
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# --- run in the spawned workers; module-level so they can be pickled
+
+def slow_echo(value, delay):
+    time.sleep(delay)
+    return value
+
+
+def crash_once(marker):
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "retried"
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(pdf_engine, "PDF_POOL_WORKERS", 2)
+    pdf_engine.shutdown_pdf_pool()
+    yield
+    pdf_engine.shutdown_pdf_pool()
+
+
+def test_overrun_job_times_out_without_killing_a_concurrent_job():
+    async def scenario():
+        now = time.monotonic()
+        stuck = asyncio.ensure_future(run_in_pool(now + 1, slow_echo, "stuck", 30))
+        other = asyncio.ensure_future(run_in_pool(now + 20, slow_echo, "other", 2))
+        with pytest.raises(asyncio.TimeoutError):
+            await stuck
+        # The old pool is retired, but the job already running in it finishes
+        assert await other == "other"
+        await asyncio.gather(*pdf_engine._reapers)
+        assert not pdf_engine._retired
+        # New work runs in a fresh pool
+        assert await run_in_pool(time.monotonic() + 20, slow_echo, "fresh", 0) == "fresh"
+    run(scenario())
+
+
+def test_job_lost_to_a_crashed_worker_is_retried_once(tmp_path):
+    async def scenario():
+        marker = str(tmp_path / "crashed")
+        assert await run_in_pool(time.monotonic() + 30, crash_once, marker) == "retried"
+    run(scenario())
+
+
+def test_expired_deadline_submits_nothing():
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await run_in_pool(time.monotonic() - 1, slow_echo, "late", 0)
+        assert pdf_engine._pool is None
+    run(scenario())
+
+
+def test_first_range_timeout_becomes_a_placeholder():
+    async def scenario():
+        pages = [text async for text in stream_pdf_pages(b"%PDF-1.4", deadline_s=0)]
+        assert len(pages) == 1 and pages[0].startswith("[No pages could be extracted: time budget")
+    run(scenario())
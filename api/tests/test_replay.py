@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from chat_agents.replay import FileReplayStore, MemoryReplayStore, replay_stream, start_detached_run
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _never_disconnected() -> bool:
+    return False
+
+
+def _frame(n: int) -> bytes:
+    return b'data: {"n":%d}\n\n' % n
+
+
+@pytest.fixture(params=["memory", "file"])
+def make_store(request, tmp_path):
+    def factory(max_events=1000, max_bytes=1_000_000):
+        if request.param == "memory":
+            return MemoryReplayStore(max_events=max_events, max_bytes=max_bytes)
+        return FileReplayStore(str(tmp_path), max_bytes=max_bytes)
+    return factory
+
+
+def test_read_returns_frames_after_position(make_store):
+    async def scenario():
+        store = make_store()
+        assert await store.create("run-0001", "alice")
+        assert not await store.create("run-0001", "alice")
+        for n in range(1, 6):
+            assert await store.append("run-0001", _frame(n)) == n
+        chunk = await store.read("run-0001", 2)
+        assert [seq for seq, _ in chunk.events] == [3, 4, 5]
+        assert not chunk.gap and not chunk.done
+        await store.finish("run-0001")
+        assert (await store.read("run-0001", 5)).done
+        assert await store.read("unknown-run", 0) is None
+    run(scenario())
+
+
+def test_memory_eviction_reports_gap():
+    async def scenario():
+        store = MemoryReplayStore(max_events=3, max_bytes=1_000_000)
+        await store.create("run-0001", "alice")
+        for n in range(1, 9):
+            await store.append("run-0001", _frame(n))
+        evicted = await store.read("run-0001", 2)
+        assert evicted.gap
+        kept = await store.read("run-0001", 5)
+        assert not kept.gap and [seq for seq, _ in kept.events] == [6, 7, 8]
+        assert (await store.read("run-0001", 8)).events == []
+    run(scenario())
+
+
+def test_memory_eviction_by_bytes_keeps_newest_frame():
+    async def scenario():
+        store = MemoryReplayStore(max_events=1000, max_bytes=10)
+        await store.create("run-0001", "alice")
+        await store.append("run-0001", b"x" * 8)
+        await store.append("run-0001", b"y" * 20)
+        chunk = await store.read("run-0001", 0)
+        assert chunk.gap
+        assert [seq for seq, _ in (await store.read("run-0001", 1)).events] == [2]
+    run(scenario())
+
+
+def test_file_compaction_reports_gap(tmp_path):
+    async def scenario():
+        store = FileReplayStore(str(tmp_path), max_bytes=200)
+        await store.create("run-0001", "alice")
+        for n in range(1, 40):
+            await store.append("run-0001", _frame(n))
+        assert (await store.read("run-0001", 0)).gap
+        latest = await store.read("run-0001", 38)
+        assert not latest.gap and [seq for seq, _ in latest.events] == [39]
+    run(scenario())
+
+
+def test_replay_stream_resumes_with_ids_and_ends_with_the_run(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create("run-0001", "alice")
+
+        async def frames():
+            for n in range(1, 6):
+                yield _frame(n)
+                await asyncio.sleep(0)
+
+        start_detached_run("run-0001", frames(), store)
+        out = [f async for f in replay_stream("run-0001", 2, _never_disconnected, store, poll_s=0.01)]
+        assert out == [b"id: %d\n" % n + _frame(n) for n in (3, 4, 5)]
+    run(scenario())
+
+
+def test_replay_stream_sends_gap_error(make_store):
+    async def scenario():
+        store = make_store(max_events=2, max_bytes=60)
+        await store.create("run-0001", "alice")
+        for n in range(1, 10):
+            await store.append("run-0001", _frame(n))
+        await store.finish("run-0001")
+        out = [f async for f in replay_stream("run-0001", 0, _never_disconnected, store)]
+        assert len(out) == 1 and b'"code":"replay_gap"' in out[0]
+    run(scenario())
+
+
+def test_run_records_its_owner(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create("run-0001", "alice")
+        assert await store.owner("run-0001") == "alice"
+        assert await store.owner("run-0002") is None
+    run(scenario())
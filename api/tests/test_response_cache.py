@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from chat_agents.response_cache import ResponseCache, normalize_prompt, replay_chunks
+
+
+def ask(text: str, role: str = "user"):
+    return [{"role": role, "content": text}]
+
+
+def test_key_ignores_case_whitespace_and_trailing_punctuation():
+    cache = ResponseCache()
+    key = cache.key_for(ask("What is FEHA?"), "gpt-4.1", "v1")
+    assert key == cache.key_for(ask("  what is   feha "), "gpt-4.1", "v1")
+    assert key != cache.key_for(ask("What is FEHA?"), "gpt-4.1", "v2")
+    assert key != cache.key_for(ask("What is FEHA?"), "gpt-4.1-mini", "v1")
+    assert normalize_prompt("Deadline?!  ") == "deadline"
+
+
+def test_only_short_single_user_turns_are_cacheable():
+    cache = ResponseCache()
+    assert cache.key_for(ask("hi") + ask("again"), "m", "v") is None
+    assert cache.key_for(ask("hi", role="assistant"), "m", "v") is None
+    assert cache.key_for(ask("x" * 10_000), "m", "v") is None
+    assert cache.key_for([{"role": "user", "content": [{"type": "text"}]}], "m", "v") is None
+    assert ResponseCache(max_entries=0).key_for(ask("hi"), "m", "v") is None
+
+
+def test_entries_expire_and_are_evicted_lru():
+    cache = ResponseCache(max_entries=2, ttl_s=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None and cache.get("c") == "C"
+    cache._entries["a"] = (time.time() - 120, "A")
+    assert cache.get("a") is None
+    cache.put("blank", "  ")
+    assert cache.get("blank") is None
+
+
+def test_replay_reassembles_the_text_in_word_aligned_chunks():
+    async def collect():
+        return [chunk async for chunk in replay_chunks("one two three four five", chars_per_s=0, chunk_chars=9)]
+
+    chunks = asyncio.run(collect())
+    assert "".join(chunks) == "one two three four five"
+    assert all(chunk.endswith(" ") for chunk in chunks[:-1])
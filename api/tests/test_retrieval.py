@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from chat_agents import retrieval
+from chat_agents.pdf_engine import PAGE_BREAK
+from chat_agents.retrieval import AttachmentIndex, chunk_text, index_for, render_reference, tokenize
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+PAGES = [
+    "The employee was hired in March and worked as a warehouse associate. " * 5,
+    "Overtime was never paid for shifts longer than eight hours; wage statements omitted overtime. " * 5,
+    "She complained to HR about harassment and was terminated two weeks later in retaliation. " * 5,
+]
+
+
+def test_chunks_never_cross_a_page():
+    text = PAGE_BREAK.join(PAGES)
+    passages = chunk_text(text, paged=True, size=120, overlap=20)
+    assert {p.page for p in passages} == {1, 2, 3}
+    for passage in passages:
+        assert passage.text in " ".join(PAGES[passage.page - 1].split())
+        assert len(passage.text) <= 120
+
+
+def test_unpaged_text_has_no_page_numbers():
+    passages = chunk_text("word " * 500, paged=False, size=200, overlap=50)
+    assert len(passages) > 1 and all(p.page is None for p in passages)
+
+
+def test_windows_overlap_without_losing_words():
+    text = " ".join(f"w{i}" for i in range(300))
+    passages = chunk_text(text, paged=False, size=100, overlap=30)
+    covered = set()
+    for passage in passages:
+        covered.update(passage.text.split())
+    assert covered == set(text.split())
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("The Overtime WAS unpaid, and it's late") == ["overtime", "unpaid", "s", "late"]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_bm25_ranks_the_matching_page_first(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(retrieval, "np", None)
+    elif retrieval.np is None:
+        pytest.skip("numpy is not installed")
+
+    async def scenario():
+        index = AttachmentIndex()
+        await index.add("http://x/intake.pdf", "application/pdf", "intake.pdf", PAGE_BREAK.join(PAGES))
+        await index.add("http://x/notes.docx", "application/docx", "notes.docx", "Meeting notes about parking and lunch. " * 20)
+        hits = index.search("unpaid overtime wages", k=3)
+        assert hits[0].name == "intake.pdf" and hits[0].page == 2
+        assert hits[0].cite() == "[intake.pdf p.2]"
+        assert hits == sorted(hits, key=lambda h: h.score, reverse=True)
+        retaliation = index.search("terminated retaliation")
+        assert retaliation[0].page == 3
+        assert index.search("zebra") == []
+    run(scenario())
+
+
+def test_numpy_and_python_scores_agree(monkeypatch):
+    if retrieval.np is None:
+        pytest.skip("numpy is not installed")
+    text = PAGE_BREAK.join(PAGES)
+    vectorized = retrieval.IndexedDocument("a.pdf", text, True)
+    monkeypatch.setattr(retrieval, "np", None)
+    plain = retrieval.IndexedDocument("a.pdf", text, True)
+    weights = {"overtime": 1.3, "retaliation": 0.7}
+    assert sorted(vectorized.score(weights, 20.0)) == pytest.approx(sorted(plain.score(weights, 20.0)))
+
+
+def test_reference_is_independent_of_the_question():
+    async def scenario():
+        index = AttachmentIndex()
+        doc = await index.add("http://x/a.pdf", "application/pdf", "a.pdf", PAGE_BREAK.join(PAGES))
+        assert render_reference(doc) == render_reference(doc)
+        assert str(len(doc.passages)) in render_reference(doc)
+    run(scenario())
+
+
+def test_index_for_is_scoped_to_the_owner():
+    assert index_for("conv-1", "alice") is index_for("conv-1", "alice")
+    assert index_for("conv-1", "alice") is not index_for("conv-1", "bob")
+    assert index_for(None, "alice") is not index_for(None, "alice")
+
+
+def test_index_is_restored_from_the_stored_manifest(monkeypatch):
+    from chat_agents import orchestrator
+
+    async def fake_pdf(url):
+        return PAGE_BREAK.join(PAGES)
+
+    monkeypatch.setattr(orchestrator, "extract_pdf_text", fake_pdf)
+
+    async def scenario():
+        ref = "[File: intake.pdf (application/pdf) - URL: http://x/intake.pdf]"
+        history = await orchestrator.to_agent_messages([{"role": "user", "content": "see " + ref}])
+        assert history[0]["attachments"] == [["intake.pdf", "application/pdf", "http://x/intake.pdf"]]
+        assert "attachments" not in orchestrator.model_input(history)[0]
+
+        index = AttachmentIndex()
+        await orchestrator.restore_index(index, history)
+        assert index.search("overtime")[0].page == 2
+    run(scenario())
@@ -0,0 +1,50 @@
+import json
+import time
+
+from chat_agents.sse import SSEEncoder, encode_delta, encode_event
+
+
+def frames(data: bytes):
+    return [json.loads(chunk[len(b"data: "):]) for chunk in data.split(b"\n\n") if chunk]
+
+
+def test_deltas_inside_the_window_become_one_frame():
+    encoder = SSEEncoder(window_ms=10_000, max_bytes=1024)
+    assert encoder.delta("Hel") == b"" and encoder.delta("lo") == b""
+    assert frames(encoder.flush()) == [{"type": "text-delta", "delta": "Hello"}]
+    assert encoder.flush() == b"" and encoder.timeout() is None
+
+
+def test_buffer_flushes_at_the_byte_limit_counting_utf8():
+    encoder = SSEEncoder(window_ms=10_000, max_bytes=8)
+    # Three characters but nine bytes
+    assert frames(encoder.delta("€€€")) == [{"type": "text-delta", "delta": "€€€"}]
+    assert encoder.delta("abc") == b""
+
+
+def test_other_events_flush_buffered_text_first():
+    encoder = SSEEncoder(window_ms=10_000)
+    encoder.delta("partial")
+    out = frames(encoder.event({"type": "tool-call"}))
+    assert out == [{"type": "text-delta", "delta": "partial"}, {"type": "tool-call"}]
+
+
+def test_window_expiry_is_reported_and_zero_disables_coalescing():
+    encoder = SSEEncoder(window_ms=20)
+    encoder.delta("a")
+    assert 0 < encoder.timeout() <= 0.02
+    time.sleep(0.03)
+    assert encoder.timeout() == 0
+    assert frames(encoder.delta("b")) == [{"type": "text-delta", "delta": "ab"}]
+    assert SSEEncoder(window_ms=0).delta("x") == encode_delta("x")
+
+
+def test_on_text_payloads_follow_their_text():
+    encoder = SSEEncoder(window_ms=10_000, on_text=lambda text: [{"type": "data-len", "data": len(text)}])
+    encoder.delta("abc")
+    assert encoder.flush() == encode_delta("abc") + encode_event({"type": "data-len", "data": 3})
+
+
+def test_encode_delta_matches_the_generic_encoder():
+    text = 'quote " backslash \\ newline \n unicode é'
+    assert encode_delta(text) == encode_event({"type": "text-delta", "delta": text})
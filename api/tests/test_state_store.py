@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from chat_agents import orchestrator
+from chat_agents.state_store import MemoryConversationStore, SQLiteConversationStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+MESSAGES = [{"role": "user", "content": "hello", "type": "message"}]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"))
+    return MemoryConversationStore()
+
+
+def test_conversation_is_only_visible_to_its_owner(store):
+    async def scenario():
+        assert await store.put("c1", MESSAGES, "alice")
+        assert await store.get("c1", "alice") == MESSAGES
+        assert await store.get("c1", "mallory") is None
+        # Another owner can neither overwrite nor take over the id
+        assert not await store.put("c1", [], "mallory")
+        assert await store.get("c1", "alice") == MESSAGES
+    run(scenario())
+
+
+def test_memory_store_evicts_beyond_its_byte_budget():
+    async def scenario():
+        store = MemoryConversationStore(max_bytes=10)
+        await store.put("old", [{"content": "x" * 6}], "alice")
+        await store.put("new", [{"content": "y" * 6}], "alice")
+        assert await store.get("old", "alice") is None
+        assert await store.get("new", "alice") is not None
+    run(scenario())
+
+
+def test_unauthenticated_caller_cannot_resume_a_conversation(monkeypatch):
+    store = MemoryConversationStore()
+    monkeypatch.setattr(orchestrator, "conversation_store", store)
+
+    async def scenario():
+        await store.put("c1", MESSAGES, "alice")
+        frames = [f async for f in orchestrator.stream_chat_py(
+            [], "chat-model", conversation_id="c1", new_message={"role": "user", "content": "more"}, owner=None,
+        )]
+        assert len(frames) == 1 and b"conversation_not_found" in frames[0]
+        assert await store.get("c1", "alice") == MESSAGES
+    run(scenario())
@@ -0,0 +1,91 @@
+import json
+import random
+
+import pytest
+
+from chat_agents.structured import CaseReport, FieldStreamParser, structured_result
+
+
+REPORT = {
+    "mode": "lawyer",
+    "jurisdiction": "CA \"state\" \\ café 😀 – line\nbreak\ttab",
+    "deadlines": [{"description": "File {CRD} complaint", "due": "3 years", "source": "Gov. Code §12960"}],
+    "facts_snapshot": ["a\nb", "c \"quoted\"", ""],
+    "claims": [],
+    "elements_map": [{"claim": "c", "element": "e", "status": "met", "facts": "f ] } [ {"}],
+    "case_strength_score": 72,
+    "risks": ["r"],
+    "recommendation": "take",
+    "sources": ["https://example.gov/a?b=1&c=2"],
+}
+
+
+def _feed_in_chunks(text, rng):
+    parser = FieldStreamParser()
+    events = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 9)
+        events += parser.feed(text[i:i + n])
+        i += n
+    return parser, events
+
+
+def _deltas(events, field):
+    return "".join(e["data"]["delta"] for e in events if e["type"] == "data-field-delta" and e["data"]["field"] == field)
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_random_chunk_splits_match_json_loads(ensure_ascii, indent):
+    text = "Here is the report: " + json.dumps(REPORT, ensure_ascii=ensure_ascii, indent=indent)
+    expected = json.loads(text[text.index("{"):])
+    rng = random.Random(f"{ensure_ascii}-{indent}")
+    for _ in range(200):
+        parser, events = _feed_in_chunks(text, rng)
+        assert parser.fields == expected
+        assert parser.state == "done"
+        completed = [e["data"]["field"] for e in events if e["type"] == "data-field-complete"]
+        assert completed == list(expected)
+        for field, value in expected.items():
+            if isinstance(value, str):
+                assert _deltas(events, field) == value
+            else:
+                assert json.loads(_deltas(events, field)) == value
+
+
+def test_events_are_utf8_encodable_when_surrogate_pairs_split():
+    text = json.dumps({"jurisdiction": "😀" * 20})
+    for cut in range(len(text)):
+        parser = FieldStreamParser()
+        events = parser.feed(text[:cut]) + parser.feed(text[cut:])
+        for event in events:
+            json.dumps(event, ensure_ascii=False).encode("utf-8")
+        assert _deltas(events, "jurisdiction") == "😀" * 20
+
+
+def test_scalars_complete_at_their_delimiter():
+    parser = FieldStreamParser()
+    events = parser.feed('{"case_strength_score": 7')
+    assert not [e for e in events if e["type"] == "data-field-complete"]
+    events = parser.feed('2, "ok": true, "none": null}')
+    values = {e["data"]["field"]: e["data"]["value"] for e in events if e["type"] == "data-field-complete"}
+    assert values == {"case_strength_score": 72, "ok": True, "none": None}
+
+
+def test_field_completes_before_object_ends():
+    parser = FieldStreamParser()
+    events = parser.feed('{"mode": "plaintiff", "jurisdiction": "NY", "deadlines": [')
+    completed = {e["data"]["field"]: e["data"]["value"] for e in events if e["type"] == "data-field-complete"}
+    assert completed == {"mode": "plaintiff", "jurisdiction": "NY"}
+
+
+def test_structured_result_validates_report():
+    ok = structured_result("preamble " + json.dumps(REPORT))
+    assert ok["type"] == "data-structured-output"
+    assert ok["data"]["errors"] == []
+    assert CaseReport.model_validate(ok["data"]["value"]).case_strength_score == 72
+
+    bad = structured_result(json.dumps({**REPORT, "case_strength_score": 140}))
+    assert bad["data"]["value"] is None
+    assert any(error.startswith("case_strength_score") for error in bad["data"]["errors"])
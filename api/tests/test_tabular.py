@@ -0,0 +1,54 @@
+from io import BytesIO
+
+import pytest
+
+from chat_agents.tabular import TableDigest, summarize_table
+
+
+def column_row(digest_text: str, name: str) -> list:
+    line = next(line for line in digest_text.splitlines() if line.startswith(f"| {name} |"))
+    return [cell.strip() for cell in line.strip("|").split("|")]
+
+
+def test_csv_digest_profiles_types_nulls_and_ranges():
+    data = b"name,amount,date\nAna,10,2024-01-05\nBo,,2024-02-01\nAna,32.5,2024-03-09\n"
+    text = summarize_table(data)
+    assert "Rows: 3  Columns: 3" in text
+    name = column_row(text, "name")
+    assert name[1] == "text" and name[2] == "3" and "Ana (2)" in name[8]
+    amount = column_row(text, "amount")
+    assert amount[1] == "float" and amount[3] == "1" and amount[5:8] == ["10", "32.50", "42.50"]
+    date = column_row(text, "date")
+    assert date[1] == "date" and date[5:7] == ["2024-01-05", "2024-03-09"]
+
+
+def test_delimiter_is_sniffed():
+    text = summarize_table(b"a;b\n1;2\n3;4\n")
+    assert "Columns: 2" in text and column_row(text, "b")[5:7] == ["2", "4"]
+
+
+def test_ragged_rows_count_missing_cells_as_nulls():
+    digest = TableDigest(["a", "b", "c"])
+    digest.add_chunk([["1"], ["2", "x"]])
+    digest.add_chunk([["3"]])
+    text = digest.render()
+    assert column_row(text, "c")[3] == "3"
+    assert column_row(text, "b")[3] == "2"
+
+
+def test_xlsx_sheets_are_profiled():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Ledger"
+    sheet.append(["item", "cost"])
+    sheet.append(["rent", 1200])
+    sheet.append(["fees", 80])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    text = summarize_table(buffer.getvalue())
+    assert "Sheet: Ledger" in text and column_row(text, "cost")[7] == "1,280"
+
+
+def test_legacy_xls_is_reported_unsupported():
+    assert "legacy .xls" in summarize_table(b"\xd0\xcf\x11\xe0" + b"\0" * 60)
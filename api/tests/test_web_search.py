@@ -0,0 +1,83 @@
+import asyncio
+
+from chat_agents import web_search
+from chat_agents.web_search import SearchCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Backend:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, query: str) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"results for {query}"
+
+
+def install(monkeypatch, backend: Backend) -> None:
+    monkeypatch.setattr(web_search, "WEB_SEARCH_BACKEND", "stub")
+    monkeypatch.setattr(web_search, "_stub_search", backend)
+
+
+def test_normalized_repeat_query_is_a_hit(monkeypatch):
+    backend = Backend(delay=0)
+    install(monkeypatch, backend)
+
+    async def scenario():
+        cache = SearchCache()
+        first = await cache.search("California FEHA deadline?")
+        assert await cache.search("  california feha   DEADLINE ") == first
+        assert backend.calls == 1 and cache.stats()["hits"] == 1
+    run(scenario())
+
+
+def test_concurrent_callers_share_one_search(monkeypatch):
+    backend = Backend()
+    install(monkeypatch, backend)
+
+    async def scenario():
+        cache = SearchCache()
+        results = await asyncio.gather(*(cache.search("statute of limitations") for _ in range(3)))
+        assert len(set(results)) == 1
+        assert backend.calls == 1 and cache.stats()["shared"] == 2
+    run(scenario())
+
+
+def test_cancelled_sole_caller_cancels_the_search(monkeypatch):
+    backend = Backend(delay=10)
+    install(monkeypatch, backend)
+
+    async def scenario():
+        cache = SearchCache()
+        caller = asyncio.ensure_future(cache.search("wage claim deadline"))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.01)
+        assert backend.cancelled == 1
+        assert not cache._inflight and cache.stats()["entries"] == 0
+    run(scenario())
+
+
+def test_search_survives_while_another_caller_waits(monkeypatch):
+    backend = Backend(delay=0.05)
+    install(monkeypatch, backend)
+
+    async def scenario():
+        cache = SearchCache()
+        first = asyncio.ensure_future(cache.search("notice period"))
+        second = asyncio.ensure_future(cache.search("notice period"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "results for notice period"
+        assert backend.cancelled == 0
+    run(scenario())
@@ -117,6 +117,9 @@ export async function POST(request: Request) {
               headers: {
                 'Content-Type': 'application/json',
                 'x-from': 'vercel-frontend',
+                'x-client-id': session.user.id, // per-user admission limits
+                // The backend only trusts x-client-id next to this shared secret
+                'x-proxy-secret': process.env.PROXY_SHARED_SECRET ?? '',
                 backendURL: backendUrl, // Temp logging
               },
               body: JSON.stringify({
@@ -14,6 +14,9 @@ const filePartSchema = z.object({
     'text/csv',
     'application/vnd.ms-excel',
     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'message/rfc822',
+    'application/vnd.ms-outlook',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
   ]),
   name: z.string().min(1).max(100),
   url: z.string().url(),
@@ -16,6 +16,11 @@ const ALLOWED_MIME_TYPES = new Set([
   'application/vnd.ms-excel',
   'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
 
+  // intake emails and Word documents
+  'message/rfc822',
+  'application/vnd.ms-outlook',
+  'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+
   // some browsers send CSV as text/plain
   'text/plain',
 ]);
@@ -25,6 +30,9 @@ const EXT_FALLBACKS = new Map<string, string>([
   ['.csv', 'text/csv'],
   ['.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'],
   ['.xls', 'application/vnd.ms-excel'],
+  ['.eml', 'message/rfc822'],
+  ['.msg', 'application/vnd.ms-outlook'],
+  ['.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'],
   ['.png', 'image/png'],
   ['.jpg', 'image/jpeg'],
   ['.jpeg', 'image/jpeg'],
@@ -38,6 +46,9 @@ const MAX_BYTES_BY_MIME: Record<string, number> = {
   'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
     10 * 1024 * 1024,
   'text/plain': 10 * 1024 * 1024,
+  'message/rfc822': 25 * 1024 * 1024,
+  'application/vnd.ms-outlook': 25 * 1024 * 1024,
+  'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 25 * 1024 * 1024,
   'image/jpeg': 10 * 1024 * 1024,
   'image/png': 10 * 1024 * 1024,
 };
@@ -53,6 +64,46 @@ function inferMimeFromName(name: string | undefined, fallback: string) {
 
 const BlobSchema = z.instanceof(Blob);
 
+// Types the backend extracts text from
+const PREFETCH_MIME_TYPES = new Set([
+  'application/pdf',
+  'text/csv',
+  'application/vnd.ms-excel',
+  'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+  'message/rfc822',
+  'application/vnd.ms-outlook',
+  'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+]);
+
+async function prefetchAttachment(
+  url: string,
+  mediaType: string,
+  clientId: string | undefined,
+) {
+  if (!PREFETCH_MIME_TYPES.has(mediaType)) return;
+  const backendUrl = process.env.PYTHON_BACKEND_URL || 'http://127.0.0.1:8000';
+  try {
+    // The backend answers immediately; extraction continues in the background
+    await fetch(`${backendUrl}/api/ingest`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(clientId
+          ? {
+              'x-client-id': clientId,
+              'x-proxy-secret': process.env.PROXY_SHARED_SECRET ?? '',
+            }
+          : {}),
+      },
+      body: JSON.stringify({ url, mediaType }),
+      signal: AbortSignal.timeout(2000),
+    });
+  } catch (err) {
+    // Best effort: the chat turn extracts the file itself if this failed
+    console.warn('Attachment prefetch failed', err);
+  }
+}
+
 export async function POST(request: Request) {
   const session = await auth();
   if (!session) {
@@ -95,7 +146,7 @@ export async function POST(request: Request) {
         return NextResponse.json(
           {
             error:
-              'Unsupported file type. Allowed: PDF, CSV, Excel (.xlsx, .xls), PNG, JPEG.',
+              'Unsupported file type. Allowed: PDF, CSV, Excel (.xlsx, .xls), email (.eml, .msg), Word (.docx), PNG, JPEG.',
           },
           { status: 400 },
         );
@@ -122,6 +173,10 @@ export async function POST(request: Request) {
       contentType,
     });
 
+    // Start text extraction on the backend now so the first chat turn that
+    // references this file does not wait for download and parse
+    await prefetchAttachment(data.url, contentType, session.user?.id);
+
     // Mirror the response shape your client expects
     // (url, pathname, contentType)
     return NextResponse.json({
@@ -130,13 +130,16 @@ function PureMultimodalInput({
   const [dragCounter, setDragCounter] = useState(0);
   const wasPageDragOverRef = useRef(false);
 
-  // NEW: file validation helpers (PDF, CSV, XLS/XLSX; size limits)
+  // NEW: file validation helpers (PDF, CSV, XLS/XLSX, EML/MSG, DOCX; size limits)
   const supportedMimeTypes = useMemo(
     () => [
       'application/pdf',
       'text/csv',
       'application/vnd.ms-excel',
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+      'message/rfc822',
+      'application/vnd.ms-outlook',
+      'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
     ],
     [],
   );
@@ -149,21 +152,29 @@ function PureMultimodalInput({
       name.endsWith('.csv') ||
       name.endsWith('.xlsx') ||
       name.endsWith('.xls') ||
+      name.endsWith('.eml') ||
+      name.endsWith('.msg') ||
+      name.endsWith('.docx') ||
       // allow some CSVs that come through as text/plain
       (type === 'text/plain' && name.endsWith('.csv'));
     if (!validType) {
       toast.error(
-        `${file.name}: Unsupported type. Upload PDF, CSV, or Excel (.xlsx, .xls).`,
+        `${file.name}: Unsupported type. Upload PDF, CSV, Excel (.xlsx, .xls), email (.eml, .msg) or Word (.docx).`,
       );
       return false;
     }
-    // Size: PDFs up to 50MB, data files up to 10MB
+    // Size: PDFs up to 50MB, emails and Word documents 25MB, data files 10MB
     const isPdf = type === 'application/pdf' || name.endsWith('.pdf');
-    const maxBytes = isPdf ? 50 * 1024 * 1024 : 10 * 1024 * 1024;
+    const isDocument = /\.(eml|msg|docx)$/.test(name);
+    const maxBytes = isPdf
+      ? 50 * 1024 * 1024
+      : isDocument
+        ? 25 * 1024 * 1024
+        : 10 * 1024 * 1024;
     if (file.size > maxBytes) {
       toast.error(
         `${file.name}: File too large. Max ${
-          isPdf ? '50MB (PDF)' : '10MB (CSV/Excel)'
+          isPdf ? '50MB (PDF)' : isDocument ? '25MB (email/Word)' : '10MB (CSV/Excel)'
         }.`,
       );
       return false;
@@ -473,7 +484,7 @@ function PureMultimodalInput({
         onChange={handleFileChange}
         tabIndex={-1}
         // NEW: restrict chooser types
-        accept=".pdf,.csv,.xlsx,.xls,application/pdf,text/csv,application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/vnd.ms-excel,text/plain"
+        accept=".pdf,.csv,.xlsx,.xls,.eml,.msg,.docx,application/pdf,text/csv,application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/vnd.ms-excel,message/rfc822,application/vnd.ms-outlook,application/vnd.openxmlformats-officedocument.wordprocessingml.document,text/plain"
       />
 
       <PromptInput